@@ -0,0 +1,224 @@
+"""
+Script to benchmark the stages of the join-stats pipeline on synthetic
+experiments of different sizes and to compare the results with a previous
+run to catch performance regressions.
+
+For each combination of statistics interval and session length, an
+experiment is generated with synthetic.generate_experiment and processed
+in a fresh process, so that peak memory is measured per experiment.
+Throughput in rows per second, wall and CPU time and peak memory of each
+stage are saved in .json file along with the versions of the libraries.
+
+Usage:
+    venv/bin/python scripts/benchmark_pipeline.py --intervals 1 10 100 --durations 1 10 60
+    venv/bin/python scripts/benchmark_pipeline.py --compare _benchmarks/pipeline-20200210-173429.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.instrumentation import Recorder, recording, set_verbose
+from srt_stats_analysis.join_stats import run_pipeline
+from srt_stats_analysis.synthetic import SessionParams, generate_experiment
+
+
+def run_case(paths: dict, repeat: int):
+    """
+    Run the pipeline on the experiment and return the stages measured,
+    the best of repeated runs for each stage.
+    """
+    set_verbose(False)
+    best = {}
+    for _ in range(repeat):
+        recorder = Recorder()
+        with recording(recorder):
+            run_pipeline(
+                paths['snd_stats_csv'],
+                paths['rcv_stats_csv'],
+                paths['snd_tshark_pcapng'],
+                paths['rcv_tshark_pcapng'],
+                jobs=1
+            )
+
+        # Stages run several times, e.g. csv load of sender and receiver
+        # statistics, are summed up
+        stages = {}
+        for stage in recorder.stages:
+            measured = stages.setdefault(stage.name, {
+                'calls': 0, 'rows': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': 0.0
+            })
+            rows = stage.rows_in if stage.rows_in is not None else stage.rows_out
+            measured['calls'] += 1
+            measured['rows'] += rows or 0
+            measured['wall_s'] += stage.wall_s
+            measured['cpu_s'] += stage.cpu_s
+            measured['peak_rss_mb'] = max(measured['peak_rss_mb'], stage.peak_rss_mb)
+
+        for name, measured in stages.items():
+            if name not in best or measured['wall_s'] < best[name]['wall_s']:
+                best[name] = measured
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: pd.DataFrame, baseline_path, threshold: float):
+    """
+    Compare the throughput with the baseline run, print the table and
+    return the number of regressions found.
+    """
+    with open(baseline_path) as f:
+        baseline = pd.DataFrame(json.load(f)['results'])
+
+    keys = ['interval_ms', 'duration_min', 'stage']
+    table = results[keys + ['rows_per_s', 'peak_rss_mb']].merge(
+        baseline[keys + ['rows_per_s', 'peak_rss_mb']],
+        on=keys,
+        suffixes=('', '_baseline')
+    )
+    table['speedup'] = (table['rows_per_s'] / table['rows_per_s_baseline']).round(2)
+    table['regression'] = table['speedup'] < 1 - threshold
+
+    print(f'\nComparison with {baseline_path}')
+    print(table.to_string(index=False))
+    return int(table['regression'].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--intervals',
+        type=float,
+        nargs='+',
+        default=[1, 10, 100],
+        help='Intervals of collecting statistics, milliseconds'
+    )
+    parser.add_argument(
+        '--durations',
+        type=float,
+        nargs='+',
+        default=[1, 10, 60],
+        help='Session lengths, minutes'
+    )
+    parser.add_argument('--rate-mbps', type=float, default=100, help='Sending rate, Mbps')
+    parser.add_argument('--clock-skew-ms', type=float, default=5, help='Receiver clock skew, milliseconds')
+    parser.add_argument('--clock-drift-ppm', type=float, default=0, help='Receiver clock drift, ppm')
+    parser.add_argument('--jitter-ms', type=float, default=0.5, help='Jitter of sample times, milliseconds')
+    parser.add_argument('--loss-rate', type=float, default=0.001, help='Share of packets lost')
+    parser.add_argument('--loss-burst', type=int, default=3, help='Mean number of packets lost in a row')
+    parser.add_argument(
+        '--data-packets',
+        action='store_true',
+        help='Write data packets in tshark dumps, makes dumps as large as real ones'
+    )
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs, the best one is reported')
+    parser.add_argument(
+        '--output',
+        help='.json file to save the results in, by default '
+        '_benchmarks/pipeline-<datetime>.json'
+    )
+    parser.add_argument('--compare', help='.json file with the results of a previous run')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='Throughput drop considered a regression, e.g. 0.2 for 20%%'
+    )
+    args = parser.parse_args()
+
+    created = datetime.datetime.now()
+    output = args.output
+    if output is None:
+        output = pathlib.Path('_benchmarks') / f'pipeline-{created:%Y%m%d-%H%M%S}.json'
+    output = pathlib.Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    records = []
+    # Each experiment is processed in a fresh process, so that peak memory
+    # of the previous ones does not count
+    context = multiprocessing.get_context('spawn')
+    for interval_ms in args.intervals:
+        for duration_min in args.durations:
+            params = SessionParams(
+                duration=pd.Timedelta(minutes=duration_min),
+                interval_ms=interval_ms,
+                rate_mbps=args.rate_mbps,
+                clock_skew_ms=args.clock_skew_ms,
+                clock_drift_ppm=args.clock_drift_ppm,
+                jitter_ms=args.jitter_ms,
+                loss_rate=args.loss_rate,
+                loss_burst=args.loss_burst,
+                data_packets=args.data_packets,
+            )
+            with tempfile.TemporaryDirectory() as directory:
+                print(f'\nInterval {interval_ms} ms, duration {duration_min} min: generating', flush=True)
+                start = time.perf_counter()
+                paths = generate_experiment(directory, params)
+                print(f'Generated in {time.perf_counter() - start:.1f} s, running the pipeline', flush=True)
+
+                with context.Pool(1) as pool:
+                    stages = pool.apply(run_case, (paths, args.repeat))
+
+            for name, measured in stages.items():
+                wall_s = measured['wall_s']
+                rows_per_s = None
+                if measured['rows'] and wall_s > 0:
+                    rows_per_s = round(measured['rows'] / wall_s)
+                records.append({
+                    'interval_ms': interval_ms,
+                    'duration_min': duration_min,
+                    'stage': name,
+                    'calls': measured['calls'],
+                    'rows': measured['rows'],
+                    'wall_s': round(wall_s, 4),
+                    'cpu_s': round(measured['cpu_s'], 4),
+                    'rows_per_s': rows_per_s,
+                    'peak_rss_mb': measured['peak_rss_mb'],
+                })
+
+    results = pd.DataFrame(records)
+    print('\nResults')
+    print(results.to_string(index=False))
+
+    report = {
+        'created': created.isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'args': vars(args),
+        'results': json.loads(results.to_json(orient='records')),
+    }
+    with output.open('w') as f:
+        json.dump(report, f, indent=4)
+    print(f'\nResults saved in {output}')
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f'\n{regressions} regressions found')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Script to compare the speed of decoding the Timepoint column of
+srt-xtransmit .csv statistics with pd.to_datetime and with
+timepoints.parse_timepoints.
+
+Usage:
+    venv/bin/python scripts/benchmark_timepoints.py --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.timepoints import TIMEPOINT_FORMAT, parse_timepoints
+
+
+def generate_timepoints(rows: int, interval_ms: float=10):
+    """
+    Generate Timepoint values the way srt-xtransmit writes them, with
+    a small jitter of the statistics interval.
+
+    Attributes:
+        rows:
+            Number of values to generate.
+        interval_ms:
+            Statistics collection interval, milliseconds.
+    """
+    rng = np.random.default_rng(0)
+    steps = interval_ms * 1000 + rng.integers(0, 500, rows)
+    start = pd.Timestamp('2020-02-10 17:34:29.991983', tz='UTC')
+    timepoints = start + pd.to_timedelta(np.cumsum(steps), unit='us')
+    return pd.Index(timepoints.strftime('%d.%m.%Y %H:%M:%S.%f +0000'), name='Timepoint')
+
+
+def measure(func, values, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(values)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of timepoints')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    print(f'Generating {args.rows} timepoints')
+    values = generate_timepoints(args.rows)
+
+    def to_datetime(values):
+        return pd.to_datetime(values, format=TIMEPOINT_FORMAT).tz_convert(None)
+
+    baseline, expected = measure(to_datetime, values, args.repeat)
+    decoded, result = measure(parse_timepoints, values, args.repeat)
+    assert result.equals(expected)
+
+    print(f'pd.to_datetime:   {baseline:.3f} s, {args.rows / baseline:,.0f} rows/s')
+    print(f'parse_timepoints: {decoded:.3f} s, {args.rows / decoded:,.0f} rows/s')
+    print(f'Speedup: {baseline / decoded:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
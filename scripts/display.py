@@ -2,13 +2,33 @@
 Module to generate an interactive app to visualize and train a QoE predictive
 model from data retrieved out of srt-live-transmit application stats.
 It relies on streamlit library for the visualization and display of widgets.
+
+Time series are downsampled on the server side to a limited number of points
+per trace, see srt_stats_analysis.decimate. Narrowing the time range in the
+sidebar downsamples the selected range only, i.e. shows it in more detail.
+
+Streamlit reruns the whole script on every interaction, so loading,
+synchronization and correlations are memoized by the files (path, size and
+modification time) and the parameters. Changing display settings only
+redraws the plots from the cached dataframes.
+
+Rolling correlations between the synchronized features are computed with
+srt_stats_analysis.correlation over a sliding window set in the sidebar,
+one window per step, and shown as a heatmap of all the pairs over time
+along with the time series of the pairs selected.
 """
+import pathlib
+import typing
+
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import seaborn as sns
 import streamlit as st
 
+from srt_stats_analysis.correlation import rolling_correlations
+from srt_stats_analysis.decimate import LTTB, METHODS, decimate_series
+
 
 # TODO: Change filepaths back
 # SND_LOGS = 'logs/transmitter.csv'
@@ -17,6 +37,11 @@ SND_LOGS = '../_data/_useast_eunorth_10.02.20_100Mbps/msharabayko@23.96.93.54/4-
 RCV_LOGS = '../_data/_useast_eunorth_10.02.20_100Mbps/msharabayko@40.69.89.21/3-srt-xtransmit-stats-rcv.csv'
 
 
+# Maximum number of cached results of each stage, e.g. the datasets
+# loaded with different numbers of rows
+MAX_CACHE_ENTRIES = 4
+
+
 # TODO: Uncomment features back
 FEATURES = [
     'Time',
@@ -49,35 +74,154 @@ FEATURES = [
 ]
 
 
-def load_data(data_uri, nrows):
+class DataSource(typing.NamedTuple):
+    """ Files to load and their identities the cached results are keyed by """
+    snd_uri: str
+    rcv_uri: str
+    nrows: int
+    snd_identity: tuple
+    rcv_identity: tuple
+
+
+def memoize(resource=False):
+    """
+    Function to cache the results of the decorated function across reruns
+    of the script, keyed by its arguments. Cached dataframes are shared
+    between reruns, so they must not be modified in place.
+    resource is True for the results which can not be pickled, e.g. figures
+    """
+    # st.cache is replaced with st.cache_data and st.cache_resource
+    # in newer versions of streamlit, max_entries of st.cache is
+    # available since streamlit 0.57.0
+    if resource and hasattr(st, 'cache_resource'):
+        return st.cache_resource(max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+    if hasattr(st, 'cache_data'):
+        return st.cache_data(max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+    return st.cache(max_entries=MAX_CACHE_ENTRIES, show_spinner=False, allow_output_mutation=True)
+
+
+def file_identity(data_uri):
+    """
+    Identity of a local file: resolved path, size and modification time,
+    so that the file is reloaded once it changes. None for URLs
+    """
+    path = pathlib.Path(data_uri)
+    if not path.is_file():
+        return None
+    stat = path.stat()
+    return (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+def data_source(snd_uri, rcv_uri, nrows):
+    """ Describe the files to load, identities are taken on each rerun """
+    return DataSource(snd_uri, rcv_uri, nrows, file_identity(snd_uri), file_identity(rcv_uri))
+
+
+@memoize()
+def load_data(data_uri, nrows, identity=None):
     """
     Function to retrieve data from a given file or URL
     in a Pandas DataFrame suitable for model training.
-    nrows limits the amount of data displayed for optimization
+    nrows limits the amount of data displayed for optimization,
+    identity of the file is used to key the cache only
     """
     data_df = pd.read_csv(data_uri, nrows=nrows)
     data_df = data_df[FEATURES]
     return data_df
 
 
+@memoize()
+def synchronize(source):
+    """
+    Preprocess the datasets to align time series and remove spurious data.
+    Return processed sender, receiver and synchronized datasets
+    """
+    df_snd = load_data(source.snd_uri, source.nrows, source.snd_identity)
+    df_rcv = load_data(source.rcv_uri, source.nrows, source.rcv_identity)
+
+    # Filter out zero values
+    df_snd = df_snd.loc[:, (df_snd != 0).any(axis=0)]
+    df_rcv = df_rcv.loc[:, (df_rcv != 0).any(axis=0)]
+    # Remove NANs
+    df_snd = df_snd.dropna()
+    df_rcv = df_rcv.dropna()
+    # Align time series
+    df_snd = df_snd[df_snd['Time'] > df_rcv['Time'].min()]
+    df_rcv = df_rcv[df_rcv['Time'] < df_snd['Time'].max()]
+
+    df_snd = df_snd.set_index('Time')
+    df_rcv = df_rcv.set_index('Time')
+
+    df_synchronized = df_snd.join(df_rcv, how='outer', lsuffix='_snd', rsuffix='_rcv')
+    df_synchronized = df_synchronized.interpolate()
+    df_synchronized['Rate'] = df_synchronized['mbpsSendRate'] / (df_synchronized['mbpsRecvRate'])
+
+    return df_snd, df_rcv, df_synchronized
+
+
+def get_dataset(source, name):
+    """ Return processed dataset by name: 'snd', 'rcv' or 'synchronized' """
+    df_snd, df_rcv, df_synchronized = synchronize(source)
+    return {'snd': df_snd, 'rcv': df_rcv, 'synchronized': df_synchronized}[name]
+
+
+@memoize()
+def correlation_matrix(source, name, method='pearson', returns=False):
+    """
+    Correlation matrix of the features of processed dataset by name,
+    on returns rather than levels if returns is True
+    """
+    df = get_dataset(source, name)
+    if returns:
+        df = df.pct_change()
+    return df.corr(method=method)
+
+
+@memoize()
+def rolling_correlation(source, name, window, step):
+    """
+    Correlations between the features of processed dataset by name over
+    a sliding window, window and step in ms
+    """
+    return rolling_correlations(get_dataset(source, name), window, step=step)
+
+
+@memoize(resource=True)
+def clustermap_figure(source, name):
+    """ Clustered correlation matrix on returns, Spearman """
+    corr = correlation_matrix(source, name, 'spearman', returns=True)
+    return sns.clustermap(corr, cmap='coolwarm').fig
+
+
 def plot_scatter(
     title,
     x_metric,
     y_metrics,
     x_axis_title,
     y_axis_title,
-    df_aggregated
+    df_aggregated,
+    max_points=None,
+    method=LTTB,
+    webgl=False,
+    time_range=None
 ):
     """
-    Function to plot and format a scatterplot from the aggregated dataframe
+    Function to plot and format a scatterplot from the aggregated dataframe.
+    Each trace is downsampled to max_points points within time_range,
+    WebGL traces are used if webgl is True
     """
+    if time_range is not None:
+        df_aggregated = df_aggregated.loc[time_range[0]:time_range[1]]
+    scatter = go.Scattergl if webgl else go.Scatter
+
     data = []
     shapes = list()
     for y_metric in y_metrics:
+        series = decimate_series(df_aggregated[y_metric], max_points, method)
         data.append(
-            go.Scatter(
-                x=df_aggregated.index,
-                y=df_aggregated[y_metric],
+            scatter(
+                x=series.index,
+                y=series,
                 mode='lines',
                 marker=dict(opacity=0.8, line=dict(width=0)),
                 name=y_metric
@@ -103,24 +247,53 @@ def plot_scatter(
     st.plotly_chart(fig)
 
 
-def plot_correlation_matrix(df_aggregated):
+def plot_correlation_matrix(source, name):
     """
-    Display correlation matrix for features
+    Display correlation matrix for features of processed dataset by name
     """
-    FEATURES = df_aggregated.columns
-    df_features = pd.DataFrame(df_aggregated[FEATURES])
-    corr = df_features.corr()
-    corr.style.background_gradient(cmap='coolwarm')
+    corr = correlation_matrix(source, name)
+    FEATURES = corr.columns
     fig = go.Figure(data=go.Heatmap(x=FEATURES, y=FEATURES, z=corr))
     st.plotly_chart(fig)
 
 
-def plot_corr_matrix(df):
+def plot_rolling_correlations(source, name, window, step, pairs, display_settings):
+    """
+    Display rolling correlations between the features of processed dataset
+    by name: a heatmap of all the pairs over time and the time series of
+    the pairs selected
+    """
+    corr = rolling_correlation(source, name, window, step)
+    corr = corr.set_axis([f'{a} / {b}' for a, b in corr.columns], axis=1)
+
+    time_range = display_settings['time_range']
+    heatmap = corr.loc[time_range[0]:time_range[1]]
+    fig = go.Figure(data=go.Heatmap(
+        x=heatmap.index,
+        y=heatmap.columns,
+        z=heatmap.T,
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu'
+    ))
+    fig.update_layout(title=f'Rolling correlations, {window} ms window', height=800)
+    st.plotly_chart(fig)
+
+    if pairs:
+        plot_scatter(
+            'Rolling correlations of the pairs selected',
+            'Time',
+            pairs,
+            'Time',
+            'Correlation',
+            corr,
+            **display_settings
+        )
+
+
+def plot_corr_matrix(source, name):
     """ Alternative implementation of displaying correlation matrix """
-    df = df.pct_change()
-    corr = df.corr(method='spearman')
-    sns.clustermap(corr, cmap='coolwarm')
-    st.pyplot()
+    st.pyplot(clustermap_figure(source, name))
 
 
 def main():
@@ -132,9 +305,27 @@ def main():
     st.subheader('Raw features')
     st.write(FEATURES)
 
+    # Display settings
+    st.sidebar.header('Display settings')
+    nrows = st.sidebar.number_input(
+        'Rows to load per file, 0 for all',
+        min_value=0,
+        value=50000,
+        step=10000
+    )
+    max_points = st.sidebar.number_input(
+        'Points per trace, 0 to plot all',
+        min_value=0,
+        value=2000,
+        step=500
+    )
+    method = st.sidebar.selectbox('Downsampling method', METHODS)
+    webgl = st.sidebar.checkbox('Render with WebGL')
+
     # Get QoE pristine dataset (no attacks)
-    df_snd = load_data(SND_LOGS, 50000)
-    df_rcv = load_data(RCV_LOGS, 50000)
+    source = data_source(SND_LOGS, RCV_LOGS, nrows or None)
+    df_snd = load_data(source.snd_uri, source.nrows, source.snd_identity)
+    df_rcv = load_data(source.rcv_uri, source.nrows, source.rcv_identity)
 
     # Display raw datasets
     st.subheader('Raw SENDER data')
@@ -144,22 +335,7 @@ def main():
     st.write(df_rcv, df_rcv.shape)
 
     # Preprocess the datasets to align time series and remove spurious data
-    # Filter out zero values
-    df_snd = df_snd.loc[:, (df_snd != 0).any(axis=0)]
-    df_rcv = df_rcv.loc[:, (df_rcv != 0).any(axis=0)]
-    # Remove NANs
-    df_snd = df_snd.dropna()
-    df_rcv = df_rcv.dropna()
-    # Align time series
-    df_snd = df_snd[df_snd['Time'] > df_rcv['Time'].min()]
-    df_rcv = df_rcv[df_rcv['Time'] < df_snd['Time'].max()]
-
-    df_snd.set_index('Time', inplace=True)
-    df_rcv.set_index('Time', inplace=True)
-   
-    df_synchronized = df_snd.join(df_rcv, how='outer', lsuffix='_snd', rsuffix='_rcv')
-    df_synchronized = df_synchronized.interpolate()
-    df_synchronized['Rate'] = df_synchronized['mbpsSendRate'] / (df_synchronized['mbpsRecvRate'])
+    df_snd, df_rcv, df_synchronized = synchronize(source)
 
     # Display processed datasets
     st.subheader('Processed SENDER data')
@@ -174,13 +350,30 @@ def main():
     st.subheader('Summary, SYNCHRONIZED data')
     st.write(df_synchronized.describe())
 
+    # Time range to plot, the narrower it is the more detailed the plots are
+    time_min = int(df_synchronized.index.min())
+    time_max = int(df_synchronized.index.max())
+    time_range = st.sidebar.slider(
+        'Time range, ms',
+        time_min,
+        time_max,
+        (time_min, time_max)
+    )
+    display_settings = dict(
+        max_points=max_points or None,
+        method=method,
+        webgl=webgl,
+        time_range=time_range
+    )
+
     plot_scatter(
         'SENDER Time series',
         'Time',
         df_snd.columns,
         'Time',
         'SENDER',
-        df_snd
+        df_snd,
+        **display_settings
     )
 
     plot_scatter(
@@ -189,7 +382,8 @@ def main():
         df_rcv.columns,
         'Time',
         'RECEIVER',
-        df_rcv
+        df_rcv,
+        **display_settings
     )
 
     plot_scatter(
@@ -198,19 +392,42 @@ def main():
         df_synchronized.columns,
         'Time',
         'SYNCHRONIZED',
-        df_synchronized
+        df_synchronized,
+        **display_settings
     )
 
     # Display correlation matrixs
     st.write('Correlation matrices on levels, Pearson')
-    plot_correlation_matrix(df_rcv)
-    plot_correlation_matrix(df_snd)
-    plot_correlation_matrix(df_synchronized)
+    plot_correlation_matrix(source, 'rcv')
+    plot_correlation_matrix(source, 'snd')
+    plot_correlation_matrix(source, 'synchronized')
 
     st.write('Correlation matrices on returns, Spearman')
-    plot_corr_matrix(df_rcv)
-    plot_corr_matrix(df_snd)
-    plot_corr_matrix(df_synchronized)
+    plot_corr_matrix(source, 'rcv')
+    plot_corr_matrix(source, 'snd')
+    plot_corr_matrix(source, 'synchronized')
+
+    # Display rolling correlations
+    st.sidebar.header('Rolling correlations')
+    window = st.sidebar.number_input(
+        'Window, ms',
+        min_value=100,
+        value=10000,
+        step=1000
+    )
+    step = st.sidebar.number_input(
+        'Step, ms',
+        min_value=10,
+        value=1000,
+        step=100
+    )
+    features = df_synchronized.select_dtypes('number').columns
+    pairs = st.sidebar.multiselect(
+        'Pairs to plot',
+        [f'{a} / {b}' for i, a in enumerate(features) for b in features[i + 1:]]
+    )
+    st.subheader('Rolling correlations, SYNCHRONIZED data')
+    plot_rolling_correlations(source, 'synchronized', window, step, pairs, display_settings)
 
 
 if __name__ == '__main__':
@@ -5,7 +5,7 @@ from setuptools import setup, find_packages
 install_requires = [
     'pathlib>=1.0.1',
     'pandas>=0.25.1',
-    'streamlit>=0.56.0',
+    'streamlit>=0.57.0',
     'tcpdump_processing @ git+https://github.com/mbakholdina/lib-tcpdump-processing.git@master#egg=tcpdump_processing',
 ]
 
@@ -18,7 +18,10 @@ setup(
     install_requires=install_requires,
     entry_points={
         'console_scripts': [
-            'join-stats = srt_stats_analysis.join_stats:main'
+            'join-stats = srt_stats_analysis.join_stats:main',
+            'follow-stats = srt_stats_analysis.follow:main',
+            'batch-join-stats = srt_stats_analysis.batch:main',
+            'index-stats = srt_stats_analysis.csv_index:main',
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Module with the kernel used to align datasets: interpolation of secondary
+time series onto the reference timepoints.
+
+The kernel gives the same values as joining both datasets with an outer
+join, doing linear interpolation with pd.DataFrame.interpolate() and
+filling the first missing values backward, as align functions used to do.
+pd.DataFrame.interpolate() treats the rows as equally spaced, so the values
+are interpolated over the positions of the timepoints in the joined
+timeline rather than over the time. The positions are obtained with
+binary search on int64 timepoints, so the joined dataframe is never built
+and only the output columns are allocated.
+
+Per-interval counters, e.g. the number of packets received since
+the previous timepoint, can not be interpolated. They are redistributed
+onto the reference timepoints proportionally to the overlap of
+the intervals instead, see redistribute_onto.
+"""
+import numpy as np
+import pandas as pd
+
+
+def timepoints_to_int64(index: pd.DatetimeIndex):
+    """
+    Convert datetime64 index to int64 nanoseconds without copying.
+
+    Attributes:
+        index:
+            Datetime index, timezone naive or aware.
+    """
+    return index.asi8
+
+
+def union_positions(ref_timepoints: np.ndarray, timepoints: np.ndarray):
+    """
+    Calculate the positions of the reference and secondary timepoints in
+    the sorted union of both. Equal reference and secondary timepoints
+    share the same position the same way as the rows of an outer join.
+
+    Both arrays should be sorted in increasing order, the reference
+    timepoints should be unique.
+
+    Attributes:
+        ref_timepoints:
+            Reference timepoints, int64.
+        timepoints:
+            Secondary timepoints, int64.
+    """
+    # Secondary timepoints equal to reference ones share the row with them,
+    # so only the rest of them shift the positions of the reference ones
+    left = np.searchsorted(ref_timepoints, timepoints, 'left')
+    right = np.searchsorted(ref_timepoints, timepoints, 'right')
+    unmatched = timepoints[left == right]
+
+    ref_positions = np.arange(len(ref_timepoints)) + np.searchsorted(unmatched, ref_timepoints, 'left')
+    positions = left + np.searchsorted(unmatched, timepoints, 'left')
+    return ref_positions, positions
+
+
+def interpolate_column(x: np.ndarray, xp: np.ndarray, values: np.ndarray):
+    """
+    Interpolate values given at positions xp onto positions x skipping
+    missing values. Beyond the first and the last valid values, they are
+    repeated.
+
+    Attributes:
+        x:
+            Positions to calculate the values at.
+        xp:
+            Positions the values are given at, increasing.
+        values:
+            Values to interpolate.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.full(len(x), np.nan)
+    if valid.all():
+        return np.interp(x, xp, values)
+    return np.interp(x, xp[valid], values[valid])
+
+
+def fill_column(positions: np.ndarray, values: np.ndarray):
+    """
+    Fill in missing values of a reference column by interpolation over
+    its own valid values.
+
+    Attributes:
+        positions:
+            Positions of the reference timepoints in the union timeline.
+        values:
+            Values of the reference column.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values
+    missing = np.isnan(values)
+    if not missing.any() or missing.all():
+        return values
+    values = values.copy()
+    values[missing] = np.interp(positions[missing], positions[~missing], values[~missing])
+    return values
+
+
+def cumulative_counts(edges: np.ndarray, starts: np.ndarray, ends: np.ndarray, counts: np.ndarray):
+    """
+    Calculate the number of events up to each edge given the number of
+    events within intervals (start, end], the events are assumed to be
+    evenly spread over the interval. Events of empty intervals happen
+    at their end.
+
+    Attributes:
+        edges:
+            Timepoints to count the events up to, int64.
+        starts:
+            Starts of the intervals, int64.
+        ends:
+            Ends of the intervals, int64, sorted in increasing order.
+        counts:
+            Number of events within each interval, float64.
+    """
+    cumulative = np.concatenate([[0.0], np.cumsum(counts)])
+    # Intervals ended by the edge are counted in full
+    ended = np.searchsorted(ends, edges, 'right')
+    result = cumulative[ended]
+
+    # The interval the edge falls into is counted in part
+    current = np.minimum(ended, len(ends) - 1)
+    inside = (ended < len(ends)) & (starts[current] < edges)
+    current = current[inside]
+    result[inside] += (
+        counts[current]
+        * (edges[inside] - starts[current]).astype(np.float64)
+        / (ends[current] - starts[current]).astype(np.float64)
+    )
+    return result
+
+
+def redistribute_onto(
+    ref: pd.DataFrame,
+    df: pd.DataFrame,
+    columns: list=None,
+    start=None,
+    offsets: dict=None
+):
+    """
+    Redistribute per-interval counters of the secondary dataframe onto
+    the timepoints of the reference dataframe proportionally to the time
+    overlap of the intervals. Return dataframe with the reference index
+    and the redistributed columns, int64.
+
+    The value at a timepoint is the number of events since the previous
+    timepoint of the same dataset. Cumulative sums of the events are
+    rounded at the reference timepoints, so the values stay integer and
+    the total of each counter is preserved exactly. Missing values are
+    treated as no events.
+
+    The timeline may be redistributed in parts: passing the end of the
+    last secondary interval redistributed completely as start and
+    the number of events of the following intervals redistributed already
+    as offsets gives the same values as redistributing the whole timeline
+    at once.
+
+    Attributes:
+        ref:
+            Reference dataframe indexed by unique timepoints.
+        df:
+            Secondary dataframe indexed by timepoints.
+        columns:
+            Columns of the secondary dataframe to redistribute. If None,
+            all the columns are redistributed.
+        start:
+            Start of the first secondary interval, secondary rows up to
+            it are ignored. If None, the first secondary interval starts
+            at the first reference timepoint, so the first reference
+            timepoint gets the events of the secondary rows up to it.
+        offsets:
+            Number of events of the secondary rows after start which
+            have been redistributed already, per column.
+    """
+    ref = sort_by_time(ref)
+    df = sort_by_time(df)
+    if columns is None:
+        columns = list(df.columns)
+    if offsets is None:
+        offsets = {}
+
+    edges = timepoints_to_int64(ref.index)
+    ends = timepoints_to_int64(df.index)
+    if start is not None:
+        start = pd.Timestamp(start).value
+        df = df[ends > start]
+        ends = ends[ends > start]
+
+    data = {}
+    if len(ends) == 0 or len(edges) == 0:
+        for col in columns:
+            data[col] = np.zeros(len(edges), dtype=np.int64)
+        return pd.DataFrame(data, index=ref.index)
+
+    starts = np.empty_like(ends)
+    starts[1:] = ends[:-1]
+    starts[0] = min(edges[0], ends[0]) if start is None else start
+
+    for col in columns:
+        counts = np.nan_to_num(df[col].to_numpy(dtype=np.float64))
+        # Rounding half up commutes with adding the integer number of
+        # events before the part, so parts sum up to the whole
+        rounded = np.floor(cumulative_counts(edges, starts, ends, counts) + 0.5)
+        data[col] = np.diff(rounded, prepend=float(offsets.get(col, 0))).astype(np.int64)
+    return pd.DataFrame(data, index=ref.index)
+
+
+def sort_by_time(df: pd.DataFrame):
+    """
+    Sort dataframe by its datetime index keeping the order of equal
+    timepoints, no copy is done if it is already sorted.
+
+    Attributes:
+        df:
+            Dataframe indexed by timepoints.
+    """
+    if df.index.is_monotonic_increasing:
+        return df
+    return df.iloc[np.argsort(timepoints_to_int64(df.index), kind='stable')]
+
+
+def interpolate_onto(ref: pd.DataFrame, df: pd.DataFrame, columns: list=None):
+    """
+    Interpolate columns of the secondary dataframe onto the timepoints of
+    the reference dataframe. Return dataframe with the reference index and
+    the interpolated columns, as well as the columns of the reference
+    dataframe with missing values filled in.
+
+    Attributes:
+        ref:
+            Reference dataframe indexed by unique timepoints.
+        df:
+            Secondary dataframe indexed by timepoints.
+        columns:
+            Columns of the secondary dataframe to interpolate. If None,
+            all the columns are interpolated.
+    """
+    ref = sort_by_time(ref)
+    df = sort_by_time(df)
+    if columns is None:
+        columns = list(df.columns)
+
+    ref_positions, positions = union_positions(
+        timepoints_to_int64(ref.index),
+        timepoints_to_int64(df.index)
+    )
+
+    data = {}
+    for col in ref.columns:
+        data[col] = fill_column(ref_positions, ref[col].to_numpy())
+    for col in columns:
+        data[col] = interpolate_column(ref_positions, positions, df[col].to_numpy())
+    return pd.DataFrame(data, index=ref.index)
@@ -0,0 +1,329 @@
+"""
+Module designed to run the join-stats pipeline over many experiments
+in parallel.
+
+Experiments are expected to be laid out the following way
+
+    <root>/<experiment>/<host>/N-srt-xtransmit-stats-snd.csv
+    <root>/<experiment>/<host>/N-srt-xtransmit-stats-rcv.csv
+    <root>/<experiment>/<host>/N-tshark-tracefile-snd.pcapng
+    <root>/<experiment>/<host>/N-tshark-tracefile-rcv.pcapng
+
+where sender and receiver files are usually collected on different hosts.
+Each experiment is processed in a separate worker process, a failure in
+one experiment does not stop the others.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import pathlib
+import time
+import traceback
+import typing
+
+import pandas as pd
+
+from srt_stats_analysis.cache import Cache
+from srt_stats_analysis.instrumentation import set_verbose
+from srt_stats_analysis.join_stats import add_cache_arguments, cache_from_arguments, run_pipeline
+from srt_stats_analysis.resample import resample_stats
+from srt_stats_analysis.store import save_results
+from srt_stats_analysis.warehouse import Warehouse
+
+
+# Name patterns of the files collected within an experiment
+SND_STATS_PATTERN = '*-srt-xtransmit-stats-snd.csv'
+RCV_STATS_PATTERN = '*-srt-xtransmit-stats-rcv.csv'
+SND_TSHARK_PATTERN = '*-tshark-tracefile-snd.pcapng'
+RCV_TSHARK_PATTERN = '*-tshark-tracefile-rcv.pcapng'
+
+# Formats to save aligned datasets in: .csv files or stores queried
+# by time range, see srt_stats_analysis.store
+CSV = 'csv'
+STORE = 'store'
+OUTPUT_FORMATS = [CSV, STORE]
+
+# Columns of the summary table, traceback is set for failed experiments
+SUMMARY_COLUMNS = [
+    'experiment',
+    'status',
+    'rows',
+    'rtt_ms',
+    'clocks_diff_ms',
+    'elapsed_s',
+    'error',
+    'traceback',
+]
+
+
+class Experiment(typing.NamedTuple):
+    """ Source files of an experiment. """
+    name: str
+    snd_stats_csv: pathlib.Path
+    rcv_stats_csv: pathlib.Path
+    snd_tshark_pcapng: pathlib.Path
+    rcv_tshark_pcapng: pathlib.Path
+
+
+def find_file(directory: pathlib.Path, pattern: str):
+    """
+    Find the only file matching the pattern in the host directories
+    of an experiment.
+
+    Attributes:
+        directory:
+            Experiment directory.
+        pattern:
+            Name pattern of the file.
+    """
+    files = sorted(directory.glob(f'*/{pattern}'))
+    if len(files) != 1:
+        raise Exception(
+            f'Expected exactly one file matching {pattern} in {directory}, '
+            f'found {len(files)}'
+        )
+    return files[0]
+
+
+def discover_experiments(root):
+    """
+    Find experiment directories under the root, i.e. the directories
+    having sender or receiver statistics in their host subdirectories.
+
+    Attributes:
+        root:
+            Directory containing experiment directories.
+    """
+    root = pathlib.Path(root)
+    experiments = []
+    for directory in sorted(root.iterdir()):
+        if not directory.is_dir():
+            continue
+        if any(directory.glob(f'*/{SND_STATS_PATTERN}')) or any(directory.glob(f'*/{RCV_STATS_PATTERN}')):
+            experiments.append(directory)
+    return experiments
+
+
+def pair_files(directory: pathlib.Path):
+    """
+    Pair sender and receiver files of an experiment by name patterns.
+
+    Attributes:
+        directory:
+            Experiment directory.
+    """
+    return Experiment(
+        directory.name,
+        find_file(directory, SND_STATS_PATTERN),
+        find_file(directory, RCV_STATS_PATTERN),
+        find_file(directory, SND_TSHARK_PATTERN),
+        find_file(directory, RCV_TSHARK_PATTERN),
+    )
+
+
+def process_experiment(
+    directory: pathlib.Path,
+    output_dir: pathlib.Path=None,
+    cache: Cache=None,
+    resample: str=None,
+    output_format: str=CSV,
+    warehouse: str=None
+):
+    """
+    Run the pipeline for one experiment and return the summary of the run.
+    Any exception is caught and reported in the summary.
+
+    Attributes:
+        directory:
+            Experiment directory.
+        output_dir:
+            Directory to save aligned SRT statistics and tshark data in as
+            <experiment>.csv or <experiment> store. If None, the result
+            is not saved.
+        cache:
+            Cache of parsed datasets. If None, the files are always parsed.
+        resample:
+            If set, the result is resampled onto a fixed time grid with
+            this interval, e.g. '1s', before saving.
+        output_format:
+            Format to save the result in, one of OUTPUT_FORMATS.
+        warehouse:
+            Filepath to SQLite experiment warehouse to ingest the result
+            into, tagged with the experiment metadata. If None, the result
+            is not ingested.
+    """
+    summary = {
+        'experiment': directory.name,
+        'status': 'failed',
+        'rows': None,
+        'rtt_ms': None,
+        'clocks_diff_ms': None,
+        'elapsed_s': None,
+        'error': None,
+    }
+    start = time.perf_counter()
+    # The pipeline prints intermediate dataframes, they would interleave
+    # in the output of concurrent workers
+    set_verbose(False)
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            experiment = pair_files(directory)
+            rtt, clocks_diff, df = run_pipeline(
+                experiment.snd_stats_csv,
+                experiment.rcv_stats_csv,
+                experiment.snd_tshark_pcapng,
+                experiment.rcv_tshark_pcapng,
+                cache,
+                # Experiments are processed in parallel already
+                jobs=1
+            )
+        if resample is not None:
+            df = resample_stats(df, resample)
+        if output_dir is not None and output_format == STORE:
+            save_results(df, output_dir / directory.name, overwrite=True)
+        elif output_dir is not None:
+            df.to_csv(output_dir / f'{directory.name}.csv')
+        if warehouse is not None:
+            # Workers wait for each other to write to the database
+            with Warehouse(warehouse) as experiments:
+                experiments.ingest(directory.name, df)
+        summary.update(status='ok', rows=len(df), rtt_ms=rtt, clocks_diff_ms=clocks_diff)
+    except Exception:
+        summary['error'] = traceback.format_exc().strip().splitlines()[-1]
+        summary['traceback'] = traceback.format_exc()
+    summary['elapsed_s'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def process_experiments(
+    directories: list,
+    workers: int=None,
+    output_dir: pathlib.Path=None,
+    cache: Cache=None,
+    resample: str=None,
+    output_format: str=CSV,
+    warehouse: str=None
+):
+    """
+    Run the pipeline for experiments in a process pool and return
+    the summary table, one row per experiment.
+
+    Attributes:
+        directories:
+            Experiment directories.
+        workers:
+            Number of worker processes. If None, the number of CPUs is used.
+        output_dir:
+            Directory to save aligned SRT statistics and tshark data in.
+        cache:
+            Cache of parsed datasets. If None, the files are always parsed.
+        resample:
+            If set, the results are resampled onto a fixed time grid with
+            this interval, e.g. '1s'.
+        output_format:
+            Format to save the results in, one of OUTPUT_FORMATS.
+        warehouse:
+            Filepath to SQLite experiment warehouse to ingest the results
+            into. If None, the results are not ingested.
+    """
+    if output_dir is not None:
+        output_dir = pathlib.Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    summaries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                process_experiment,
+                directory,
+                output_dir,
+                cache,
+                resample,
+                output_format,
+                warehouse
+            ): directory
+            for directory in directories
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as error:
+                # The worker process itself has failed, e.g. was killed
+                summary = {
+                    'experiment': futures[future].name,
+                    'status': 'failed',
+                    'error': repr(error),
+                }
+            print(f"{summary['experiment']}: {summary['status']}", flush=True)
+            summaries.append(summary)
+
+    # Columns are given explicitly so that the table is the same with
+    # no experiments processed
+    summary = pd.DataFrame(summaries, columns=SUMMARY_COLUMNS).set_index('experiment').sort_index()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Align SRT core statistics and tshark data for all '
+        'the experiments found in the directory.'
+    )
+    parser.add_argument('root', help='Directory containing experiment directories')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes'
+    )
+    parser.add_argument(
+        '--output-dir',
+        help='Directory to save aligned datasets in as <experiment>.csv '
+        'or <experiment> store'
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=OUTPUT_FORMATS,
+        default=CSV,
+        help='Format to save aligned datasets in, store is a directory '
+        'of memory-mapped columns queried by time range'
+    )
+    parser.add_argument(
+        '--warehouse',
+        help='SQLite experiment warehouse to ingest aligned datasets into, '
+        'see srt_stats_analysis.warehouse'
+    )
+    parser.add_argument(
+        '--resample',
+        help='Resample aligned datasets onto a fixed time grid before saving, e.g. 1s'
+    )
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    directories = discover_experiments(args.root)
+    print(f'Found {len(directories)} experiments in {args.root}')
+
+    summary = process_experiments(
+        directories,
+        args.workers,
+        args.output_dir,
+        cache_from_arguments(args),
+        args.resample,
+        args.output_format,
+        args.warehouse
+    )
+
+    print('\nSummary')
+    columns = [col for col in summary.columns if col != 'traceback']
+    print(summary[columns].to_string())
+
+    for name, row in summary.iterrows():
+        if isinstance(row.get('traceback'), str):
+            print(f'\nExperiment {name} failed')
+            print(row['traceback'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+Module designed to cache parsed SRT statistics and tshark datasets on disk
+so that the same source files are not parsed again and again, e.g., when
+sweeping analysis parameters.
+
+Each cache entry is a directory with one .npy file per column, the index
+and a small meta.json header. Numeric and datetime columns are loaded as
+memory-mapped arrays. Entries are keyed by the kind of data, the source
+filepath, its size, modification time and content fingerprint. The least
+recently used entries are evicted once the cache exceeds its size limit.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# Environment variables to configure the default cache
+CACHE_DIR_ENV = 'SRT_STATS_CACHE_DIR'
+CACHE_SIZE_ENV = 'SRT_STATS_CACHE_SIZE'
+
+DEFAULT_CACHE_DIR = pathlib.Path.home() / '.cache' / 'srt-stats-analysis'
+DEFAULT_CACHE_SIZE = 4 * 1024 ** 3
+
+# Size of blocks read from the beginning, the middle and the end
+# of the source file to calculate its content fingerprint
+FINGERPRINT_BLOCK_SIZE = 1024 ** 2
+
+# Version of the cache entries layout, bump it when the layout changes
+LAYOUT_VERSION = 1
+
+
+def fingerprint(path: pathlib.Path):
+    """
+    Calculate the content fingerprint of a file: hash of the file size
+    and of the blocks at the beginning, in the middle and at the end.
+
+    Attributes:
+        path:
+            Filepath to the source file.
+    """
+    size = path.stat().st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with path.open('rb') as f:
+        for offset in (0, size // 2, size - FINGERPRINT_BLOCK_SIZE):
+            f.seek(max(offset, 0))
+            digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def _save_array(path: pathlib.Path, values):
+    """
+    Save column values in .npy file, return the description of the column
+    needed to restore it.
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        np.save(path, values.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy())
+        return {'kind': 'datetimetz', 'tz': str(values.dt.tz)}
+
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufcmM':
+        np.save(path, values.to_numpy())
+        return {'kind': 'numpy'}
+
+    array = values.to_numpy(dtype=object)
+    if all(isinstance(value, str) for value in array):
+        np.save(path, array.astype(str))
+        return {'kind': 'str'}
+
+    np.save(path, array, allow_pickle=True)
+    return {'kind': 'object'}
+
+
+def _load_array(path: pathlib.Path, column: dict):
+    """ Load column values saved by _save_array. """
+    if column['kind'] == 'object':
+        return np.load(path, allow_pickle=True)
+
+    values = np.load(path, mmap_mode='r')
+    if column['kind'] == 'datetimetz':
+        # Values are saved in UTC+0, the array with the timezone views them
+        return pd.arrays.DatetimeArray(values, dtype=pd.DatetimeTZDtype(tz=column['tz']), copy=False)
+    if column['kind'] == 'str':
+        return values.astype(object)
+    return values
+
+
+def save_frame(df: pd.DataFrame, directory: pathlib.Path):
+    """
+    Save dataframe in the directory, one .npy file per column.
+
+    Attributes:
+        df:
+            Dataframe to save.
+        directory:
+            Directory to save the dataframe in, it should exist.
+    """
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = _save_array(directory / f'{i}.npy', df.iloc[:, i])
+        column['name'] = name
+        columns.append(column)
+    index = _save_array(directory / 'index.npy', df.index.to_series())
+    index['name'] = df.index.name
+    meta = {'version': LAYOUT_VERSION, 'columns': columns, 'index': index}
+    with (directory / 'meta.json').open('w') as f:
+        json.dump(meta, f)
+
+
+def load_frame(directory: pathlib.Path):
+    """
+    Load dataframe saved by save_frame function.
+
+    Attributes:
+        directory:
+            Directory the dataframe is saved in.
+    """
+    with (directory / 'meta.json').open() as f:
+        meta = json.load(f)
+    if meta['version'] != LAYOUT_VERSION:
+        raise Exception(f'Unsupported cache layout version {meta["version"]}')
+    index = pd.Index(_load_array(directory / 'index.npy', meta['index']), name=meta['index']['name'], copy=False)
+    data = {
+        i: _load_array(directory / f'{i}.npy', column)
+        for i, column in enumerate(meta['columns'])
+    }
+    # Without copying, blocks of the same dtype are not consolidated, so
+    # the columns stay views of the mapped files, as in store.ResultStore
+    df = pd.DataFrame(data, index=index, columns=list(data), copy=False)
+    df.columns = [column['name'] for column in meta['columns']]
+    return df
+
+
+class Cache:
+    """
+    On-disk cache of dataframes parsed out of source files.
+
+    Attributes:
+        directory:
+            Directory to keep cache entries in.
+        max_size:
+            Maximum size of the cache, bytes. The least recently used
+            entries are evicted when the limit is exceeded.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size: int=DEFAULT_CACHE_SIZE):
+        self.directory = pathlib.Path(directory)
+        self.max_size = max_size
+
+    def key(self, kind: str, source, params=None):
+        """
+        Calculate the key of a cache entry.
+
+        Attributes:
+            kind:
+                Kind of data parsed out of the source file, e.g.
+                'srt-stats' or 'srt-packets'.
+            source:
+                Filepath to the source file.
+            params:
+                Additional JSON serializable parameters the parsing
+                depends on.
+        """
+        source = pathlib.Path(source).resolve()
+        stat = source.stat()
+        description = json.dumps(
+            [kind, str(source), stat.st_size, stat.st_mtime_ns, fingerprint(source), params],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str):
+        """ Load the dataframe stored under the key, None if there is no entry. """
+        entry = self.directory / key
+        if not (entry / 'meta.json').exists():
+            return None
+        try:
+            df = load_frame(entry)
+        except Exception:
+            # Broken or outdated entry, parse the source again
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        # Mark the entry as recently used
+        os.utime(entry / 'meta.json')
+        return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        """ Store the dataframe under the key and evict old entries if needed. """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = pathlib.Path(tempfile.mkdtemp(prefix=f'.{key}-', dir=self.directory))
+        try:
+            save_frame(df, tmp)
+            shutil.rmtree(self.directory / key, ignore_errors=True)
+            tmp.rename(self.directory / key)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+
+    def load(self, kind: str, source, loader, params=None):
+        """
+        Return the dataframe parsed out of the source file from the cache,
+        if there is no entry, parse it with the loader and store.
+
+        Attributes:
+            kind:
+                Kind of data parsed out of the source file.
+            source:
+                Filepath to the source file.
+            loader:
+                Function without arguments returning the parsed dataframe.
+            params:
+                Additional JSON serializable parameters the parsing
+                depends on.
+        """
+        key = self.key(kind, source, params)
+        df = self.get(key)
+        if df is None:
+            df = loader()
+            self.put(key, df)
+        return df
+
+    def size(self):
+        """ Total size of the cache entries, bytes. """
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self, keep: str=None):
+        """
+        Remove the least recently used entries until the cache fits
+        the size limit.
+
+        Attributes:
+            keep:
+                Key of the entry which should not be evicted.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for entry, _, size in entries:
+            if total <= self.max_size:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """ Remove all the cache entries. """
+        for entry, _, _ in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for entry in self.directory.iterdir():
+            meta = entry / 'meta.json'
+            if entry.name.startswith('.') or not meta.exists():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((entry, meta.stat().st_mtime, size))
+        return entries
+
+
+def default_cache(directory=None, max_size: int=None):
+    """
+    Create the cache configured by environment variables if not set
+    explicitly.
+
+    Attributes:
+        directory:
+            Directory to keep cache entries in. If None, SRT_STATS_CACHE_DIR
+            environment variable or ~/.cache/srt-stats-analysis is used.
+        max_size:
+            Maximum size of the cache, bytes. If None, SRT_STATS_CACHE_SIZE
+            environment variable or 4 GiB is used.
+    """
+    if directory is None:
+        directory = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    if max_size is None:
+        max_size = int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE))
+    return Cache(directory, max_size)
@@ -0,0 +1,329 @@
+"""
+Module designed to work with tshark dumps collected during an experiment.
+
+A capture session extracts SRT packets out of the dump once, the first
+time they are needed, and keeps them together with UMSG_HANDSHAKE and
+UMSG_ACK packets derived from them, so that the dump is not parsed again
+when it is used by several functions within the same pipeline run.
+Headers of all SRT packets, data ones included, are extracted out of
+.pcapng dumps separately, only when they are needed to match packets
+across the dumps, or in the same pass over the dump as SRT packets
+if both are needed.
+
+Captures collected at the caller and listener sides are independent, so
+they are converted with tshark and parsed concurrently.
+"""
+import asyncio
+import concurrent.futures
+import pathlib
+import sys
+
+from tcpdump_processing.extract_packets import extract_srt_packets, extract_umsg_handshake_packets, extract_umsg_ack_packets
+
+from srt_stats_analysis import pcapng
+from srt_stats_analysis.cache import Cache
+from srt_stats_analysis.instrumentation import stage
+
+
+# Script run in a subprocess to convert .pcapng tshark dump into .csv file,
+# the filepath to .csv file is printed on the last line
+CONVERT_SCRIPT = (
+    'import pathlib, sys\n'
+    'from tcpdump_processing.convert import convert_to_csv\n'
+    'print(convert_to_csv(pathlib.Path(sys.argv[1])))\n'
+)
+
+
+def is_pcapng(tshark_path):
+    """ Check whether tshark dump is .pcapng file rather than .csv one. """
+    return pathlib.Path(tshark_path).suffix == '.pcapng'
+
+
+def read_srt_packets(tshark_path, cache: Cache=None):
+    """
+    Extract SRT packets from .csv tshark dump file or SRT control packets
+    from .pcapng tshark dump file directly, without converting it
+    into .csv file.
+
+    Attributes:
+        tshark_path:
+            Filepath to .csv tshark data or .pcapng tshark dump.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+    """
+    if is_pcapng(tshark_path):
+        kind = 'srt-control-packets'
+        load = lambda: pcapng.read_srt_control_packets(tshark_path)
+    else:
+        kind = 'srt-packets'
+        load = lambda: extract_srt_packets(tshark_path)
+
+    if cache is None:
+        return load()
+    return cache.load(kind, tshark_path, load)
+
+
+def read_srt_packet_headers(tshark_path, cache: Cache=None):
+    """
+    Extract SRT packets from .csv tshark dump file, data ones included, or
+    SRT headers of both data and control packets from .pcapng tshark dump
+    file directly.
+
+    Attributes:
+        tshark_path:
+            Filepath to .csv tshark data or .pcapng tshark dump.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+    """
+    if not is_pcapng(tshark_path):
+        return read_srt_packets(tshark_path, cache)
+
+    load = lambda: pcapng.read_srt_packet_headers(tshark_path)
+    if cache is None:
+        return load()
+    return cache.load('srt-packet-headers', tshark_path, load)
+
+
+def read_capture(tshark_path, cache: Cache=None):
+    """
+    Return the capture session with both SRT packets and SRT packet
+    headers extracted from the tshark dump, .pcapng dump is walked once
+    for both of them.
+
+    Attributes:
+        tshark_path:
+            Filepath to .csv tshark data or .pcapng tshark dump.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+    """
+    if not is_pcapng(tshark_path):
+        return Capture(tshark_path, cache, read_srt_packets(tshark_path, cache))
+
+    load = lambda: pcapng.read_srt_packet_headers_and_control_packets(tshark_path)
+    if cache is None:
+        headers, packets = load()
+    else:
+        headers_key = cache.key('srt-packet-headers', tshark_path)
+        packets_key = cache.key('srt-control-packets', tshark_path)
+        headers = cache.get(headers_key)
+        packets = cache.get(packets_key)
+        if headers is None or packets is None:
+            headers, packets = load()
+            cache.put(headers_key, headers)
+            cache.put(packets_key, packets)
+    return Capture(tshark_path, cache, packets, headers)
+
+
+class Capture:
+    """
+    Capture session: tshark dump with SRT packets extracted out of it
+    at most once.
+
+    Attributes:
+        tshark_path:
+            Filepath to .csv tshark data or .pcapng tshark dump.
+        cache:
+            Cache of parsed datasets. If None, the file is parsed
+            the first time the packets are needed.
+        srt_packets:
+            SRT packets already extracted from the dump, if any.
+        srt_packet_headers:
+            SRT packet headers already extracted from .pcapng dump, if any.
+    """
+
+    def __init__(
+        self,
+        tshark_path,
+        cache: Cache=None,
+        srt_packets=None,
+        srt_packet_headers=None
+    ):
+        self.tshark_path = tshark_path
+        self.cache = cache
+        self._srt_packets = srt_packets
+        self._srt_packet_headers = srt_packet_headers
+        self._umsg_handshake_packets = None
+        self._umsg_ack_packets = None
+
+    def __repr__(self):
+        return f'Capture({str(self.tshark_path)!r})'
+
+    @property
+    def loaded(self):
+        """ Whether SRT packets have been extracted from the dump already. """
+        return self._srt_packets is not None
+
+    @property
+    def headers_loaded(self):
+        """ Whether SRT packet headers have been extracted from the dump already. """
+        if not is_pcapng(self.tshark_path):
+            return self.loaded
+        return self._srt_packet_headers is not None
+
+    @property
+    def srt_packets(self):
+        """ SRT packets extracted from the dump. """
+        if self._srt_packets is None:
+            with stage('capture extraction') as measured:
+                self._srt_packets = read_srt_packets(self.tshark_path, self.cache)
+                measured.rows_out = len(self._srt_packets)
+        return self._srt_packets
+
+    @property
+    def srt_packet_headers(self):
+        """
+        SRT packets, data ones included, extracted from .csv dump
+        or headers of SRT packets extracted from .pcapng dump.
+        """
+        if not is_pcapng(self.tshark_path):
+            return self.srt_packets
+        if self._srt_packet_headers is None:
+            with stage('capture extraction') as measured:
+                self._srt_packet_headers = read_srt_packet_headers(self.tshark_path, self.cache)
+                measured.rows_out = len(self._srt_packet_headers)
+        return self._srt_packet_headers
+
+    @property
+    def umsg_handshake_packets(self):
+        """ UMSG_HANDSHAKE packets extracted from SRT packets. """
+        if self._umsg_handshake_packets is None:
+            if is_pcapng(self.tshark_path):
+                self._umsg_handshake_packets = pcapng.extract_umsg_handshake_packets(self.srt_packets)
+            else:
+                self._umsg_handshake_packets = extract_umsg_handshake_packets(self.srt_packets)
+        return self._umsg_handshake_packets
+
+    @property
+    def umsg_ack_packets(self):
+        """ UMSG_ACK packets extracted from SRT packets. """
+        if self._umsg_ack_packets is None:
+            if is_pcapng(self.tshark_path):
+                self._umsg_ack_packets = pcapng.extract_umsg_ack_packets(self.srt_packets)
+            else:
+                self._umsg_ack_packets = extract_umsg_ack_packets(self.srt_packets)
+        return self._umsg_ack_packets
+
+
+def as_capture(capture, cache: Cache=None):
+    """
+    Return the capture session for a tshark dump given either as
+    a filepath or as a capture session already.
+
+    Attributes:
+        capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump.
+        cache:
+            Cache of parsed datasets used if a new capture session
+            is created.
+    """
+    if isinstance(capture, Capture):
+        return capture
+    return Capture(capture, cache)
+
+
+def load_captures(captures: list, jobs: int=None, headers: bool=False):
+    """
+    Extract SRT packets out of the tshark dumps of capture sessions not
+    loaded yet, in parallel worker processes.
+
+    Attributes:
+        captures:
+            Capture sessions.
+        jobs:
+            Maximum number of dumps processed in parallel. If None, all
+            the dumps are processed at once, if 1, one after another in
+            the current process.
+        headers:
+            If True, SRT packet headers are extracted instead of SRT
+            packets, see Capture.srt_packet_headers.
+    """
+    def loaded(capture):
+        return capture.headers_loaded if headers else capture.loaded
+
+    def attribute(capture):
+        if headers and is_pcapng(capture.tshark_path):
+            return '_srt_packet_headers'
+        return '_srt_packets'
+
+    pending = []
+    for capture in captures:
+        if not loaded(capture) and all(capture is not other for other in pending):
+            pending.append(capture)
+
+    if jobs is None:
+        jobs = len(pending)
+    if jobs <= 1 or len(pending) <= 1:
+        for capture in pending:
+            if headers:
+                capture.srt_packet_headers
+            else:
+                capture.srt_packets
+        return
+
+    with stage('capture extraction') as measured:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+            results = executor.map(
+                read_srt_packet_headers if headers else read_srt_packets,
+                [capture.tshark_path for capture in pending],
+                [capture.cache for capture in pending]
+            )
+            for capture, packets in zip(pending, results):
+                setattr(capture, attribute(capture), packets)
+        measured.rows_out = sum(len(getattr(capture, attribute(capture))) for capture in pending)
+
+
+async def convert_to_csv_async(pcapng_path, semaphore: asyncio.Semaphore=None):
+    """
+    Convert .pcapng tshark dump into .csv file in a subprocess running
+    tshark and return the filepath to .csv file.
+
+    Attributes:
+        pcapng_path:
+            Filepath to .pcapng tshark dump.
+        semaphore:
+            Semaphore limiting the number of conversions run at once.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', CONVERT_SCRIPT, str(pcapng_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+
+    if process.returncode != 0:
+        raise Exception(
+            f'Failed to convert {pcapng_path} into .csv file: '
+            f'{stderr.decode().strip()}'
+        )
+    return pathlib.Path(stdout.decode().strip().splitlines()[-1])
+
+
+def convert_to_csv_concurrently(pcapng_paths: list, jobs: int=None):
+    """
+    Convert .pcapng tshark dumps into .csv files running tshark
+    subprocesses concurrently and return the filepaths to .csv files.
+
+    Attributes:
+        pcapng_paths:
+            Filepaths to .pcapng tshark dumps.
+        jobs:
+            Maximum number of conversions run at once. If None, all
+            the dumps are converted at once.
+    """
+    async def convert_all():
+        semaphore = asyncio.Semaphore(jobs or max(len(pcapng_paths), 1))
+        return await asyncio.gather(
+            *[convert_to_csv_async(path, semaphore) for path in pcapng_paths]
+        )
+
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(convert_all())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
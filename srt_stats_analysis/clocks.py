@@ -0,0 +1,405 @@
+"""
+Module designed to estimate the offset and the drift of the listener
+clock against the caller one over the whole session and to convert
+the timestamps taken at the listener side into the caller clock.
+
+The same SRT packets are found in the tshark dumps collected at both
+sides by their headers: the kind of the packet, the sequence or the ACK
+number, SRT timestamp and the destination socket ID. The headers are
+hashed and joined with hash tables partitioned by the keys, so that
+captures with tens of millions of packets are matched in seconds.
+
+For a matched packet, the difference between the times it was captured
+at the listener and the caller sides is the clock offset plus the one-way
+delay if the packet was sent by the caller and the offset minus the delay
+if it was sent by the listener. Within each time window, the offset is
+estimated as the middle between the smallest difference of the packets
+sent by the caller and the largest one of the packets sent by the listener,
+i.e. the packets delayed the least, which assumes symmetric minimum delays
+in both directions. The offset and the drift are then fitted with a line
+over the windows.
+"""
+import typing
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.capture import as_capture, load_captures
+from srt_stats_analysis.cache import Cache
+from srt_stats_analysis.instrumentation import print_frame, stage
+
+
+# Header fields identifying SRT packet, the ones present in both dumps
+# are used. The length of UDP datagram is used as well to tell apart
+# the packets which differ in payload only, e.g. handshakes
+KEY_FIELDS = [
+    'udp.length',
+    'srt.iscontrol',
+    'srt.type',
+    'srt.seqno',
+    'srt.msgno',
+    'srt.ackno',
+    'srt.timestamp',
+    'srt.id',
+]
+
+# Window the offset is estimated in before fitting the line
+DEFAULT_WINDOW = pd.Timedelta(seconds=1)
+
+# Odd constant mixing the header fields into the keys, 2^64 divided
+# by the golden ratio
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+# Number of high bits of the keys the hash join is partitioned by
+PARTITION_BITS = 8
+
+
+class ClockModel(typing.NamedTuple):
+    """
+    Listener clock against the caller one: listener time is caller time
+    plus offset_ms plus drift_ppm per million of time elapsed since
+    reference.
+
+    Attributes:
+        reference:
+            Caller time the offset is given at, UTC+0.
+        offset_ms:
+            Listener clock minus caller clock at reference, milliseconds.
+        drift_ppm:
+            Drift of the listener clock against the caller one, parts
+            per million.
+        rtt_ms:
+            Median of the smallest round trip times over the windows,
+            milliseconds.
+        packets:
+            Number of packets matched in both dumps.
+        windows:
+            Number of windows the line is fitted over.
+        residual_ms:
+            Standard deviation of the window offsets from the line,
+            milliseconds.
+    """
+    reference: pd.Timestamp
+    offset_ms: float
+    drift_ppm: float
+    rtt_ms: float
+    packets: int
+    windows: int
+    residual_ms: float
+
+
+def _nanoseconds(timestamps):
+    """ Timestamps as int64 nanoseconds since epoch, UTC+0 for tz-aware ones. """
+    return pd.DatetimeIndex(timestamps).asi8
+
+
+def packet_keys(packets: pd.DataFrame, fields: list):
+    """
+    Hash the header fields of SRT packets into uint64 keys. Missing
+    values, e.g. srt.seqno of control packets in tshark output, are
+    hashed as -1.
+
+    Attributes:
+        packets:
+            SRT packets, e.g. the output from pcapng.read_srt_packet_headers.
+        fields:
+            Names of the fields to hash.
+    """
+    keys = np.zeros(len(packets), dtype=np.uint64)
+    for field in fields:
+        values = packets[field]
+        if values.hasnans:
+            values = values.fillna(-1)
+        keys ^= values.to_numpy().astype(np.int64).view(np.uint64)
+        keys *= HASH_MULTIPLIER
+        keys ^= keys >> np.uint64(32)
+    return keys
+
+
+def join_keys(left: np.ndarray, right: np.ndarray):
+    """
+    Hash join of two arrays of keys: return the positions of the keys
+    found exactly once in both arrays, in the left and in the right one,
+    in no particular order.
+
+    The keys are partitioned by their high bits first, so that the hash
+    table of each partition fits in CPU cache.
+
+    Attributes:
+        left:
+            Keys, uint64.
+        right:
+            Keys, uint64.
+    """
+    keys = np.concatenate([left, right])
+    partitions = (keys >> np.uint64(64 - PARTITION_BITS)).astype(np.uint16)
+    order = np.argsort(partitions, kind='stable')
+    bounds = np.searchsorted(partitions[order], np.arange(2 ** PARTITION_BITS + 1))
+    keys = keys[order]
+
+    left_idx = []
+    right_idx = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        positions = order[start:end]
+        codes, uniques = pd.factorize(keys[start:end])
+        is_left = positions < len(left)
+        left_codes = codes[is_left]
+        right_codes = codes[~is_left]
+        unique = (
+            (np.bincount(left_codes, minlength=len(uniques)) == 1)
+            & (np.bincount(right_codes, minlength=len(uniques)) == 1)
+        )
+        # Positions of the keys in the right array by code, only the ones
+        # of the keys found exactly once are used
+        right_positions = np.empty(len(uniques), dtype=np.int64)
+        right_positions[right_codes] = positions[~is_left] - len(left)
+        matched = unique[left_codes]
+        left_idx.append(positions[is_left][matched])
+        right_idx.append(right_positions[left_codes[matched]])
+
+    return np.concatenate(left_idx), np.concatenate(right_idx)
+
+
+def match_packets(clr_packets: pd.DataFrame, list_packets: pd.DataFrame):
+    """
+    Find SRT packets captured both at the caller and the listener sides.
+    Return the times the matched packets were captured at, int64
+    nanoseconds in the clocks of the respective sides, and their
+    destination socket IDs, in no particular order.
+
+    Packets with the same headers seen more than once in either dump,
+    e.g. repeated handshakes, are ambiguous and skipped.
+
+    Attributes:
+        clr_packets:
+            SRT packets captured at the caller side.
+        list_packets:
+            SRT packets captured at the listener side.
+    """
+    fields = [field for field in KEY_FIELDS if field in clr_packets and field in list_packets]
+    if 'srt.timestamp' not in fields or 'srt.id' not in fields:
+        raise Exception('SRT packets do not have srt.timestamp and srt.id fields to match them')
+
+    clr_idx, list_idx = join_keys(
+        packet_keys(clr_packets, fields),
+        packet_keys(list_packets, fields)
+    )
+
+    return pd.DataFrame({
+        'clr_time': _nanoseconds(clr_packets['frame.time'])[clr_idx],
+        'list_time': _nanoseconds(list_packets['frame.time'])[list_idx],
+        'srt.id': clr_packets['srt.id'].to_numpy()[clr_idx].astype(np.int64),
+    })
+
+
+def split_directions(matched: pd.DataFrame):
+    """
+    Return the mask of the matched packets sent by the caller.
+
+    Packets sent to the same socket go in the same direction. The ones
+    sent by the caller arrive at the listener later in terms of time
+    difference than the ones sent by the listener by about the round trip
+    time, so destination sockets are split into two groups at the largest
+    gap between their median time differences.
+
+    Attributes:
+        matched:
+            Matched packets, the output from match_packets function.
+    """
+    diff = matched['list_time'] - matched['clr_time']
+    medians = diff.groupby(matched['srt.id']).median().sort_values()
+    if len(medians) < 2:
+        raise Exception('SRT packets are matched in one direction only')
+    gap = np.argmax(np.diff(medians.to_numpy()))
+    forward = medians.index[gap + 1:]
+    return matched['srt.id'].isin(forward).to_numpy()
+
+
+def fit_clock_model(matched: pd.DataFrame, window: pd.Timedelta=DEFAULT_WINDOW):
+    """
+    Fit the offset and the drift of the listener clock against the caller
+    one over the matched packets.
+
+    Attributes:
+        matched:
+            Matched packets, the output from match_packets function.
+        window:
+            Window the offset is estimated in before fitting the line.
+    """
+    if len(matched) == 0:
+        raise Exception('No SRT packets are captured at both sides')
+
+    clr_time = matched['clr_time'].to_numpy()
+    diff = matched['list_time'].to_numpy() - clr_time
+    forward = split_directions(matched)
+
+    # The packets delayed the least within each window
+    reference = clr_time.min()
+    windows = (clr_time - reference) // window.value
+    forward_min = pd.Series(diff[forward]).groupby(windows[forward]).min()
+    backward_max = pd.Series(diff[~forward]).groupby(windows[~forward]).max()
+    common = forward_min.index.intersection(backward_max.index)
+    if len(common) == 0:
+        raise Exception('SRT packets are matched in both directions in no time window')
+
+    forward_min = forward_min[common].to_numpy()
+    backward_max = backward_max[common].to_numpy()
+    offsets = (forward_min + backward_max) / 2 / 1000000
+    rtts = (forward_min - backward_max) / 1000000
+    seconds = (common.to_numpy() + 0.5) * window.value / 1000000000
+
+    # Fit the line, then once again without the windows far off it,
+    # e.g. the ones where no packet got through without queueing
+    keep = np.ones(len(offsets), dtype=bool)
+    for _ in range(2):
+        if keep.sum() >= 2:
+            drift, offset = np.polyfit(seconds[keep], offsets[keep], 1)
+        else:
+            drift, offset = 0.0, float(np.median(offsets[keep]))
+        residuals = offsets - (offset + drift * seconds)
+        # Deviations within a microsecond, the usual resolution
+        # of the timestamps, are not considered
+        center = np.median(residuals[keep])
+        deviation = np.median(np.abs(residuals[keep] - center))
+        inliers = keep & (np.abs(residuals - center) <= 3 * 1.4826 * deviation + 0.001)
+        if inliers.sum() == keep.sum() or inliers.sum() < 2:
+            break
+        keep = inliers
+
+    return ClockModel(
+        reference=pd.Timestamp(reference),
+        offset_ms=float(offset),
+        drift_ppm=float(drift * 1000),
+        rtt_ms=float(np.median(rtts[keep])),
+        packets=len(matched),
+        windows=int(keep.sum()),
+        residual_ms=float(np.std(residuals[keep])),
+    )
+
+
+def estimate_clock_model(
+    clr_capture,
+    list_capture,
+    cache: Cache=None,
+    jobs: int=None,
+    window: pd.Timedelta=DEFAULT_WINDOW
+):
+    """
+    Estimate the offset and the drift of the listener clock against
+    the caller one from SRT packets captured at both sides.
+
+    Attributes:
+        clr_capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump collected at the caller side.
+        list_capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump collected at the listener side.
+        cache:
+            Cache of parsed datasets used if captures are filepaths.
+            If None, the files are always parsed.
+        jobs:
+            Maximum number of tshark dumps parsed in parallel. If None,
+            both dumps are parsed at once, if 1, one after another.
+        window:
+            Window the offset is estimated in before fitting the line.
+    """
+    clr_capture = as_capture(clr_capture, cache)
+    list_capture = as_capture(list_capture, cache)
+
+    # Extract SRT packet headers from both tshark dumps in parallel
+    load_captures([clr_capture, list_capture], jobs, headers=True)
+    return fit_packets_clock_model(
+        clr_capture.srt_packet_headers,
+        list_capture.srt_packet_headers,
+        window
+    )
+
+
+def fit_packets_clock_model(
+    clr_packets: pd.DataFrame,
+    list_packets: pd.DataFrame,
+    window: pd.Timedelta=DEFAULT_WINDOW
+):
+    """
+    Estimate the offset and the drift of the listener clock against
+    the caller one from SRT packet headers extracted from tshark dumps
+    collected at both sides.
+
+    Attributes:
+        clr_packets:
+            SRT packet headers extracted from the caller side dump, see
+            capture.Capture.srt_packet_headers.
+        list_packets:
+            SRT packet headers extracted from the listener side dump.
+        window:
+            Window the offset is estimated in before fitting the line.
+    """
+    with stage('packet matching', len(clr_packets) + len(list_packets)) as measured:
+        matched = match_packets(clr_packets, list_packets)
+        measured.rows_out = len(matched)
+
+    print_frame('SRT packets matched in caller and listener dumps', matched)
+
+    with stage('clock fit', len(matched)):
+        model = fit_clock_model(matched, window)
+
+    print(f'\nSRT packets matched: {model.packets}')
+    print(f'\nInitial RTT: {round(model.rtt_ms, 2)} milliseconds')
+    print(
+        f'\nListener clock against caller one: {model.offset_ms:+.3f} milliseconds '
+        f'at {model.reference}, drift {model.drift_ppm:+.3f} ppm, '
+        f'residual {model.residual_ms:.3f} milliseconds'
+    )
+
+    return model
+
+
+def clock_offset(model: ClockModel, timestamps):
+    """
+    Return the offset of the listener clock against the caller one
+    at caller timestamps, int64 nanoseconds.
+
+    Attributes:
+        model:
+            Clock model, the output from estimate_clock_model function.
+        timestamps:
+            Timestamps in the caller clock.
+    """
+    elapsed = (_nanoseconds(timestamps) - model.reference.value).astype(np.float64)
+    return np.round(model.offset_ms * 1000000 + elapsed * model.drift_ppm / 1000000).astype(np.int64)
+
+
+def to_reference_clock(model: ClockModel, timestamps):
+    """
+    Convert timestamps taken in the listener clock into the caller clock.
+    The conversion keeps the order of the timestamps.
+
+    Attributes:
+        model:
+            Clock model, the output from estimate_clock_model function.
+        timestamps:
+            Timestamps in the listener clock, e.g. DatetimeIndex.
+    """
+    index = pd.DatetimeIndex(timestamps)
+    elapsed = (index.asi8 - model.reference.value).astype(np.float64)
+    elapsed = (elapsed - model.offset_ms * 1000000) / (1 + model.drift_ppm / 1000000)
+    converted = pd.DatetimeIndex(model.reference.value + np.round(elapsed).astype(np.int64), name=index.name)
+    if index.tz is not None:
+        converted = converted.tz_localize('UTC').tz_convert(index.tz)
+    return converted
+
+
+def correct_clock(df: pd.DataFrame, model: ClockModel):
+    """
+    Return dataframe indexed by the timestamps taken in the listener
+    clock with the index converted into the caller clock.
+
+    Attributes:
+        df:
+            Dataframe indexed by timestamps in the listener clock.
+        model:
+            Clock model, the output from estimate_clock_model function.
+    """
+    df = df.copy(deep=False)
+    df.index = to_reference_clock(model, df.index)
+    return df
@@ -0,0 +1,192 @@
+"""
+Module designed to compute correlations between SRT metrics, e.g. RTT,
+bandwidth, sending and receiving rates and losses, over a sliding time
+window, to see how the relationships between them change over a session.
+
+Pearson correlation of a window is computed out of the window sums
+of the values, their squares and their pairwise products. The sums are
+not recomputed for each window from scratch: they are differences of
+running (prefix) sums taken at the window bounds, so each window costs
+the same whatever its length. The values are centered by their means
+first to keep the running sums of long sessions accurate. Only the sums
+at the windows evaluated are kept in memory.
+
+Missing and infinite values are skipped pairwise, as in pd.DataFrame.corr,
+an infinite value would otherwise spoil the running sums of all the windows
+after it.
+"""
+import itertools
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.instrumentation import stage
+
+
+# Relative rounding error of running sums treated as zero variance
+ROUNDING = 1e-12
+
+
+def _span(index: pd.Index, span):
+    """ Convert window or step length into the units of index values. """
+    if isinstance(index, pd.DatetimeIndex):
+        return pd.Timedelta(span).value
+    if isinstance(span, (str, pd.Timedelta)):
+        raise Exception('Time windows require DatetimeIndex, use a number in index units')
+    return span
+
+
+def _index_values(index: pd.Index):
+    if isinstance(index, pd.DatetimeIndex):
+        return index.asi8
+    return np.asarray(index, dtype=np.float64)
+
+
+def window_bounds(index: pd.Index, window, step=None):
+    """
+    Return the positions of the first and the last rows of the windows
+    evaluated: a window (t - window, t] ends at each row or, if step is set,
+    at the last row of each step interval since the first timepoint.
+
+    Attributes:
+        index:
+            Timepoints, ascending.
+        window:
+            Window length: pd.Timedelta or offset string, e.g. '10s',
+            for DatetimeIndex, a number in index units for numeric index.
+        step:
+            Interval between the windows evaluated, the same units
+            as window. If None, a window ends at each row.
+    """
+    times = _index_values(index)
+    if step is None:
+        ends = np.arange(len(times))
+    else:
+        step = _span(index, step)
+        grid = np.arange(times[0] + step, times[-1] + step, step)
+        ends = np.unique(np.searchsorted(times, grid, 'right') - 1)
+        ends = ends[ends >= 0]
+    starts = np.searchsorted(times, times[ends] - _span(index, window), 'right')
+    return starts, ends
+
+
+def _window_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """ Sums of values over rows [start, end] taken out of running sums. """
+    running = np.concatenate([[0.0], np.cumsum(values)])
+    return running[ends + 1] - running[starts]
+
+
+def rolling_correlations(
+    df: pd.DataFrame,
+    window,
+    pairs: list=None,
+    step=None,
+    min_periods: int=2
+):
+    """
+    Compute Pearson correlations between pairs of columns over a sliding
+    time window. Return dataframe indexed by the last timepoints of
+    the windows with (column, column) pairs as columns.
+
+    Attributes:
+        df:
+            Aligned SRT statistics or other time series, indexed by
+            timepoints in ascending order.
+        window:
+            Window length: pd.Timedelta or offset string, e.g. '10s',
+            for DatetimeIndex, a number in index units for numeric index.
+        pairs:
+            Pairs of columns to correlate. If None, all the pairs of
+            numeric columns.
+        step:
+            Interval between the windows evaluated, the same units
+            as window. If None, a window ends at each row.
+        min_periods:
+            Minimum number of rows with both values present in a window
+            to compute the correlation, it is NaN otherwise.
+    """
+    with stage('rolling correlation', len(df)) as measured:
+        correlations = _rolling_correlations(df, window, pairs, step, min_periods)
+        measured.rows_out = len(correlations)
+    return correlations
+
+
+def _rolling_correlations(df, window, pairs, step, min_periods):
+    """ Body of rolling_correlations function. """
+    if pairs is None:
+        pairs = list(itertools.combinations(df.select_dtypes('number').columns, 2))
+    columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+    starts, ends = window_bounds(df.index, window, step)
+
+    values = df[columns].to_numpy(dtype=np.float64, copy=True)
+    present = np.isfinite(values)
+    values[~present] = np.nan
+    # Centering does not change correlations but keeps the running
+    # sums small
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        values = values - np.nanmean(values, axis=0)
+    values[~present] = 0
+    # Rounding errors of the running sums are bounded by their totals
+    totals = (values ** 2).sum(axis=0) * ROUNDING
+    position = {column: i for i, column in enumerate(columns)}
+
+    # Without missing values the sums of each column are shared by
+    # all of its pairs
+    complete = present.all()
+    if complete:
+        counts = (ends + 1 - starts).astype(np.float64)
+        sums = [_window_sums(values[:, i], starts, ends) for i in range(len(columns))]
+        squares = [_window_sums(values[:, i] ** 2, starts, ends) for i in range(len(columns))]
+
+    result = {}
+    for a, b in pairs:
+        i, j = position[a], position[b]
+        x = values[:, i]
+        y = values[:, j]
+        if complete:
+            n, sx, sy, sxx, syy = counts, sums[i], sums[j], squares[i], squares[j]
+        else:
+            both = present[:, i] & present[:, j]
+            n = _window_sums(both.astype(np.float64), starts, ends)
+            sx = _window_sums(x * both, starts, ends)
+            sy = _window_sums(y * both, starts, ends)
+            sxx = _window_sums(x * x * both, starts, ends)
+            syy = _window_sums(y * y * both, starts, ends)
+        sxy = _window_sums(x * y, starts, ends)
+
+        variance_x = n * sxx - sx * sx
+        variance_y = n * syy - sy * sy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (n * sxy - sx * sy) / np.sqrt(variance_x * variance_y)
+        # Constant windows have no correlation, rounding errors must not
+        # make it appear
+        corr[
+            (variance_x <= n * totals[i])
+            | (variance_y <= n * totals[j])
+            | (n < min_periods)
+        ] = np.nan
+        result[(a, b)] = np.clip(corr, -1, 1)
+
+    return pd.DataFrame(result, index=df.index[ends])
+
+
+def correlation_matrix_at(correlations: pd.DataFrame, timepoint):
+    """
+    Return the correlation matrix of the window ending at the timepoint
+    or, if there is no such window, the last one before it.
+
+    Attributes:
+        correlations:
+            Output from rolling_correlations function.
+        timepoint:
+            Last timepoint of the window.
+    """
+    row = correlations.loc[:timepoint].iloc[-1]
+    columns = list(dict.fromkeys(column for pair in correlations.columns for column in pair))
+    matrix = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
+    for (a, b), value in row.items():
+        matrix.loc[a, b] = value
+        matrix.loc[b, a] = value
+    return matrix
@@ -0,0 +1,316 @@
+"""
+Module designed to load a time range of SRT statistics out of large .csv
+files without parsing the whole files.
+
+A sparse index of the file, the byte offset and the Timepoint of every
+Nth row, is built in one sequential scan and saved next to the file as
+<file>.idx.npz. It is reused until the file changes. Loading a time
+range then reads only the bytes between the indexed rows around the range,
+so it costs about as much as the range itself whatever the file size.
+
+Rows are expected to be written in the order of time as srt-xtransmit
+does, the index tolerates rows out of order within N rows only.
+"""
+import argparse
+import io
+import json
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.timepoints import parse_timepoints
+
+
+INDEX_SUFFIX = '.idx.npz'
+
+# Default number of rows between the rows indexed
+DEFAULT_STRIDE = 1024
+
+# Size of blocks the file is scanned by, bytes
+SCAN_BLOCK_SIZE = 16 * 1024 ** 2
+
+# Version of the index layout, bump it when the layout changes
+LAYOUT_VERSION = 1
+
+
+class CsvIndex:
+    """
+    Sparse index of SRT statistics .csv file.
+
+    Attributes:
+        offsets:
+            Byte offsets of the rows indexed, the first data row and
+            every stride-th row after it.
+        timepoints:
+            Timepoints of the rows indexed, int64 nanoseconds in UTC+0.
+        header:
+            Header line of the file.
+        meta:
+            Size and modification time of the file indexed, stride
+            and the number of data rows.
+    """
+
+    def __init__(self, offsets: np.ndarray, timepoints: np.ndarray, header: bytes, meta: dict):
+        self.offsets = offsets
+        self.timepoints = timepoints
+        self.header = header
+        self.meta = meta
+
+    def is_valid(self, stats_path, stride: int=None):
+        """ Check whether the index matches the file as it is now. """
+        stat = pathlib.Path(stats_path).stat()
+        return (
+            self.meta['version'] == LAYOUT_VERSION
+            and self.meta['size'] == stat.st_size
+            and self.meta['mtime_ns'] == stat.st_mtime_ns
+            and (stride is None or self.meta['stride'] == stride)
+        )
+
+    def byte_range(self, start=None, end=None):
+        """
+        Return the byte range [begin, stop) of the file covering all
+        the rows with timepoints within [start, end].
+
+        Attributes:
+            start:
+                First timepoint of the range, UTC+0. If None, from
+                the first row.
+            end:
+                Last timepoint of the range, UTC+0. If None, up to
+                the last row.
+        """
+        # Running maximum keeps the search valid if rows are slightly
+        # out of order
+        peaks = np.maximum.accumulate(self.timepoints)
+        first = 0
+        if start is not None and len(peaks):
+            first = max(int(np.searchsorted(peaks, _nanoseconds(start), 'left')) - 1, 0)
+        begin = int(self.offsets[first]) if len(self.offsets) else self.meta['size']
+        stop = self.meta['size']
+        if end is not None:
+            last = int(np.searchsorted(peaks, _nanoseconds(end), 'right'))
+            # The rows up to the next indexed row after the range are read
+            # as well in case they are slightly out of order
+            if last + 1 < len(self.offsets):
+                stop = int(self.offsets[last + 1])
+        return begin, max(begin, stop)
+
+    def save(self, index_path):
+        """ Save the index in .npz file, atomically. """
+        index_path = pathlib.Path(index_path)
+        fd, tmp = tempfile.mkstemp(prefix=f'.{index_path.name}-', suffix='.npz', dir=index_path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    offsets=self.offsets,
+                    timepoints=self.timepoints,
+                    header=np.frombuffer(self.header, dtype=np.uint8),
+                    meta=np.array(json.dumps(self.meta))
+                )
+            os.replace(tmp, index_path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, index_path):
+        """ Load the index saved with save method. """
+        with np.load(index_path) as data:
+            return cls(
+                data['offsets'],
+                data['timepoints'],
+                data['header'].tobytes(),
+                json.loads(str(data['meta']))
+            )
+
+
+def _nanoseconds(timepoint):
+    """ Convert timepoint into int64 nanoseconds in UTC+0. """
+    timepoint = pd.Timestamp(timepoint)
+    if timepoint.tz is not None:
+        timepoint = timepoint.tz_convert(None)
+    return timepoint.value
+
+
+def index_path_of(stats_path):
+    """ Return the filepath of the sidecar index of .csv file. """
+    stats_path = pathlib.Path(stats_path)
+    return stats_path.with_name(stats_path.name + INDEX_SUFFIX)
+
+
+def build_csv_index(stats_path, stride: int=DEFAULT_STRIDE):
+    """
+    Scan SRT statistics .csv file once and return its sparse index.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        stride:
+            Number of rows between the rows indexed.
+    """
+    stat = pathlib.Path(stats_path).stat()
+    offsets = []
+    rows = 0
+    with open(stats_path, 'rb') as f:
+        header = f.readline()
+        position = len(header)
+        # Whether the previous block ended with a complete line, i.e.
+        # the next byte starts a row
+        line_start = True
+        while True:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            starts = newlines[:-1] + 1 if len(newlines) else newlines
+            if line_start:
+                starts = np.concatenate([[0], starts])
+            if len(newlines) and newlines[-1] + 1 < len(block):
+                starts = np.append(starts, newlines[-1] + 1)
+            line_start = block.endswith(b'\n')
+            # Rows number rows, rows + 1, ... start at starts
+            selected = (rows + np.arange(len(starts))) % stride == 0
+            offsets.append(position + starts[selected])
+            rows += len(starts)
+            position += len(block)
+
+        offsets = np.concatenate(offsets).astype(np.int64) if offsets else np.empty(0, dtype=np.int64)
+        values = []
+        for offset in offsets:
+            f.seek(offset)
+            values.append(f.readline())
+
+    # Empty lines are not rows
+    keep = [bool(value.strip()) for value in values]
+    offsets = offsets[keep]
+    values = [value for value, kept in zip(values, keep) if kept]
+    column = pd.read_csv(io.BytesIO(header), nrows=0).columns.get_loc('Timepoint')
+    timepoints = parse_timepoints(
+        [value.decode().split(',')[column] for value in values]
+    ).asi8
+
+    meta = {
+        'version': LAYOUT_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'stride': stride,
+        'rows': rows,
+    }
+    return CsvIndex(offsets, timepoints, header, meta)
+
+
+def load_csv_index(stats_path, stride: int=None, index_path=None):
+    """
+    Return the sparse index of SRT statistics .csv file saved next to it,
+    build and save the index if there is no valid one. If the index can
+    not be saved, e.g. the directory is read-only, it is built every time.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        stride:
+            Number of rows between the rows indexed. If None, an existing
+            index is used whatever its stride, DEFAULT_STRIDE otherwise.
+        index_path:
+            Filepath to the index. If None, <stats_path>.idx.npz.
+    """
+    if index_path is None:
+        index_path = index_path_of(stats_path)
+    if pathlib.Path(index_path).exists():
+        try:
+            index = CsvIndex.load(index_path)
+            if index.is_valid(stats_path, stride):
+                return index
+        except Exception:
+            # Broken or outdated index, build it again
+            pass
+
+    index = build_csv_index(stats_path, stride or DEFAULT_STRIDE)
+    try:
+        index.save(index_path)
+    except OSError:
+        pass
+    return index
+
+
+def read_window(stats_path, start=None, end=None, index: CsvIndex=None):
+    """
+    Read the part of .csv file covering the rows with timepoints within
+    [start, end] and return it with the header as a file-like object
+    to parse with pd.read_csv. The rows around the range are included,
+    see select_window.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        start:
+            First timepoint of the range, timezone-naive timepoints are
+            considered to be in UTC+0. If None, from the first row.
+        end:
+            Last timepoint of the range, inclusive. If None, up to
+            the last row.
+        index:
+            Sparse index of the file. If None, the index saved next to
+            the file is used or built.
+    """
+    if index is None:
+        index = load_csv_index(stats_path)
+    begin, stop = index.byte_range(start, end)
+    with open(stats_path, 'rb') as f:
+        f.seek(begin)
+        data = f.read(stop - begin)
+    # Cut a row partially written at the end of the file
+    data = data[:data.rfind(b'\n') + 1]
+    return io.BytesIO(index.header + data)
+
+
+def select_window(stats: pd.DataFrame, start=None, end=None):
+    """
+    Return the rows of SRT statistics with timepoints within [start, end].
+
+    Attributes:
+        stats:
+            SRT statistics indexed by datetime64 timepoints in UTC+0.
+        start:
+            First timepoint of the range. If None, from the first row.
+        end:
+            Last timepoint of the range, inclusive. If None, up to
+            the last row.
+    """
+    timepoints = stats.index.asi8
+    selected = np.ones(len(stats), dtype=bool)
+    if start is not None:
+        selected &= timepoints >= _nanoseconds(start)
+    if end is not None:
+        selected &= timepoints <= _nanoseconds(end)
+    return stats[selected]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build sparse indexes of SRT statistics .csv files '
+        'to load time ranges out of them.'
+    )
+    parser.add_argument('stats_paths', nargs='+', help='.csv statistics')
+    parser.add_argument(
+        '--stride',
+        type=int,
+        default=DEFAULT_STRIDE,
+        help='Number of rows between the rows indexed'
+    )
+    args = parser.parse_args()
+
+    for stats_path in args.stats_paths:
+        index = load_csv_index(stats_path, args.stride)
+        print(
+            f'{stats_path}: {index.meta["rows"]} rows, {len(index.offsets)} indexed, '
+            f'{pd.Timestamp(int(index.timepoints[0]))} - {pd.Timestamp(int(index.timepoints[-1]))}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Module designed to downsample time series before plotting them while
+preserving their shape, so that only a few thousand points per trace
+are sent to the browser however long the session is.
+
+Two methods are available:
+
+- min/max bucketing keeps the smallest and the largest value of each
+  bucket of consecutive points, so spikes, e.g. in losses, are never
+  lost;
+- Largest-Triangle-Three-Buckets (LTTB) keeps one point per bucket,
+  the one forming the largest triangle with the point kept in the
+  previous bucket and the average of the next bucket, which follows
+  the visual shape of the line with fewer points.
+
+Missing values are skipped.
+"""
+import numpy as np
+import pandas as pd
+
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+METHODS = [LTTB, MINMAX]
+
+
+def minmax_indices(y: np.ndarray, n_out: int):
+    """
+    Return the positions of the points kept by min/max bucketing, sorted:
+    the first and the last points and the smallest and the largest values
+    of n_out // 2 buckets of consecutive points in between.
+
+    Attributes:
+        y:
+            Values, without missing ones.
+        n_out:
+            Maximum number of points to keep.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    buckets = max((n_out - 2) // 2, 1)
+    size = -(-(n - 2) // buckets)
+    # Pad the inner points up to buckets of equal size with the values
+    # never selected
+    inner = np.asarray(y[1:-1], dtype=np.float64)
+    padding = buckets * size - len(inner)
+    lows = np.concatenate([inner, np.full(padding, np.inf)]).reshape(buckets, size)
+    highs = np.concatenate([inner, np.full(padding, -np.inf)]).reshape(buckets, size)
+    starts = 1 + np.arange(buckets) * size
+    indices = np.concatenate([
+        [0],
+        starts + lows.argmin(axis=1),
+        starts + highs.argmax(axis=1),
+        [n - 1],
+    ])
+    return np.unique(indices[indices < n])
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int):
+    """
+    Return the positions of the points kept by Largest-Triangle-Three-Buckets
+    downsampling, sorted.
+
+    Attributes:
+        x:
+            Positions of the points on x axis, ascending.
+        y:
+            Values, without missing ones.
+        n_out:
+            Number of points to keep, at least 3.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # The first and the last points are kept, the ones in between
+    # are split into n_out - 2 buckets
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Averages of the buckets used as the third point of the triangle,
+    # the last point for the last bucket
+    sums_x = np.add.reduceat(x[:-1], bounds[:-1])
+    sums_y = np.add.reduceat(y[:-1], bounds[:-1])
+    counts = np.diff(bounds)
+    avg_x = np.append(sums_x / counts, x[-1])[1:]
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+        # Doubled area of the triangles formed by the point kept in the
+        # previous bucket, the points of the bucket and the next average
+        areas = np.abs(
+            (x[a] - avg_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i] - y[a])
+        )
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def decimate_series(series: pd.Series, n_out: int, method: str=LTTB):
+    """
+    Downsample time series to at most n_out points, missing values are
+    dropped.
+
+    Attributes:
+        series:
+            Time series indexed by datetime or numeric values, ascending.
+        n_out:
+            Maximum number of points to keep. If None, the series
+            is returned as is.
+        method:
+            Downsampling method, one of METHODS.
+    """
+    series = series.dropna()
+    if n_out is None or len(series) <= n_out:
+        return series
+
+    if method == MINMAX:
+        indices = minmax_indices(series.to_numpy(), n_out)
+    elif method == LTTB:
+        x = series.index
+        if isinstance(x, pd.DatetimeIndex):
+            x = x.asi8 - x.asi8[0]
+        indices = lttb_indices(np.asarray(x), series.to_numpy(), n_out)
+    else:
+        raise Exception(f'Unknown downsampling method {method}')
+    return series.iloc[indices]
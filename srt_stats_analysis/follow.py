@@ -0,0 +1,212 @@
+"""
+Module designed to align SRT core statistics obtained from receiver
+and sender while srt-xtransmit is still writing them: both .csv files
+are followed the way `tail -f` does and aligned statistics are extended
+as soon as new rows appear.
+"""
+import argparse
+import io
+import pathlib
+import time
+
+import pandas as pd
+
+from srt_stats_analysis.join_stats import RCV_FEATURES, SND_FEATURES, prepare_srt_stats
+from srt_stats_analysis.resample import iter_resample_stats
+from srt_stats_analysis.streaming import SrtStatsAligner
+
+
+# Default number of rows of each side waiting for the alignment, 10 minutes
+# of statistics collected each millisecond
+DEFAULT_MAX_ROWS = 600000
+
+
+class CsvTail:
+    """
+    Reader of the rows appended to a growing .csv file. Only the bytes
+    written since the previous read are parsed, the last line is left
+    until it is complete.
+
+    Attributes:
+        path:
+            Filepath to .csv file, it may not exist yet.
+        index_col:
+            Column to use as the index of the rows read.
+    """
+
+    def __init__(self, path, index_col: str='Timepoint'):
+        self.path = pathlib.Path(path)
+        self.index_col = index_col
+        self.columns = None
+        self._offset = 0
+        self._partial = b''
+
+    def read(self):
+        """
+        Return the complete rows appended since the previous call as
+        a dataframe, None if there are no new rows.
+        """
+        if not self.path.exists():
+            return None
+        size = self.path.stat().st_size
+        if size < self._offset:
+            raise Exception(f'File {self.path} has been truncated')
+        if size == self._offset:
+            return None
+
+        with self.path.open('rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        self._offset += len(data)
+
+        data = self._partial + data
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        data = data[:end]
+
+        if self.columns is None:
+            if not data:
+                return None
+            header_end = data.find(b'\n') + 1
+            # Parse the header once to get the column names deduplicated
+            # the same way pd.read_csv does
+            self.columns = list(pd.read_csv(io.BytesIO(data[:header_end]), nrows=0).columns)
+            data = data[header_end:]
+
+        if not data.strip():
+            return None
+        return pd.read_csv(
+            io.BytesIO(data),
+            header=None,
+            names=self.columns,
+            index_col=self.index_col
+        )
+
+
+def follow_srt_stats(
+    snd_stats_path: str,
+    rcv_stats_path: str,
+    interval: float=1.0,
+    holdback: pd.Timedelta=pd.Timedelta(seconds=5),
+    idle_timeout: float=None,
+    max_rows: int=DEFAULT_MAX_ROWS
+):
+    """
+    Follow SRT core statistics .csv files written at the receiver and
+    sender sides and yield newly aligned SRT statistics.
+
+    Sender timepoints are aligned as soon as the receiver timepoints
+    around them are written. Receiver rows may be written late, so sender
+    timepoints wait for them within the holdback window. Sender timepoints
+    older than the last one minus holdback are aligned with the receiver
+    statistics known so far, so the memory used and the work done per
+    update do not depend on how long the session lasts. If one file stops
+    growing while the other one keeps growing, at most max_rows rows of
+    each side wait for the alignment: the oldest sender rows are released
+    early, aligned with the receiver statistics known so far, and
+    the oldest receiver rows are merged with their counters summed.
+
+    Attributes:
+        snd_stats_path:
+            Filepath to .csv statistics collected at the sender side.
+        rcv_stats_path:
+            Filepath to .csv statistics collected at the receiver side.
+        interval:
+            Interval between checks for new rows, seconds.
+        holdback:
+            Time window the sender timepoints wait for the late receiver
+            timepoints in. If None, sender timepoints wait as long as needed.
+        idle_timeout:
+            If set, the files are considered complete and following stops
+            once no new rows are written for that many seconds.
+        max_rows:
+            Maximum number of rows of each side waiting for the alignment,
+            see streaming.SrtStatsAligner. If None, the rows wait as long
+            as needed, e.g. while the other file is not growing.
+    """
+    snd_tail = CsvTail(snd_stats_path)
+    rcv_tail = CsvTail(rcv_stats_path)
+    aligner = SrtStatsAligner(max_rows)
+    last_update = time.monotonic()
+
+    while not aligner.finished:
+        snd_stats = snd_tail.read()
+        rcv_stats = rcv_tail.read()
+        if snd_stats is not None:
+            aligner.push_snd(prepare_srt_stats(snd_stats, SND_FEATURES))
+        if rcv_stats is not None:
+            aligner.push_rcv(prepare_srt_stats(rcv_stats, RCV_FEATURES))
+
+        now = time.monotonic()
+        if snd_stats is not None or rcv_stats is not None:
+            last_update = now
+        elif idle_timeout is not None and now - last_update >= idle_timeout:
+            aligner.close_snd()
+            aligner.close_rcv()
+
+        if holdback is not None and aligner.snd_last is not None:
+            aligner.release(aligner.snd_last - holdback)
+
+        aligned = aligner.pop()
+        if aligned is not None and len(aligned) > 0:
+            yield aligned
+        elif not aligner.finished:
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Follow SRT core statistics .csv files while they are '
+        'being written and print aligned receiver and sender statistics.'
+    )
+    parser.add_argument('snd_stats_path', help='.csv statistics collected at the sender side')
+    parser.add_argument('rcv_stats_path', help='.csv statistics collected at the receiver side')
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=1.0,
+        help='Interval between checks for new rows, seconds'
+    )
+    parser.add_argument(
+        '--holdback',
+        type=float,
+        default=5.0,
+        help='Time window sender timepoints wait for late receiver ones in, seconds'
+    )
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        help='Stop once no new rows are written for that many seconds'
+    )
+    parser.add_argument(
+        '--max-rows',
+        type=int,
+        default=DEFAULT_MAX_ROWS,
+        help='Maximum number of rows of each side waiting for the alignment, '
+        'older rows are aligned early with the rows of the other side known so far'
+    )
+    parser.add_argument(
+        '--resample',
+        help='Resample aligned statistics onto a fixed time grid, e.g. 1s'
+    )
+    args = parser.parse_args()
+
+    stats = follow_srt_stats(
+        args.snd_stats_path,
+        args.rcv_stats_path,
+        args.interval,
+        pd.Timedelta(seconds=args.holdback),
+        args.idle_timeout,
+        args.max_rows
+    )
+    if args.resample is not None:
+        stats = iter_resample_stats(stats, args.resample)
+
+    header = True
+    for aligned in stats:
+        print(aligned.to_string(header=header), flush=True)
+        header = False
+
+
+if __name__ == '__main__':
+    main()
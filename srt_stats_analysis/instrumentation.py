@@ -0,0 +1,345 @@
+"""
+Module designed to instrument the stages of the pipeline: wall and CPU
+time, the number of rows in and out and peak memory of each stage, as well
+as to switch off debug dumps of intermediate dataframes.
+
+Stages are recorded only while a recorder is active, otherwise marking
+a stage costs next to nothing. Stages may be nested, e.g. capture
+extraction is a part of the clock check. Optionally, each top-level stage
+is profiled with cProfile and memory allocations are traced with
+tracemalloc.
+
+Stages may run concurrently in several threads, each thread nests its
+own stages. CPU time of such stages includes the time spent by the other
+threads, the total wall time counts the time stages overlap once. Stages
+run in worker processes are recorded by a recorder of the worker and
+merged into the recorder of the parent process.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+# Whether intermediate dataframes are printed
+_verbose = True
+
+# Recorder of the stages, None if stages are not recorded
+_recorder = None
+
+
+def set_verbose(verbose: bool):
+    """ Turn the debug dumps of intermediate dataframes on or off. """
+    global _verbose
+    _verbose = verbose
+
+
+def is_verbose():
+    return _verbose
+
+
+def print_frame(title: str, df: pd.DataFrame, rows: int=10):
+    """
+    Print the title as well as the first and the last rows of dataframe
+    if debug dumps are turned on.
+
+    Attributes:
+        title:
+            Title printed before dataframe.
+        df:
+            Dataframe to print.
+        rows:
+            Number of the first and the last rows to print. If None,
+            the whole dataframe is printed.
+    """
+    if not _verbose:
+        return
+    print(f'\n{title}')
+    if rows is None:
+        print(df)
+    else:
+        print(df.head(rows))
+        print(df.tail(rows))
+
+
+def _cpu_time():
+    """ CPU time of the process and its finished child processes, seconds. """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _max_rss():
+    """ Peak resident set size of the process, bytes. """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class Stage:
+    """
+    Measurements of a stage run.
+
+    Attributes:
+        name:
+            Name of the stage.
+        depth:
+            Nesting level of the stage, 0 for top-level stages.
+        rows_in:
+            Number of rows the stage has got, set by the instrumented code.
+        rows_out:
+            Number of rows the stage has produced, set by the instrumented code.
+    """
+
+    def __init__(self, name: str, depth: int, rows_in: int=None):
+        self.name = name
+        self.depth = depth
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_rss_mb = None
+        self.peak_traced_mb = None
+        self.started = None
+        self._peak_traced = 0
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'depth': self.depth,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_traced_mb': self.peak_traced_mb,
+        }
+
+
+class Recorder:
+    """
+    Recorder of the pipeline stages.
+
+    Attributes:
+        trace_memory:
+            If True, allocations are traced with tracemalloc and the peak
+            of memory allocated within each stage is reported. Tracing
+            slows the pipeline down noticeably.
+        profile_dir:
+            If set, each top-level stage is profiled with cProfile and
+            the statistics are saved in the directory as
+            <number>-<stage>.prof files.
+    """
+
+    def __init__(self, trace_memory: bool=False, profile_dir=None):
+        self.trace_memory = trace_memory
+        self.profile_dir = None if profile_dir is None else pathlib.Path(profile_dir)
+        self.stages = []
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        """ Stages running in the current thread, the innermost last. """
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int=None):
+        """ Measure the stage run within the context. """
+        stage = Stage(name, len(self._stack), rows_in)
+        self.stages.append(stage)
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            if self._stack:
+                parent = self._stack[-1]
+                parent._peak_traced = max(parent._peak_traced, tracemalloc.get_traced_memory()[1])
+            # tracemalloc.reset_peak is available since Python 3.9,
+            # before that the peak since the start of tracing is reported
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+        profile = None
+        # Only one profiler may be active at a time
+        if self.profile_dir is not None and not self._stack and threading.current_thread() is threading.main_thread():
+            profile = cProfile.Profile()
+
+        self._stack.append(stage)
+        wall = stage.started = time.perf_counter()
+        cpu = _cpu_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield stage
+        finally:
+            if profile is not None:
+                profile.disable()
+            stage.wall_s = round(time.perf_counter() - wall, 4)
+            stage.cpu_s = round(_cpu_time() - cpu, 4)
+            stage.peak_rss_mb = round(_max_rss() / 1024 ** 2, 1)
+            self._stack.pop()
+
+            if tracing:
+                stage._peak_traced = max(stage._peak_traced, tracemalloc.get_traced_memory()[1])
+                stage.peak_traced_mb = round(stage._peak_traced / 1024 ** 2, 1)
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent._peak_traced = max(parent._peak_traced, stage._peak_traced)
+
+            if profile is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                filename = re.sub(r'\W+', '-', name).strip('-')
+                profile.dump_stats(self.profile_dir / f'{len(self.stages):02d}-{filename}.prof')
+
+    @property
+    def settings(self):
+        """ Arguments to create a recorder with the same settings, e.g. in a worker process. """
+        return self.trace_memory, self.profile_dir
+
+    def merge(self, stages: list):
+        """
+        Add the stages recorded by another recorder, e.g. the one of
+        a worker process. Their start times are comparable as long as
+        the processes run on the same machine, time.perf_counter is
+        a system-wide monotonic clock.
+
+        Attributes:
+            stages:
+                Stages recorded.
+        """
+        self.stages.extend(stages)
+
+    def record(self, name: str, started: float, wall_s: float):
+        """
+        Record a top-level stage measured elsewhere, e.g. run in a worker
+        process, without CPU time and memory measurements.
+
+        Attributes:
+            name:
+                Name of the stage.
+            started:
+                Time the stage started at, time.perf_counter() seconds.
+            wall_s:
+                Wall time of the stage, seconds.
+        """
+        stage = Stage(name, 0)
+        stage.started = started
+        stage.wall_s = round(wall_s, 4)
+        self.stages.append(stage)
+
+    def report(self):
+        """ Return the report as a JSON serializable dictionary. """
+        top_level = [stage for stage in self.stages if stage.depth == 0 and stage.wall_s is not None]
+        # Stages run concurrently overlap, the time is counted once
+        wall = 0
+        end = None
+        for stage in sorted(top_level, key=lambda stage: stage.started):
+            stage_end = stage.started + stage.wall_s
+            if end is None or stage.started >= end:
+                wall += stage.wall_s
+                end = stage_end
+            elif stage_end > end:
+                wall += stage_end - end
+                end = stage_end
+        # Stages run in worker processes report the peak of the workers
+        peak_rss_mb = max(
+            [_max_rss() / 1024 ** 2]
+            + [stage.peak_rss_mb for stage in self.stages if stage.peak_rss_mb is not None]
+        )
+        return {
+            'stages': [stage.as_dict() for stage in self.stages],
+            'total': {
+                'wall_s': round(wall, 4),
+                'cpu_s': round(sum(stage.cpu_s or 0 for stage in top_level), 4),
+                'peak_rss_mb': round(peak_rss_mb, 1),
+            },
+        }
+
+    def save_report(self, path):
+        """ Save the report in .json file. """
+        with pathlib.Path(path).open('w') as f:
+            json.dump(self.report(), f, indent=4)
+
+    def format_report(self):
+        """ Return the report as a human-readable table. """
+        report = self.report()
+        if not report['stages']:
+            return 'No stages recorded'
+        table = pd.DataFrame(report['stages'], dtype=object)
+        table['stage'] = ['  ' * depth + name for name, depth in zip(table['stage'], table['depth'])]
+        table = table.drop(columns='depth')
+        if not self.trace_memory:
+            table = table.drop(columns='peak_traced_mb')
+        table = table.where(table.notna(), '-')
+        total = report['total']
+        return (
+            table.to_string(index=False)
+            + f"\n\nTotal: {total['wall_s']} s wall, {total['cpu_s']} s CPU, "
+            f"{total['peak_rss_mb']} MB peak RSS"
+        )
+
+
+@contextlib.contextmanager
+def recording(recorder: Recorder):
+    """
+    Record the stages run within the context with the recorder.
+
+    Attributes:
+        recorder:
+            Recorder of the stages.
+    """
+    global _recorder
+    previous = _recorder
+    _recorder = recorder
+    started_tracing = recorder.trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield recorder
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _recorder = previous
+
+
+def current_recorder():
+    """ Return the active recorder, None if stages are not recorded. """
+    return _recorder
+
+
+def record_stage(name: str, started: float, wall_s: float):
+    """
+    Record a top-level stage measured elsewhere if a recorder is active,
+    see Recorder.record.
+    """
+    if _recorder is not None:
+        _recorder.record(name, started, wall_s)
+
+
+@contextlib.contextmanager
+def stage(name: str, rows_in: int=None):
+    """
+    Mark the code within the context as a stage of the pipeline. Yield
+    the stage measurements to set rows_out on, they are recorded only if
+    a recorder is active.
+
+    Attributes:
+        name:
+            Name of the stage.
+        rows_in:
+            Number of rows the stage gets.
+    """
+    if _recorder is None:
+        yield Stage(name, 0, rows_in)
+        return
+    with _recorder.stage(name, rows_in) as measured:
+        yield measured
@@ -2,12 +2,29 @@
 Module designed to align SRT core statistics obtained from receiver
 and sender as well as tshark datasets if necessary.
 """
-import pathlib
+import argparse
+import functools
+import itertools
 
 import pandas as pd
 
-from tcpdump_processing.convert import convert_to_csv
-from tcpdump_processing.extract_packets import extract_srt_packets, extract_umsg_handshake_packets, extract_umsg_ack_packets
+from srt_stats_analysis.align import interpolate_onto, redistribute_onto, sort_by_time
+from srt_stats_analysis.cache import CACHE_DIR_ENV, Cache, default_cache
+from srt_stats_analysis.capture import (
+    Capture,
+    as_capture,
+    convert_to_csv_async,
+    read_capture,
+    read_srt_packet_headers,
+)
+from srt_stats_analysis.clocks import ClockModel, clock_offset, correct_clock, estimate_clock_model, fit_packets_clock_model
+from srt_stats_analysis.csv_index import read_window, select_window
+from srt_stats_analysis.instrumentation import Recorder, print_frame, recording, set_verbose, stage
+from srt_stats_analysis.rtt_shift import CONSTANT, RTT_COLUMN, RTT_SOURCES, STATS, TSHARK, ack_rtt, shift_by_rtt
+from srt_stats_analysis.scheduler import ASYNC, PROCESS, Step, format_runs, run_steps
+from srt_stats_analysis.schema import INTERPOLATE, INTERPOLATE_INT, REDISTRIBUTE, get_column, get_dtypes, get_policy, read_csv_arguments
+from srt_stats_analysis.store import save_results
+from srt_stats_analysis.timepoints import parse_timepoints
 
 
 # Without Ethernet packet overhead, bytes
@@ -16,6 +33,11 @@ SRT_DATA_PACKET_HEADER_SIZE = 44
 SRT_DATA_PACKET_PAYLOAD_SIZE = 1316
 # SRT_DATA_PACKET_PAYLOAD_SIZE = 1456
 
+# Statistics are loaded with this margin around the time range requested
+# so that the timepoints at the bounds are aligned the same way as when
+# the whole files are loaded
+WINDOW_MARGIN = pd.Timedelta(seconds=1)
+
 
 def convert_pktsps_in_bytesps(value):
     return value * (SRT_DATA_PACKET_HEADER_SIZE + SRT_DATA_PACKET_PAYLOAD_SIZE)
@@ -39,144 +61,425 @@ def convert_timedelta_to_milliseconds(delta):
     return millis
 
 
-def align_srt_stats(snd_stats_path: str, rcv_stats_path: str):
+# Set the list of SRT statistics features to analyze, see
+# schema.SRT_XTRANSMIT_COLUMNS for all the columns available
+SND_FEATURES = [
+    # 'pktFlowWindow',
+    # 'pktCongestionWindow',
+    # 'pktFlightSize',
+    'msRTT',
+    'mbpsBandwidth',
+    'pktSent',              # aggregated
+    'pktSndLoss',           # aggregated
+    # 'pktSndDrop',
+    # 'pktRetrans',
+    # 'byteSent',
+    # 'byteSndDrop',
+    # 'mbpsSendRate',
+    # 'usPktSndPeriod',
+]
+
+RCV_FEATURES = [
+    'msRTT',
+    'mbpsBandwidth',
+    'pktRecv',              # aggregated
+    'pktRcvLoss',           # aggregated
+    # 'pktRcvDrop',
+    # 'pktRcvRetrans',
+    # 'pktRcvBelated',
+    # 'byteRecv',
+    # 'byteRcvLoss',
+    # 'byteRcvDrop',
+    # 'mbpsRecvRate',
+]
+
+def read_srt_stats_csv(stats_path, columns: list=None):
     """
-    Align SRT core statistics obtained from receiver and sender.
+    Load SRT statistics from .csv file parsing only the columns requested
+    with the dtypes from the schema. Integer columns with missing values
+    are loaded as float64 ones.
 
     Attributes:
-        snd_stats_path:
-            Filepath to .csv statistics collected at the sender side.
-        rcv_stats_path:
-            Filepath to .csv statistics collected at the receiver side.
+        stats_path:
+            Filepath to .csv statistics or file-like object.
+        columns:
+            SRT statistics columns to load. If None, all the columns
+            are loaded.
     """
-    # Set the list of SRT statistics features to analyze
-    SND_FEATURES = [
-        # 'pktFlowWindow',
-        # 'pktCongestionWindow',
-        # 'pktFlightSize',
-        'msRTT',
-        'mbpsBandwidth',
-        'pktSent',              # aggregated
-        'pktSndLoss',           # aggregated
-        # 'pktSndDrop',
-        # 'pktRetrans',
-        # 'byteSent',
-        # 'byteSndDrop',
-        # 'mbpsSendRate',
-        # 'usPktSndPeriod',
-    ]
+    try:
+        return pd.read_csv(stats_path, **read_csv_arguments(columns))
+    except ValueError:
+        # Integer columns with missing or fractional values can not
+        # be parsed with integer dtypes
+        if hasattr(stats_path, 'seek'):
+            stats_path.seek(0)
+        return pd.read_csv(stats_path, **read_csv_arguments(columns, integer_na=True))
+
+
+def read_srt_stats(
+    stats_path: str,
+    cache: Cache=None,
+    columns: list=None,
+    start=None,
+    end=None
+):
+    """
+    Load SRT statistics from .csv file and convert Timepoint index
+    to datetime64 UTC+0.
 
-    RCV_FEATURES = [
-        'msRTT',
-        'mbpsBandwidth',
-        'pktRecv',              # aggregated
-        'pktRcvLoss',           # aggregated
-        # 'pktRcvDrop',
-        # 'pktRcvRetrans',
-        # 'pktRcvBelated',
-        # 'byteRecv',
-        # 'byteRcvLoss',
-        # 'byteRcvDrop',
-        # 'mbpsRecvRate',
-    ]
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+        columns:
+            SRT statistics columns to load. If None, all the columns
+            are loaded.
+        start:
+            First timepoint to load, UTC+0 if timezone-naive. If start
+            or end is set, only the part of the file around the range
+            is read with the help of the sparse index of the file,
+            see srt_stats_analysis.csv_index.
+        end:
+            Last timepoint to load, inclusive.
+    """
+    windowed = start is not None or end is not None
+
+    def load():
+        with stage('csv load') as measured:
+            source = read_window(stats_path, start, end) if windowed else stats_path
+            stats = read_srt_stats_csv(source, columns)
+            measured.rows_out = len(stats)
+        with stage('timestamp parse', len(stats)) as measured:
+            stats.index = parse_timepoints(stats.index)
+            if windowed:
+                stats = select_window(stats, start, end)
+            measured.rows_out = len(stats)
+        return stats
+
+    if cache is None:
+        return load()
+    # Different sets of columns or time ranges loaded out of the same
+    # file are cached separately
+    params = {'columns': None if columns is None else list(columns)}
+    if windowed:
+        params.update(start=str(start), end=str(end))
+    return cache.load('srt-stats', stats_path, load, params)
+
+
+def prepare_srt_stats(stats: pd.DataFrame, features: list):
+    """
+    Extract features of interest from SRT statistics loaded out of
+    .csv file and convert Timepoint index to datetime64 UTC+0 if it
+    is not converted yet.
 
-    # Load SRT statistics from sender and receiver side to dataframes 
-    # snd_stats and rcv_stats respectively and extract features of interest
-    snd_stats = pd.read_csv(snd_stats_path, index_col='Timepoint')
-    rcv_stats = pd.read_csv(rcv_stats_path, index_col='Timepoint')
-    snd_stats = snd_stats[SND_FEATURES]
-    rcv_stats = rcv_stats[RCV_FEATURES]
-
-    # Convert index to datetime64 specifying the timepoint format
-    form = '%d.%m.%Y %H:%M:%S.%f %z'
-    snd_stats.index = pd.to_datetime(snd_stats.index, format=form)
-    rcv_stats.index = pd.to_datetime(rcv_stats.index, format=form)
-
-    # Convert timezones to UTC+0
-    snd_stats.index = snd_stats.index.tz_convert(None)
-    rcv_stats.index = rcv_stats.index.tz_convert(None)
-
-    print('\nSender stats')
-    print(snd_stats.head(10))
-    print(snd_stats.tail(10))
-    print('\nReceiver stats')
-    print(rcv_stats.head(10))
-    print(rcv_stats.tail(10))
-
-    # TODO: Adjust clocks
-
-    # Combine sender and receiver datasets into stats dataframe
-    snd_stats = snd_stats.add_suffix('_snd')
-    rcv_stats = rcv_stats.add_suffix('_rcv')
-    snd_stats['isSender'] = True
-    stats = snd_stats.join(rcv_stats, how='outer')
-    stats['isSender'] = stats['isSender'].fillna(False)
+    Attributes:
+        stats:
+            SRT statistics indexed by Timepoint column.
+        features:
+            List of SRT statistics features to extract.
+    """
+    stats = stats[features]
+    # Bring the columns to the dtypes from the schema unless they are
+    # loaded with them already. Integer columns with missing values
+    # stay float ones.
+    dtypes = {
+        col: dtype for col, dtype in get_dtypes(features).items()
+        if stats[col].dtype != dtype and (dtype.kind == 'f' or stats[col].dtype.kind != 'f')
+    }
+    if dtypes:
+        stats = stats.astype(dtypes)
+    if not isinstance(stats.index, pd.DatetimeIndex):
+        # Convert index to datetime64 UTC+0
+        stats.index = parse_timepoints(stats.index)
+    return stats
 
-    # Further we will use sender timepoints to align the stats from 
-    # receiver and sender
-    # To do so, first we cut the time points on top and at the bottom 
-    # of stats dataframe where statistics was collected only 
-    # on receiver or sender side
+
+def trim_srt_stats(snd_stats: pd.DataFrame, rcv_stats: pd.DataFrame):
+    """
+    Cut the timepoints on top and at the bottom where statistics was
+    collected only on receiver or sender side so that the first and
+    the last timepoints are sender timepoints.
+
+    Attributes:
+        snd_stats:
+            SRT statistics collected at the sender side, the output
+            from prepare_srt_stats function.
+        rcv_stats:
+            SRT statistics collected at the receiver side, the output
+            from prepare_srt_stats function.
+    """
+    # First, we cut the time points on top and at the bottom where
+    # statistics was collected only on receiver or sender side
     # TODO: I've tested caller-snd and listener-rcv setup.
     # Check additionally how this behaves in case of caller-rcv and 
     # listener-snd setup
     start_timestamp = max(snd_stats.index[0], rcv_stats.index[0])
     end_timestamp = min(snd_stats.index[-1], rcv_stats.index[-1])
-    stats = stats[(stats.index >= start_timestamp) & (stats.index <= end_timestamp)]
+    snd_stats = snd_stats[(snd_stats.index >= start_timestamp) & (snd_stats.index <= end_timestamp)]
+    rcv_stats = rcv_stats[(rcv_stats.index >= start_timestamp) & (rcv_stats.index <= end_timestamp)]
 
     # Second, we check that the first and the last timepoints are both
     # sender timepoints. If not, drop them.
-    if not stats['isSender'][0]:
-        stats = stats[1:]
-
-    if not stats['isSender'][-1]:
-        stats = stats[:-1]
-    
-    print('\nJoined stats')
-    print(stats.head(10))
-    print(stats.tail(10))
-
-    # Do linear interpolation for features where applicable
-    cols_to_int = [
-        'pktSent_snd',
-        'pktSndLoss_snd',
-        'pktRecv_rcv',
-        'pktRcvLoss_rcv',
-    ]
-    cols_to_round = [
-        'msRTT_snd',
-        'msRTT_rcv',
-        'mbpsBandwidth_snd',
-        'mbpsBandwidth_rcv'
-    ]
-    stats.loc[:, stats.columns != 'isSender'] = stats.interpolate().fillna(method='bfill')
-    stats.loc[:, cols_to_int] = stats.astype('int32')
-    stats.loc[:, cols_to_round] = stats.round(2)
-
-    print('\nInterpolated stats')
-    print(stats.head(10))
-    print(stats.tail(10))
-
-    # Extract only sender timepoints
-    stats = stats[stats['isSender']]
-
-    # Rearrange the columns
-    cols_rearranged = [
-        'pktSent_snd',
-        'pktRecv_rcv',
-        'pktSndLoss_snd',
-        'pktRcvLoss_rcv',
-        'msRTT_snd',
-        'msRTT_rcv',
-        'mbpsBandwidth_snd',
-        'mbpsBandwidth_rcv'
+    if rcv_stats.index[0] < snd_stats.index[0]:
+        rcv_stats = rcv_stats[1:]
+
+    if rcv_stats.index[-1] > snd_stats.index[-1]:
+        rcv_stats = rcv_stats[:-1]
+
+    return snd_stats, rcv_stats
+
+
+def interpolate_srt_stats(
+    snd_stats: pd.DataFrame,
+    rcv_stats: pd.DataFrame,
+    rcv_start=None,
+    rcv_offsets: dict=None
+):
+    """
+    Interpolate receiver statistics onto sender timepoints. Receiver
+    values before the first receiver timepoint are filled backward.
+    Receiver per-interval counters, e.g. pktRecv, are redistributed
+    onto sender intervals proportionally to the overlap instead, so
+    their totals are preserved.
+
+    Attributes:
+        snd_stats:
+            SRT statistics collected at the sender side, the output
+            from prepare_srt_stats function.
+        rcv_stats:
+            SRT statistics collected at the receiver side, the output
+            from prepare_srt_stats function.
+        rcv_start:
+            If the statistics continue the ones aligned before, the end
+            of the last receiver interval redistributed completely,
+            see align.redistribute_onto.
+        rcv_offsets:
+            If the statistics continue the ones aligned before, the number
+            of receiver events after rcv_start redistributed already
+            per receiver column, see align.redistribute_onto.
+    """
+    if len(rcv_stats) == 0:
+        raise Exception('There are no receiver timepoints to align with')
+
+    snd_stats = snd_stats.add_suffix('_snd')
+    rcv_stats = rcv_stats.add_suffix('_rcv')
+    cols_to_redistribute = [col for col in rcv_stats.columns if get_policy(col) == REDISTRIBUTE]
+    cols_to_interpolate = [col for col in rcv_stats.columns if col not in cols_to_redistribute]
+
+    stats = interpolate_onto(snd_stats, rcv_stats, cols_to_interpolate)
+    if rcv_offsets is not None:
+        rcv_offsets = {f'{col}_rcv': offset for col, offset in rcv_offsets.items()}
+    counters = redistribute_onto(stats, rcv_stats, cols_to_redistribute, rcv_start, rcv_offsets)
+    for col in cols_to_redistribute:
+        stats[col] = counters[col].to_numpy()
+
+    # Convert aligned values according to the alignment policy
+    # of the column
+    for col in stats.columns:
+        policy = get_policy(col)
+        if policy in [REDISTRIBUTE, INTERPOLATE_INT]:
+            stats[col] = stats[col].astype(get_column(col.rsplit('_', 1)[0]).dtype)
+        elif policy == INTERPOLATE:
+            stats[col] = stats[col].round(2)
+        else:
+            raise Exception(f'Column {col} can not be aligned')
+
+    # Rearrange the columns: counters first, then the other integer
+    # columns and the rest ones, sender and receiver columns go in pairs
+    cols_rearranged = []
+    for policy in [REDISTRIBUTE, INTERPOLATE_INT, INTERPOLATE]:
+        snd_cols = [col for col in snd_stats.columns if get_policy(col) == policy]
+        rcv_cols = [col for col in rcv_stats.columns if get_policy(col) == policy]
+        for pair in itertools.zip_longest(snd_cols, rcv_cols):
+            cols_rearranged += [col for col in pair if col is not None]
+    return stats[cols_rearranged]
+
+
+def align_srt_stats(
+    snd_stats_path: str,
+    rcv_stats_path: str,
+    cache: Cache=None,
+    snd_features: list=SND_FEATURES,
+    rcv_features: list=RCV_FEATURES,
+    rcv_clock: ClockModel=None,
+    start=None,
+    end=None,
+    rcv_rtt=None
+):
+    """
+    Align SRT core statistics obtained from receiver and sender.
+
+    Only the features of interest are parsed out of both .csv files and
+    loaded in memory. See streaming.iter_align_srt_stats for the chunked
+    alternative with the same result.
+
+    Attributes:
+        snd_stats_path:
+            Filepath to .csv statistics collected at the sender side.
+        rcv_stats_path:
+            Filepath to .csv statistics collected at the receiver side.
+        cache:
+            Cache of parsed datasets. If None, the files are always parsed.
+        snd_features:
+            SRT statistics features to align from the sender side.
+        rcv_features:
+            SRT statistics features to align from the receiver side.
+        rcv_clock:
+            Receiver clock against the sender one, the output from
+            clocks.estimate_clock_model with the sender as the caller.
+            If set, receiver timepoints are converted into the sender
+            clock.
+        start:
+            First sender timepoint to align, UTC+0 if timezone-naive.
+            If start or end is set, only the parts of the files around
+            the time range are loaded, see srt_stats_analysis.csv_index.
+        end:
+            Last sender timepoint to align, inclusive.
+        rcv_rtt:
+            RTT to shift receiver timepoints back by RTT/2 by, milliseconds:
+            a number, the name of the receiver column with RTT of each row,
+            e.g. msRTT, or a series indexed by receiver timepoints, see
+            rtt_shift.shift_by_rtt. If None, the timepoints are not shifted.
+    """
+    # Load SRT statistics from sender and receiver side to dataframes 
+    # snd_stats and rcv_stats respectively and extract features of interest
+    snd_stats = load_srt_stats(snd_stats_path, cache, snd_features, start, end)
+    rcv_stats = load_srt_stats(rcv_stats_path, cache, rcv_features, start, end, rcv_clock)
+    return merge_srt_stats(snd_stats, rcv_stats, rcv_clock, start, end, rcv_rtt)
+
+
+def _utc(timepoint):
+    """ Convert timepoint into timezone-naive UTC+0 timestamp. """
+    timepoint = pd.Timestamp(timepoint)
+    if timepoint.tz is not None:
+        timepoint = timepoint.tz_convert(None)
+    return timepoint
+
+
+def load_srt_stats(
+    stats_path: str,
+    cache: Cache=None,
+    features: list=SND_FEATURES,
+    start=None,
+    end=None,
+    rcv_clock: ClockModel=None
+):
+    """
+    Load SRT statistics from .csv file and prepare them for alignment.
+    If the time range is set, the statistics are loaded with a margin
+    around it, see align_srt_stats.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+        features:
+            SRT statistics features to extract.
+        start:
+            First sender timepoint to align, UTC+0 if timezone-naive.
+        end:
+            Last sender timepoint to align, inclusive.
+        rcv_clock:
+            Receiver clock against the sender one. If set, the statistics
+            are collected at the receiver side and the time range is
+            converted into the receiver clock.
+    """
+    window = [
+        None if start is None else _utc(start) - WINDOW_MARGIN,
+        None if end is None else _utc(end) + WINDOW_MARGIN,
     ]
-    stats = stats[cols_rearranged]
+    if rcv_clock is not None:
+        window = [
+            None if timepoint is None
+            else timepoint + pd.Timedelta(int(clock_offset(rcv_clock, [timepoint])[0]))
+            for timepoint in window
+        ]
+    stats = read_srt_stats(stats_path, cache, features, *window)
+    return prepare_srt_stats(stats, features)
+
+
+def merge_srt_stats(
+    snd_stats: pd.DataFrame,
+    rcv_stats: pd.DataFrame,
+    rcv_clock: ClockModel=None,
+    start=None,
+    end=None,
+    rcv_rtt=None
+):
+    """
+    Align SRT core statistics obtained from receiver and sender, loaded
+    with load_srt_stats function.
 
+    Attributes:
+        snd_stats:
+            SRT statistics collected at the sender side.
+        rcv_stats:
+            SRT statistics collected at the receiver side.
+        rcv_clock:
+            Receiver clock against the sender one. If set, receiver
+            timepoints are converted into the sender clock.
+        start:
+            First sender timepoint to align, UTC+0 if timezone-naive.
+        end:
+            Last sender timepoint to align, inclusive.
+        rcv_rtt:
+            RTT to shift receiver timepoints back by RTT/2 by, see
+            align_srt_stats. If None, the timepoints are not shifted.
+    """
+    print_frame('Sender stats', snd_stats)
+    print_frame('Receiver stats', rcv_stats)
+
+    # Receiver statistics describe the packets sent RTT/2 before,
+    # the shift is done in the receiver clock the RTT is measured in
+    if rcv_rtt is not None:
+        rcv_stats = shift_by_rtt(rcv_stats, rcv_rtt)
+
+    # Adjust clocks
+    if rcv_clock is not None:
+        rcv_stats = correct_clock(rcv_stats, rcv_clock)
+
+    stats = align_prepared_srt_stats(snd_stats, rcv_stats)
+    if start is not None or end is not None:
+        stats = select_window(stats, start, end)
     return stats
 
 
-def align_srt_tshark_stats(stats: pd.DataFrame, rcv_tshark_csv: str):
+def align_prepared_srt_stats(snd_stats: pd.DataFrame, rcv_stats: pd.DataFrame):
+    """
+    Align SRT core statistics obtained from receiver and sender, already
+    loaded and prepared with prepare_srt_stats function.
+
+    Attributes:
+        snd_stats:
+            SRT statistics collected at the sender side.
+        rcv_stats:
+            SRT statistics collected at the receiver side, in the sender
+            clock if the clocks are adjusted.
+    """
+    # Further we will use sender timepoints to align the stats from 
+    # receiver and sender
+    with stage('join', len(snd_stats) + len(rcv_stats)) as measured:
+        snd_stats = sort_by_time(snd_stats)
+        rcv_stats = sort_by_time(rcv_stats)
+        snd_stats, rcv_stats = trim_srt_stats(snd_stats, rcv_stats)
+        measured.rows_out = len(snd_stats) + len(rcv_stats)
+
+    # Do linear interpolation of receiver features at sender timepoints
+    with stage('interpolate', len(rcv_stats)) as measured:
+        stats = interpolate_srt_stats(snd_stats, rcv_stats)
+        measured.rows_out = len(stats)
+
+    return stats
+
+
+def align_srt_tshark_stats(
+    stats: pd.DataFrame,
+    rcv_capture,
+    cache: Cache=None,
+    rcv_clock: ClockModel=None
+):
     """
     Align SRT statistics and tshark data.
 
@@ -184,24 +487,24 @@ def align_srt_tshark_stats(stats: pd.DataFrame, rcv_tshark_csv: str):
         stats: 
             Aligned SRT statisitcs collected both at the receiver
             and sender sides, the output from align_srt_stats function.
-        rcv_tshark_csv:
-            Filepath to .csv thark data collected at the receiver side.
+        rcv_capture:
+            Capture session or filepath to .csv thark data or .pcapng
+            tshark dump collected at the receiver side.
+        cache:
+            Cache of parsed datasets used if rcv_capture is a filepath.
+            If None, the file is always parsed.
+        rcv_clock:
+            Receiver clock against the sender one. If set, the times
+            of tshark packets are converted into the sender clock.
     """
     print('\nMerging tshark data with SRT statistics')
 
-    # Extract SRT packets from .csv tshark dump file collected at the receiver side
-    srt_packets = extract_srt_packets(rcv_tshark_csv)
-
-    print('\nSRT packets extracted from receiver tshark dump')
-    print(srt_packets.head(10))
+    # Extract UMSG_ACK packets from tshark dump collected at the receiver
+    # side that contain receiving speed and bandwidth estimations reported
+    # by receiver each 10 ms
+    umsg_ack_packets = as_capture(rcv_capture, cache).umsg_ack_packets
 
-    # Extract UMSG_ACK packets from SRT packets srt_packets that
-    # contain receiving speed and bandwidth estimations reported by
-    # receiver each 10 ms
-    umsg_ack_packets = extract_umsg_ack_packets(srt_packets)
-
-    print('\nUMSG_ACK packets extracted from SRT packets')
-    print(umsg_ack_packets.head(10))
+    print_frame('UMSG_ACK packets extracted from SRT packets', umsg_ack_packets)
 
     # From umsg_ack_packets dataframe, extract features valuable 
     # for further analysis, do some data cleaning and timezone correction
@@ -217,6 +520,8 @@ def align_srt_tshark_stats(stats: pd.DataFrame, rcv_tshark_csv: str):
     umsg_ack_packets = umsg_ack_packets[TSHARK_FEATURES]
     umsg_ack_packets = umsg_ack_packets.set_index('frame.time')
     umsg_ack_packets.index = umsg_ack_packets.index.tz_convert(None)
+    if rcv_clock is not None:
+        umsg_ack_packets = correct_clock(umsg_ack_packets, rcv_clock)
     umsg_ack_packets['srt.rtt'] = umsg_ack_packets['srt.rtt'] / 1000
     umsg_ack_packets['srt.rttvar'] = umsg_ack_packets['srt.rttvar'] / 1000
     umsg_ack_packets = umsg_ack_packets.rename(
@@ -246,150 +551,410 @@ def align_srt_tshark_stats(stats: pd.DataFrame, rcv_tshark_csv: str):
         ]
     ]
 
-    print('\nAdjusted UMSG_ACK packets')
-    print(umsg_ack_packets.head(10))
-    print(umsg_ack_packets.tail(10))
+    print_frame('Adjusted UMSG_ACK packets', umsg_ack_packets)
 
-    # Combine stats dataframe (with SRT statistics) and adjusted 
-    # umsg_ack_packets dataframe. stats dataframe timepoints will be
+    # Interpolate adjusted umsg_ack_packets dataframe onto stats dataframe
+    # (with SRT statistics) timepoints. stats dataframe timepoints will be
     # further used as the timepoints for result dataframe
     start_timestamp = stats.index[0]
     end_timestamp = stats.index[-1]
-    
-    stats['isStats'] = True
-    cols = ['srt.rtt.ms', 'srt.rttvar.ms', 'srt.rate.Mbps', 'srt.bw.Mbps']
-    df = stats.join(umsg_ack_packets[cols].add_suffix('_tshark'), how='outer')
-    df['isStats'] = df['isStats'].fillna(False)
-
-    df = df[(df.index >= start_timestamp) & (df.index <= end_timestamp)]
-    assert(df['isStats'][0] == True)
-    assert(df['isStats'][-1] == True)
-
-    print('\nJoined SRT stats and tshark statistics')
-    print(df.head(10))
-    print(df.tail(10))
-
-    # Do interpolation
-    cols_to_interpolate = [f'{col}_tshark' for col in cols]
-    df.loc[:, cols_to_interpolate] = df.interpolate().fillna(method='bfill')
-    df.loc[:, cols_to_interpolate] = df.round(2)
-
-    print('\nInterpolated tshark statistics')
-    print(df.head(10))
-    print(df.tail(10))
-
-    # Extract only stats dataframe timepoints (aligned SRT stats timepoints)
-    df = df.loc[df['isStats'], df.columns != 'isStats']
-
-    cols_to_int = [
-        'pktSent_snd',
-        'pktSndLoss_snd',
-        'pktRecv_rcv',
-        'pktRcvLoss_rcv',
+    umsg_ack_packets = umsg_ack_packets[
+        (umsg_ack_packets.index >= start_timestamp)
+        & (umsg_ack_packets.index <= end_timestamp)
     ]
-    # TODO: Does not work
-    # df.loc[:, cols_to_int] = df.astype('int32')
-    for col in cols_to_int:
-        df[col] = df[col].astype('int32')
-
-    print('\nOnly SRT stats timepoints')
-    print(df.head(10))
-    print(df.tail(10))
-
-    # Rearrange the columns
-    cols_rearranged = [
-        'pktSent_snd',
-        'pktRecv_rcv',
-        'pktSndLoss_snd',
-        'pktRcvLoss_rcv',
-        'msRTT_snd',
-        'msRTT_rcv',
-        'srt.rtt.ms_tshark',
-        'srt.rttvar.ms_tshark',
-        'mbpsBandwidth_snd',
-        'mbpsBandwidth_rcv',
-        'srt.bw.Mbps_tshark',
-        # 'srt.rate.Mbps_tshark'
+
+    cols = [
+        'srt.rtt.ms',
+        'srt.rttvar.ms',
+        'srt.bw.Mbps',
+        # 'srt.rate.Mbps'
     ]
+    cols_to_interpolate = [f'{col}_tshark' for col in cols]
+    df = interpolate_onto(
+        stats,
+        umsg_ack_packets[cols].add_suffix('_tshark'),
+        cols_to_interpolate
+    )
+    for col in cols_to_interpolate:
+        df[col] = df[col].round(2)
+
+    print_frame('Interpolated tshark statistics', df)
+
+    # Rearrange the columns: tshark RTT and bandwidth estimations go
+    # after the ones from SRT statistics or at the end if there are none
+    tshark_cols = {
+        'msRTT': ['srt.rtt.ms_tshark', 'srt.rttvar.ms_tshark'],
+        'mbpsBandwidth': ['srt.bw.Mbps_tshark'],
+        # 'mbpsRecvRate': ['srt.rate.Mbps_tshark'],
+    }
+    cols_rearranged = list(stats.columns)
+    for feature, cols in tshark_cols.items():
+        related = [
+            i for i, col in enumerate(cols_rearranged)
+            if col.rsplit('_', 1)[0] == feature
+        ]
+        position = related[-1] + 1 if related else len(cols_rearranged)
+        cols_rearranged[position:position] = cols
     df = df[cols_rearranged]
 
     return df
 
 
-def check_clocks_difference(clr_tshark_csv: str, list_tshark_csv: str):
+def check_clocks_difference(clr_capture, list_capture, cache: Cache=None, jobs: int=None):
     """
-    Calculate caller and listener clocks difference and check whether
-    it's less then the specified delta.
+    Calculate initial RTT and caller and listener clocks difference,
+    milliseconds, out of the clock model estimated matching SRT packets
+    captured at both sides, see clocks.estimate_clock_model function.
 
     Attributes:
-        clr_tshark_csv:
-            Filepath to .csv tshark data collected at the caller side.
-        list_tshark_csv:
-            Filepath to .csv tshark data collected at the listener side.
+        clr_capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump collected at the caller side.
+        list_capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump collected at the listener side.
+        cache:
+            Cache of parsed datasets used if captures are filepaths.
+            If None, the files are always parsed.
+        jobs:
+            Maximum number of tshark dumps parsed in parallel. If None,
+            both dumps are parsed at once, if 1, one after another.
     """
-    # Extract SRT packets from .csv tshark dumps
-    clr_srt_packets = extract_srt_packets(clr_tshark_csv)
-    list_srt_packets = extract_srt_packets(list_tshark_csv)
-
-    # Extract UMSG_HANDSHAKE packets from SRT packets
-    clr_umsg_handshake = extract_umsg_handshake_packets(clr_srt_packets)
-    list_umsg_handshake = extract_umsg_handshake_packets(list_srt_packets)
-
-    print('\nUMSG_HANDSHAKE packets extracted from the caller dump')
-    print(clr_umsg_handshake)
-
-    print('\nUMSG_HANDSHAKE packets extracted from the listener dump')
-    print(list_umsg_handshake)
-
-    # TODO: Make better validation of handshakes
-    # Check whether there are 4 handshakes in tshark dumps
-    if len(clr_umsg_handshake) != 4:
-        raise Exception(
-            'There are less than 4 UMSG_HANDSHAKE packets in tshark dump '
-            'collected at the caller side'
-        )
+    model = estimate_clock_model(clr_capture, list_capture, cache, jobs)
 
-    if len(list_umsg_handshake) != 4:
-        raise Exception(
-            'There are less than 4 UMSG_HANDSHAKE packets in tshark dump '
-            'collected at the listener side'
-        )
-
-    # Calculate initial RTT
-    # Calculate initial RTT using caller data
-    clr_rtt_1 = clr_umsg_handshake.loc[1, 'frame.time'] - clr_umsg_handshake.loc[0, 'frame.time']
-    clr_rtt_2 = clr_umsg_handshake.loc[3, 'frame.time'] - clr_umsg_handshake.loc[2, 'frame.time']
-    clr_rtt = (clr_rtt_1 + clr_rtt_2) / 2
-    # Calculate initial RTT using listener data
-    list_rtt = list_umsg_handshake.loc[2, 'frame.time'] - list_umsg_handshake.loc[1, 'frame.time']
-    # Calculate result initial RTT
-    rtt = (clr_rtt + list_rtt) / 2
-    rtt = convert_timedelta_to_milliseconds(rtt)
-
-    # Calculate potential difference in time between caller and listener clocks
-    # delta = clr_umsg_handshake.loc[0, 'frame.time'] - list_umsg_handshake.loc[0, 'frame.time'] + rtt / 2
-    clocks_diff = list_umsg_handshake.loc[0, 'frame.time'] - clr_umsg_handshake.loc[0, 'frame.time']
-    clocks_diff = convert_timedelta_to_milliseconds(clocks_diff)
-    clocks_diff = -(clocks_diff - rtt / 2)
-
-    # TODO: Unit tests?
-    # tmp = pd.Timedelta('00:00:01.300')
-    # print(convert_timedelta_to_milliseconds(tmp))
-    # tmp2 = pd.Timedelta('01:01:01.300')
-    # print(convert_timedelta_to_milliseconds(tmp2))
-    # tmp3 = pd.Timedelta('1 days 00:00:00')
-    # print(convert_timedelta_to_milliseconds(tmp3))
-
-    rtt = round(rtt, 2)
-    clocks_diff = abs(round(clocks_diff, 2))
+    rtt = round(model.rtt_ms, 2)
+    clocks_diff = abs(round(model.offset_ms, 2))
 
     print(f'\nInitial RTT: {rtt} milliseconds')
     print(f'\nTime difference in clocks: {clocks_diff} milliseconds')
 
     # TODO: Delta on time difference
 
+    return rtt, clocks_diff
+
+
+def _clock_check_step(snd_packets: pd.DataFrame, rcv_capture: Capture):
+    """ Estimate the receiver clock matching the packets captured at both sides. """
+    return fit_packets_clock_model(snd_packets, rcv_capture.srt_packet_headers)
+
+
+def _align_tshark_step(stats: pd.DataFrame, rcv_capture: Capture, rcv_clock: ClockModel=None):
+    """ Align SRT statistics and SRT packets extracted from the receiver dump. """
+    return align_srt_tshark_stats(stats, rcv_capture, rcv_clock=rcv_clock)
+
+
+def _ack_rtt_step(rcv_capture: Capture):
+    """ Extract RTT reported in UMSG_ACK packets out of the receiver dump. """
+    return ack_rtt(rcv_capture.umsg_ack_packets)
+
+
+def _merge_shifted_srt_stats(snd_stats, rcv_stats, rcv_rtt, rcv_clock=None, start=None, end=None):
+    """ Align SRT statistics with receiver timepoints shifted by RTT/2. """
+    return merge_srt_stats(snd_stats, rcv_stats, rcv_clock, start, end, rcv_rtt)
+
+
+def pipeline_steps(
+    snd_stats_csv: str,
+    rcv_stats_csv: str,
+    snd_tshark_pcapng: str,
+    rcv_tshark_pcapng: str,
+    cache: Cache=None,
+    tshark: bool=False,
+    correct_clocks: bool=False,
+    start=None,
+    end=None,
+    rtt_shift: str=None
+):
+    """
+    Return the steps of the pipeline run by run_pipeline function as
+    a dependency graph, see srt_stats_analysis.scheduler. The result of
+    'clock check' step is the clock model, the one of 'ack alignment' step
+    is aligned SRT statistics and tshark data.
+
+    SRT packet headers needed to check the clocks and SRT control packets
+    needed to align tshark data are extracted out of the receiver dump
+    in the same pass.
+
+    SRT statistics do not depend on tshark dumps, so they are loaded and
+    aligned while the dumps are converted and parsed unless the clocks
+    are corrected.
+
+    Attributes:
+        See run_pipeline function.
+    """
+    steps = []
+
+    # Steps providing the filepaths to tshark dumps, if they are converted
+    # into .csv files first, and the filepaths known in advance
+    dumps = {}
+    for side, pcapng_path in (('snd', snd_tshark_pcapng), ('rcv', rcv_tshark_pcapng)):
+        if tshark:
+            name = f'{side} tshark conversion'
+            steps.append(Step(name, functools.partial(convert_to_csv_async, pcapng_path), kind=ASYNC))
+            dumps[side] = (name,), ()
+        else:
+            dumps[side] = (), (pcapng_path,)
+
+    deps, args = dumps['snd']
+    steps.append(Step(
+        'snd capture extraction',
+        functools.partial(read_srt_packet_headers, *args, cache=cache),
+        deps,
+        PROCESS
+    ))
+    deps, args = dumps['rcv']
+    steps.append(Step(
+        'rcv capture extraction',
+        functools.partial(read_capture, *args, cache=cache),
+        deps,
+        PROCESS
+    ))
+
+    # Estimate the difference in time matching the packets captured
+    # at both sides
+    steps.append(Step(
+        'clock check',
+        _clock_check_step,
+        ('snd capture extraction', 'rcv capture extraction')
+    ))
+    clock = ('clock check',) if correct_clocks else ()
+
+    # RTT to shift receiver timepoints by, if it is not the one of
+    # the receiver statistics: the one estimated with the clocks or
+    # reported in UMSG_ACK packets captured at the receiver side
+    if rtt_shift is not None and rtt_shift not in RTT_SOURCES:
+        raise Exception(f'Unknown RTT source {rtt_shift}')
+    merge = functools.partial(merge_srt_stats, start=start, end=end)
+    rtt = ()
+    if rtt_shift == STATS:
+        merge = functools.partial(merge, rcv_rtt=RTT_COLUMN)
+    elif rtt_shift in (CONSTANT, TSHARK):
+        merge = functools.partial(_merge_shifted_srt_stats, start=start, end=end)
+        rtt = ('rcv rtt',)
+        if rtt_shift == CONSTANT:
+            steps.append(Step('rcv rtt', lambda clock: clock.rtt_ms, ('clock check',)))
+        else:
+            steps.append(Step('rcv rtt', _ack_rtt_step, ('rcv capture extraction',)))
+
+    # Align SRT statisitcs obtained from the SRT receiver and sender,
+    # the time range is converted into the receiver clock if the clocks
+    # are corrected
+    steps += [
+        Step(
+            'snd stats load',
+            functools.partial(load_srt_stats, snd_stats_csv, cache, SND_FEATURES, start, end),
+            kind=PROCESS
+        ),
+        Step(
+            'rcv stats load',
+            functools.partial(load_srt_stats, rcv_stats_csv, cache, RCV_FEATURES, start, end),
+            clock if start is not None or end is not None else (),
+            PROCESS
+        ),
+        Step(
+            'stats alignment',
+            merge,
+            ('snd stats load', 'rcv stats load') + rtt + clock
+        ),
+    ]
+
+    # Align SRT stats and tshark data
+    steps.append(Step(
+        'ack alignment',
+        _align_tshark_step,
+        ('stats alignment', 'rcv capture extraction') + clock
+    ))
+    return steps
+
+
+def run_pipeline(
+    snd_stats_csv: str,
+    rcv_stats_csv: str,
+    snd_tshark_pcapng: str,
+    rcv_tshark_pcapng: str,
+    cache: Cache=None,
+    jobs: int=None,
+    tshark: bool=False,
+    correct_clocks: bool=False,
+    start=None,
+    end=None,
+    rtt_shift: str=None
+):
+    """
+    Estimate the caller and listener clocks difference, align SRT core
+    statistics obtained from receiver and sender and then align them
+    with tshark data. The caller is expected to be the sender and
+    the listener to be the receiver.
+
+    The steps are run as a dependency graph, each step starts as soon as
+    its inputs are ready, see pipeline_steps function.
+
+    Return the initial RTT and the clocks difference in milliseconds
+    as well as aligned SRT statistics and tshark data.
+
+    Attributes:
+        snd_stats_csv:
+            Filepath to .csv statistics collected at the sender side.
+        rcv_stats_csv:
+            Filepath to .csv statistics collected at the receiver side.
+        snd_tshark_pcapng:
+            Filepath to .pcapng tshark dump collected at the sender side.
+        rcv_tshark_pcapng:
+            Filepath to .pcapng tshark dump collected at the receiver side.
+        cache:
+            Cache of parsed datasets. If None, the files are always parsed.
+        jobs:
+            Maximum number of worker processes parsing the files and of
+            worker threads aligning the datasets. If None, as many as
+            there are CPUs, if 1, the steps are run one after another
+            in the current process.
+        tshark:
+            If True, .pcapng dumps are converted into .csv files with
+            tshark first. Otherwise, SRT control packets are read out of
+            .pcapng dumps directly.
+        correct_clocks:
+            If True, receiver timepoints are converted into the sender
+            clock with the offset and the drift estimated before aligning.
+        start:
+            First sender timepoint to align, UTC+0 if timezone-naive.
+            If None, from the beginning of the session.
+        end:
+            Last sender timepoint to align, inclusive. If None, up to
+            the end of the session.
+        rtt_shift:
+            Source of RTT to shift receiver timepoints back by RTT/2 by,
+            one of rtt_shift.RTT_SOURCES: constant RTT estimated out of
+            tshark dumps, msRTT of the receiver statistics or srt.rtt of
+            UMSG_ACK packets captured at the receiver side. If None,
+            the timepoints are not shifted.
+    """
+    steps = pipeline_steps(
+        snd_stats_csv,
+        rcv_stats_csv,
+        snd_tshark_pcapng,
+        rcv_tshark_pcapng,
+        cache,
+        tshark,
+        correct_clocks,
+        start,
+        end,
+        rtt_shift
+    )
+    results, runs = run_steps(steps, jobs)
+
+    clock = results['clock check']
+    rtt = round(clock.rtt_ms, 2)
+    clocks_diff = abs(round(clock.offset_ms, 2))
+    stats = results['stats alignment']
+    df = results['ack alignment']
+
+    print_frame('Aligned SRT sender and receiver statistics', stats)
+    print_frame('Aligned SRT statisitics and tshark data', df)
+
+    print('\nPipeline steps')
+    print(format_runs(steps, runs))
+
+    return rtt, clocks_diff, df
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    """ Add command line options configuring the cache of parsed datasets. """
+    parser.add_argument(
+        '--cache-dir',
+        help='Directory to cache parsed datasets in, by default '
+        f'${CACHE_DIR_ENV} or ~/.cache/srt-stats-analysis'
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        help='Maximum size of the cache, bytes'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Parse all the datasets without using the cache'
+    )
+
+
+def cache_from_arguments(args: argparse.Namespace):
+    """ Create the cache configured by command line options, None if disabled. """
+    if args.no_cache:
+        return None
+    return default_cache(args.cache_dir, args.cache_size)
+
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Align SRT core statistics obtained from receiver and '
+        'sender as well as tshark datasets.'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='Maximum number of worker processes and of worker threads '
+        'the pipeline steps are run in, the concurrent.futures defaults '
+        'if not set, 1 runs the steps one after another in the main process'
+    )
+    parser.add_argument(
+        '--tshark',
+        action='store_true',
+        help='Convert tshark dumps into .csv files with tshark instead '
+        'of reading .pcapng files directly'
+    )
+    parser.add_argument(
+        '--correct-clocks',
+        action='store_true',
+        help='Convert receiver timepoints into the sender clock with '
+        'the offset and the drift estimated from tshark dumps'
+    )
+    parser.add_argument(
+        '--rtt-shift',
+        choices=RTT_SOURCES,
+        help='Shift receiver timepoints back by RTT/2 before aligning, '
+        'RTT being constant one estimated out of tshark dumps, msRTT of '
+        'receiver statistics or srt.rtt of UMSG_ACK packets at the receiver side'
+    )
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Do not print intermediate dataframes'
+    )
+    parser.add_argument(
+        '--start',
+        help='First sender timepoint to align, UTC, e.g. "2020-02-10 17:40:00". '
+        'Only the parts of the statistics files around the time range are loaded'
+    )
+    parser.add_argument(
+        '--end',
+        help='Last sender timepoint to align, UTC'
+    )
+    parser.add_argument(
+        '--output',
+        help='Directory to save aligned SRT statistics and tshark data in, '
+        'see srt_stats_analysis.store'
+    )
+    parser.add_argument(
+        '--report',
+        help='Save the timing and memory report of the pipeline stages '
+        'in .json file'
+    )
+    parser.add_argument(
+        '--tracemalloc',
+        action='store_true',
+        help='Trace memory allocations to report the peak memory '
+        'allocated within each stage, slows the pipeline down'
+    )
+    parser.add_argument(
+        '--profile-dir',
+        help='Profile each stage with cProfile and save the statistics '
+        'in the directory'
+    )
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    cache = cache_from_arguments(args)
+    set_verbose(not args.quiet)
+    recorder = Recorder(args.tracemalloc, args.profile_dir)
+
     # Set filepaths to the source files: sender and receiver SRT core
     # .csv statistics, tshark .pcapng dumps collected on both sides
     SND_STATS_CSV = '_data/_useast_eunorth_10.02.20_100Mbps/msharabayko@23.96.93.54/4-srt-xtransmit-stats-snd.csv'
@@ -397,7 +962,7 @@ def main():
     SND_TSHARK_PCAPNG = '_data/_useast_eunorth_10.02.20_100Mbps/msharabayko@23.96.93.54/1-tshark-tracefile-snd.pcapng'
     RCV_TSHARK_PCAPNG = '_data/_useast_eunorth_10.02.20_100Mbps/msharabayko@40.69.89.21/2-tshark-tracefile-rcv.pcapng'
 
-    # TODO: 5 handshakes in this data
+    # 5 handshakes in this data
     # SND_STATS_CSV = '_data/_useast_eunorth_10.02.20_300Mbps/msharabayko@23.96.93.54/4-srt-xtransmit-stats-snd.csv'
     # RCV_STATS_CSV = '_data/_useast_eunorth_10.02.20_300Mbps/msharabayko@40.69.89.21/3-srt-xtransmit-stats-rcv.csv'
     # SND_TSHARK_PCAPNG = '_data/_useast_eunorth_10.02.20_300Mbps/msharabayko@23.96.93.54/1-tshark-tracefile-snd.pcapng'
@@ -408,35 +973,28 @@ def main():
     # SND_TSHARK_PCAPNG = '_data/_useast_eunorth_10.02.20_600Mbps/msharabayko@23.96.93.54/1-tshark-tracefile-snd.pcapng'
     # RCV_TSHARK_PCAPNG = '_data/_useast_eunorth_10.02.20_600Mbps/msharabayko@40.69.89.21/2-tshark-tracefile-rcv.pcapng'
 
-    # TODO: Make it properly
-    # For the first time
-    # RCV_TSHARK_CSV = convert.convert_to_csv(pathlib.Path(RCV_TSHARK_PCAPNG), True)
-    # For the following time
-    SND_TSHARK_CSV = convert_to_csv(pathlib.Path(SND_TSHARK_PCAPNG))
-    RCV_TSHARK_CSV = convert_to_csv(pathlib.Path(RCV_TSHARK_PCAPNG))
-
-    CLR_TSHARK_CSV = SND_TSHARK_CSV
-    LIST_TSHARK_CSV = RCV_TSHARK_CSV
-
-    # Check the difference in time
-    print('\nCalculating the caller and sender clocks difference')
-    check_clocks_difference(CLR_TSHARK_CSV, LIST_TSHARK_CSV)
-
-    # Align SRT statisitcs obtained from the SRT receiver and sender
-    print('\nAligning SRT statistics obtained from the SRT receiver and sender')
-    stats = align_srt_stats(SND_STATS_CSV, RCV_STATS_CSV)
-
-    print('\nAligned SRT sender and receiver statistics')
-    print(stats.head(10))
-    print(stats.tail(10))
-
-    # Align SRT stats and tshark data
-    print('\nAligning SRT statistics and tshark data')
-    df = align_srt_tshark_stats(stats, RCV_TSHARK_CSV)
-
-    print('\nAligned SRT statisitics and tshark data')
-    print(df.head(10))
-    print(df.tail(10))
+    with recording(recorder):
+        _, _, df = run_pipeline(
+            SND_STATS_CSV,
+            RCV_STATS_CSV,
+            SND_TSHARK_PCAPNG,
+            RCV_TSHARK_PCAPNG,
+            cache,
+            args.jobs,
+            args.tshark,
+            args.correct_clocks,
+            args.start,
+            args.end,
+            args.rtt_shift
+        )
+        if args.output is not None:
+            with stage('store', len(df)):
+                save_results(df, args.output, overwrite=True)
+
+    print('\nPipeline stages')
+    print(recorder.format_report())
+    if args.report is not None:
+        recorder.save_report(args.report)
 
 
 if __name__ == '__main__':
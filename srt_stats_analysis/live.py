@@ -0,0 +1,679 @@
+"""
+Module designed to align SRT core statistics of long-running links
+live, without .csv files on disk: srt-xtransmit records are read from
+pipes, e.g. stdin or named pipes srt-xtransmit writes to, or from local
+UDP or Unix sockets the records are forwarded to.
+
+The records of each side are parsed in batches and kept in fixed-capacity
+ring buffers, one array per column preallocated on the first batch, so
+only the most recent rows are kept and the memory used stays the same
+however long the link runs. Sender timepoints are aligned continuously
+with streaming.SrtStatsAligner, the same way join_stats.align_srt_stats
+does, and aligned statistics go into a ring buffer as well.
+
+Sources are given as:
+
+- '-' for stdin;
+- udp://HOST:PORT or unixgram://PATH for a datagram socket bound
+  to receive the records, one or more complete lines per datagram;
+- unix://PATH for a stream socket accepting connections, e.g. from
+  `srt-xtransmit ... | nc -U PATH`;
+- a filepath to a named pipe otherwise, it is opened once a writer
+  opens it.
+"""
+import argparse
+import io
+import os
+import selectors
+import socket
+import stat
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.align import sort_by_time
+from srt_stats_analysis.join_stats import RCV_FEATURES, SND_FEATURES, prepare_srt_stats
+from srt_stats_analysis.schema import SRT_XTRANSMIT_COLUMNS, read_csv_arguments
+from srt_stats_analysis.streaming import SrtStatsAligner
+
+
+STDIN = '-'
+UDP_SCHEME = 'udp://'
+UNIX_SCHEME = 'unix://'
+UNIXGRAM_SCHEME = 'unixgram://'
+
+# Default number of rows kept in each ring buffer, 10 minutes of
+# statistics collected each millisecond
+DEFAULT_CAPACITY = 600000
+
+# Maximum number of bytes read out of a source at once
+READ_SIZE = 1024 ** 2
+
+# Receive buffer of datagram sockets, bytes, it keeps the records coming
+# while a batch is aligned
+SOCKET_BUFFER_SIZE = 8 * 1024 ** 2
+
+# Columns of the records received before the header line
+DEFAULT_COLUMNS = [column.name for column in SRT_XTRANSMIT_COLUMNS]
+
+HEADER_START = b'Timepoint'
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of the last rows of a time series: one array
+    per column and one of the timepoints, allocated on the first append
+    with the dtypes of the rows appended. Rows are appended in the order
+    of time, the oldest ones are overwritten once the buffer is full.
+
+    Attributes:
+        capacity:
+            Maximum number of rows kept.
+    """
+
+    def __init__(self, capacity: int=DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise Exception('Capacity of ring buffer should be positive')
+        self.capacity = capacity
+        self.timepoints = None
+        self.arrays = None
+        self.index_name = None
+        # Number of rows appended since the buffer was created
+        self.appended = 0
+
+    def __len__(self):
+        return min(self.appended, self.capacity)
+
+    @property
+    def columns(self):
+        return [] if self.arrays is None else list(self.arrays)
+
+    @property
+    def last(self):
+        """ The last timepoint appended, None if the buffer is empty. """
+        if self.appended == 0:
+            return None
+        return pd.Timestamp(int(self.timepoints[(self.appended - 1) % self.capacity]))
+
+    def append(self, df: pd.DataFrame):
+        """
+        Append rows indexed by timepoints later than the ones appended
+        before, the columns should be the same as in the first append.
+
+        Attributes:
+            df:
+                Rows to append.
+        """
+        if len(df) == 0:
+            return
+        if self.arrays is None:
+            self.timepoints = np.empty(self.capacity, dtype=np.int64)
+            self.arrays = {
+                col: np.empty(self.capacity, dtype=df[col].to_numpy().dtype)
+                for col in df.columns
+            }
+            self.index_name = df.index.name
+        elif list(df.columns) != self.columns:
+            raise Exception(f'Ring buffer has columns {self.columns}, got {list(df.columns)}')
+
+        # Only the last capacity rows of a large batch are kept
+        skipped = max(len(df) - self.capacity, 0)
+        count = len(df) - skipped
+        start = (self.appended + skipped) % self.capacity
+        head = min(count, self.capacity - start)
+        pairs = [(self.timepoints, df.index.asi8)]
+        pairs += [(self.arrays[col], df[col].to_numpy()) for col in self.arrays]
+        for array, values in pairs:
+            values = values[skipped:]
+            array[start:start + head] = values[:head]
+            array[:count - head] = values[head:]
+        self.appended += len(df)
+
+    def _segments(self):
+        """ Positions of the rows kept, oldest first, as two slices. """
+        begin = (self.appended - len(self)) % self.capacity
+        head = min(len(self), self.capacity - begin)
+        return slice(begin, begin + head), slice(0, len(self) - head)
+
+    def _search(self, timepoint, side: str):
+        """ Number of rows kept before the timepoint, see np.searchsorted. """
+        first, second = self._segments()
+        value = pd.Timestamp(timepoint).value
+        position = int(np.searchsorted(self.timepoints[first], value, side))
+        if position < first.stop - first.start:
+            return position
+        return position + int(np.searchsorted(self.timepoints[second], value, side))
+
+    def to_frame(self, start=None, end=None):
+        """
+        Return a copy of the rows kept with timepoints within [start, end],
+        oldest first.
+
+        Attributes:
+            start:
+                First timepoint, UTC+0. If None, from the oldest row kept.
+            end:
+                Last timepoint, inclusive. If None, up to the last row.
+        """
+        if self.arrays is None:
+            return pd.DataFrame()
+        lower = 0 if start is None else self._search(start, 'left')
+        upper = len(self) if end is None else self._search(end, 'right')
+        begin = (self.appended - len(self)) % self.capacity
+        positions = (begin + np.arange(lower, max(lower, upper))) % self.capacity
+        index = pd.DatetimeIndex(self.timepoints[positions].view('M8[ns]'), name=self.index_name)
+        return pd.DataFrame(
+            {col: array[positions] for col, array in self.arrays.items()},
+            index=index
+        )
+
+
+def _header_position(data: bytes):
+    """ Position of the first header line in data, -1 if there is none. """
+    if data.startswith(HEADER_START):
+        return 0
+    position = data.find(b'\n' + HEADER_START)
+    return position if position < 0 else position + 1
+
+
+class StatsRecords:
+    """
+    Assembler of srt-xtransmit .csv records received in pieces. Bytes are
+    fed as they arrive, the complete lines are parsed in batches. Header
+    lines, written at the start and again when srt-xtransmit restarts,
+    set the columns of the following records. The records received before
+    any header are parsed with the columns of the schema.
+
+    Malformed records, e.g. cut in datagrams, are skipped and counted.
+
+    Attributes:
+        features:
+            SRT statistics features to extract.
+    """
+
+    def __init__(self, features: list):
+        self.features = features
+        self.columns = None
+        self.rows = 0
+        self.malformed = 0
+        self._partial = b''
+        self._lines = []
+
+    def feed(self, data: bytes, datagram: bool=False):
+        """
+        Add the bytes received.
+
+        Attributes:
+            data:
+                Bytes received.
+            datagram:
+                If True, data is one datagram of complete lines, the last
+                line may come without the line break.
+        """
+        if datagram:
+            if not data.endswith(b'\n'):
+                data += b'\n'
+            self._lines.append(data)
+            return
+        data = self._partial + data
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        if end:
+            self._lines.append(data[:end])
+
+    def parse(self):
+        """
+        Return the records completed since the previous call prepared
+        with join_stats.prepare_srt_stats, None if there are none.
+        """
+        if not self._lines:
+            return None
+        data = b''.join(self._lines)
+        self._lines = []
+
+        frames = []
+        while data:
+            header = _header_position(data)
+            rows, data = (data, b'') if header < 0 else (data[:header], data[header:])
+            if rows.strip():
+                frames.append(self._parse_rows(rows))
+            if header >= 0:
+                end = data.find(b'\n') + 1
+                self.columns = list(pd.read_csv(io.BytesIO(data[:end]), nrows=0).columns)
+                data = data[end:]
+        frames = [frame for frame in frames if len(frame) > 0]
+        if not frames:
+            return None
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    def _parse_rows(self, rows: bytes):
+        lines = rows.count(b'\n')
+        columns = self.columns or DEFAULT_COLUMNS
+        stats = None
+        for integer_na in (False, True):
+            try:
+                stats = pd.read_csv(
+                    io.BytesIO(rows),
+                    header=None,
+                    names=columns,
+                    on_bad_lines='skip',
+                    **read_csv_arguments(self.features, integer_na)
+                )
+                stats = prepare_srt_stats(stats.dropna(), self.features)
+                break
+            except (ValueError, TypeError):
+                # Integer columns with missing values are parsed as float
+                # ones first, a batch with broken timepoints is skipped
+                stats = None
+        if stats is None:
+            self.malformed += lines
+            return pd.DataFrame()
+        self.rows += len(stats)
+        self.malformed += lines - len(stats)
+        return stats
+
+
+class RecordSource:
+    """
+    Pipe or local socket srt-xtransmit records of one side are read from,
+    see the module docstring for the sources supported.
+
+    Attributes:
+        spec:
+            Source of the records.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.datagram = False
+        self.closed = False
+        self._path = None
+        self._connections = []
+
+        if spec == STDIN:
+            self.fileobj = sys.stdin.buffer
+        elif spec.startswith(UDP_SCHEME):
+            host, port = spec[len(UDP_SCHEME):].rsplit(':', 1)
+            self.fileobj = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.fileobj.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+            self.fileobj.bind((host, int(port)))
+            self.datagram = True
+        elif spec.startswith((UNIX_SCHEME, UNIXGRAM_SCHEME)):
+            self.datagram = spec.startswith(UNIXGRAM_SCHEME)
+            self._path = spec.split('://', 1)[1]
+            # A socket file left by a previous run is replaced
+            if os.path.exists(self._path) and stat.S_ISSOCK(os.stat(self._path).st_mode):
+                os.unlink(self._path)
+            kind = socket.SOCK_DGRAM if self.datagram else socket.SOCK_STREAM
+            self.fileobj = socket.socket(socket.AF_UNIX, kind)
+            if self.datagram:
+                self.fileobj.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+            self.fileobj.bind(self._path)
+            if not self.datagram:
+                self.fileobj.listen()
+        else:
+            self.fileobj = open(spec, 'rb', buffering=0)
+        if isinstance(self.fileobj, socket.socket):
+            self.fileobj.setblocking(False)
+        else:
+            os.set_blocking(self.fileobj.fileno(), False)
+
+    def register(self, selector: selectors.BaseSelector, side: str):
+        """ Register the source in the selector with the side as data. """
+        selector.register(self.fileobj, selectors.EVENT_READ, side)
+
+    def read(self, selector: selectors.BaseSelector, fileobj):
+        """
+        Read the data available out of the file object ready and return
+        the chunks read. A pipe is closed once it reaches the end, stream
+        socket connections are closed once the peer closes them.
+        """
+        if self.datagram:
+            chunks = []
+            # Limit the datagrams read at once so that the other side
+            # does not wait
+            for _ in range(1024):
+                try:
+                    chunks.append(fileobj.recv(READ_SIZE))
+                except BlockingIOError:
+                    break
+            return chunks
+
+        if fileobj is self.fileobj and isinstance(fileobj, socket.socket):
+            connection, _ = fileobj.accept()
+            connection.setblocking(False)
+            selector.register(connection, selectors.EVENT_READ, selector.get_key(fileobj).data)
+            self._connections.append(connection)
+            return []
+
+        try:
+            if isinstance(fileobj, socket.socket):
+                data = fileobj.recv(READ_SIZE)
+            else:
+                data = os.read(fileobj.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return []
+        if data:
+            return [data]
+
+        selector.unregister(fileobj)
+        fileobj.close()
+        if fileobj is self.fileobj:
+            self.closed = True
+        else:
+            self._connections.remove(fileobj)
+        return []
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        if self.fileobj is not sys.stdin.buffer:
+            self.fileobj.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
+        self.closed = True
+
+
+class LiveStats:
+    """
+    Live ingest and alignment of SRT statistics of one link.
+
+    Rows of each side which are not later than the last one received,
+    e.g. reordered or duplicated datagrams, are dropped and counted. Until
+    both sides have sent rows, only as many last rows of each side as
+    the ring buffers keep wait for the alignment, so a side which is late
+    to start does not make the other one grow.
+
+    Attributes:
+        snd_source:
+            Source of the records collected at the sender side.
+        rcv_source:
+            Source of the records collected at the receiver side.
+        capacity:
+            Number of rows kept in each ring buffer.
+        holdback:
+            Time window the sender timepoints wait for the late receiver
+            timepoints in, see follow.follow_srt_stats. If None, sender
+            timepoints wait until there are capacity rows waiting, see
+            streaming.SrtStatsAligner.
+    """
+
+    def __init__(
+        self,
+        snd_source: str,
+        rcv_source: str,
+        capacity: int=DEFAULT_CAPACITY,
+        holdback: pd.Timedelta=pd.Timedelta(seconds=5)
+    ):
+        self.holdback = holdback
+        self.buffers = {
+            'snd': RingBuffer(capacity),
+            'rcv': RingBuffer(capacity),
+        }
+        self.aligned = RingBuffer(capacity)
+        self.records = {
+            'snd': StatsRecords(SND_FEATURES),
+            'rcv': StatsRecords(RCV_FEATURES),
+        }
+        self.dropped = {'snd': 0, 'rcv': 0}
+        # Rows waiting for the alignment are bounded the same way as
+        # the ones kept in the ring buffers
+        self.aligner = SrtStatsAligner(capacity)
+        self._pending = {'snd': [], 'rcv': []}
+        self._waiting = True
+        # Sides over before both sides have sent rows, they are closed
+        # once the alignment starts
+        self._closed_waiting = set()
+        # Unlike epoll, poll accepts regular files, e.g. stdin redirected
+        # from a file
+        self._selector = selectors.PollSelector() if hasattr(selectors, 'PollSelector') else selectors.SelectSelector()
+        self.sources = {}
+        try:
+            for side, spec in (('snd', snd_source), ('rcv', rcv_source)):
+                self.sources[side] = RecordSource(spec)
+                self.sources[side].register(self._selector, side)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def finished(self):
+        """
+        True when both pipes are over and all the rows are aligned or
+        one of the sides is over without sending any rows.
+        """
+        if self._waiting:
+            return any(
+                side in self._closed_waiting and not self._pending[side]
+                for side in ('snd', 'rcv')
+            )
+        return self.aligner.finished
+
+    def poll(self, timeout: float):
+        """
+        Read the data available out of the sources, waiting for it up to
+        timeout seconds. Return True if anything has been received.
+        """
+        if not self._selector.get_map():
+            time.sleep(timeout)
+            return False
+        received = False
+        for key, _ in self._selector.select(timeout):
+            side = key.data
+            source = self.sources[side]
+            for chunk in source.read(self._selector, key.fileobj):
+                self.records[side].feed(chunk, source.datagram)
+                received = True
+        return received
+
+    def update(self):
+        """
+        Parse the records received, align the sender timepoints which
+        are ready and return them, None if there are none.
+        """
+        for side in ('snd', 'rcv'):
+            stats = self.records[side].parse()
+            if stats is not None:
+                self._push(side, stats)
+
+        # Pipes over mark the end of their side
+        for side, source in self.sources.items():
+            if source.closed and not self._side_closed(side) and side not in self._closed_waiting:
+                self._close_side(side)
+
+        if self.holdback is not None and self.aligner.snd_last is not None:
+            self.aligner.release(self.aligner.snd_last - self.holdback)
+        aligned = self.aligner.pop()
+        if aligned is None or len(aligned) == 0:
+            return None
+        self.aligned.append(aligned)
+        return aligned
+
+    def _push(self, side: str, stats: pd.DataFrame):
+        buffer = self.buffers[side]
+        stats = sort_by_time(stats)
+        keep = ~stats.index.duplicated()
+        if buffer.last is not None:
+            keep &= stats.index > buffer.last
+        self.dropped[side] += int(len(stats) - keep.sum())
+        stats = stats[keep]
+        if len(stats) == 0:
+            return
+        buffer.append(stats)
+
+        if not self._waiting:
+            self._push_aligner(side, stats)
+            return
+        pending = pd.concat(self._pending[side] + [stats])
+        self._pending[side] = [pending.iloc[-self.buffers[side].capacity:]]
+        if self._pending['snd'] and self._pending['rcv']:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        self._waiting = False
+        for side in ('snd', 'rcv'):
+            for stats in self._pending[side]:
+                self._push_aligner(side, stats)
+            self._pending[side] = []
+        for side in sorted(self._closed_waiting):
+            self._close_side(side)
+
+    def _push_aligner(self, side: str, stats: pd.DataFrame):
+        if side == 'snd':
+            self.aligner.push_snd(stats)
+        else:
+            self.aligner.push_rcv(stats)
+
+    def _side_closed(self, side: str):
+        return self.aligner.snd_closed if side == 'snd' else self.aligner.rcv_closed
+
+    def _close_side(self, side: str):
+        if self._waiting:
+            self._closed_waiting.add(side)
+            return
+        if side == 'snd':
+            self.aligner.close_snd()
+        else:
+            self.aligner.close_rcv()
+
+    def run(self, interval: float=0.1, idle_timeout: float=None, duration: float=None):
+        """
+        Ingest the records and yield newly aligned SRT statistics about
+        each interval until both pipes are over, no records are received
+        for idle_timeout seconds or duration seconds have passed. The rest
+        of the statistics received are aligned at the end.
+
+        Attributes:
+            interval:
+                Interval between the alignments, seconds.
+            idle_timeout:
+                If set, the sides are considered complete once no records
+                are received for that many seconds.
+            duration:
+                If set, ingest stops after that many seconds.
+        """
+        started = last_received = time.monotonic()
+        while not self.finished:
+            deadline = time.monotonic() + interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self.poll(remaining):
+                    last_received = time.monotonic()
+            aligned = self.update()
+            if aligned is not None:
+                yield aligned
+
+            now = time.monotonic()
+            timed_out = idle_timeout is not None and now - last_received >= idle_timeout
+            if timed_out or (duration is not None and now - started >= duration):
+                break
+
+        # Sides which have not sent any rows have nothing to align
+        if not self.finished and not self._waiting:
+            for side in ('snd', 'rcv'):
+                if not self._side_closed(side):
+                    self._close_side(side)
+            aligned = self.aligner.pop()
+            if aligned is not None and len(aligned) > 0:
+                self.aligned.append(aligned)
+                yield aligned
+
+    def status(self):
+        """ Return the counters of the rows received, dropped and aligned. """
+        return {
+            'snd_rows': self.buffers['snd'].appended,
+            'rcv_rows': self.buffers['rcv'].appended,
+            'snd_malformed': self.records['snd'].malformed,
+            'rcv_malformed': self.records['rcv'].malformed,
+            'snd_dropped': self.dropped['snd'],
+            'rcv_dropped': self.dropped['rcv'],
+            'aligned_rows': self.aligned.appended,
+            'aligned_last': self.aligned.last,
+        }
+
+    def close(self):
+        """ Close the sources. """
+        for source in self.sources.values():
+            source.close()
+        self._selector.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Read SRT core statistics records from pipes or local '
+        'sockets and print aligned receiver and sender statistics.'
+    )
+    parser.add_argument(
+        'snd_source',
+        help="Source of the records collected at the sender side: '-' for stdin, "
+        'udp://HOST:PORT, unixgram://PATH, unix://PATH or a named pipe'
+    )
+    parser.add_argument('rcv_source', help='Source of the records collected at the receiver side')
+    parser.add_argument(
+        '--capacity',
+        type=int,
+        default=DEFAULT_CAPACITY,
+        help='Number of rows kept in each ring buffer'
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=0.1,
+        help='Interval between the alignments, seconds'
+    )
+    parser.add_argument(
+        '--holdback',
+        type=float,
+        default=5.0,
+        help='Time window sender timepoints wait for late receiver ones in, seconds'
+    )
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        help='Stop once no records are received for that many seconds'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help='Stop after that many seconds'
+    )
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Print the counters of the rows received and aligned instead '
+        'of aligned statistics'
+    )
+    args = parser.parse_args()
+
+    with LiveStats(
+        args.snd_source,
+        args.rcv_source,
+        args.capacity,
+        pd.Timedelta(seconds=args.holdback)
+    ) as live:
+        header = True
+        try:
+            for aligned in live.run(args.interval, args.idle_timeout, args.duration):
+                if args.quiet:
+                    print(live.status(), flush=True)
+                else:
+                    print(aligned.to_string(header=header), flush=True)
+                    header = False
+        except KeyboardInterrupt:
+            pass
+        print(live.status(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
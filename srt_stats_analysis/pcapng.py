@@ -0,0 +1,685 @@
+"""
+Module designed to extract SRT control packets out of .pcapng tshark
+dumps directly, without exporting the whole dump into .csv file with
+tshark first.
+
+The file is memory-mapped. Enhanced Packet Blocks following each other
+are found with numpy for the whole file at once, only the other blocks,
+e.g. the ones describing interfaces, are walked in Python. Link, IP, UDP
+and SRT headers of the captured packets are then
+decoded with numpy for all the packets at once, only far enough to find
+SRT control packets. Full fields are decoded for UMSG_ACK and
+UMSG_HANDSHAKE packets only. The columns are named after tshark fields,
+so the result can be used instead of the packets extracted out of .csv
+tshark dumps.
+
+SRT headers of all the packets, data ones included, can be decoded as
+well to match the packets captured at both sides, see clocks module.
+"""
+import array
+import ipaddress
+import mmap
+import pathlib
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+# Block types
+SHB_TYPE = 0x0A0D0D0A
+IDB_TYPE = 0x00000001
+PB_TYPE = 0x00000002
+SPB_TYPE = 0x00000003
+EPB_TYPE = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Enhanced Packet Block without packet data and options, bytes
+EPB_MIN_LENGTH = 32
+# Number of 32-bit words of the file scanned for Enhanced Packet Blocks
+# at once, bounds the memory used by the temporary arrays
+SCAN_WORDS = 2 ** 24
+
+# Interface Description Block options
+OPT_ENDOFOPT = 0
+IF_TSRESOL = 9
+IF_TSOFFSET = 14
+DEFAULT_TSRESOL = 6
+
+# Link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPES_VLAN = [0x8100, 0x88A8, 0x9100]
+# AF_INET6 values used by different systems in LINKTYPE_NULL header
+AF_INET = 2
+AF_INET6 = [10, 24, 28, 30]
+IPPROTO_UDP = 17
+
+UDP_HEADER_SIZE = 8
+SRT_HEADER_SIZE = 16
+
+# SRT control packet types
+UMSG_HANDSHAKE = 0x0
+UMSG_KEEPALIVE = 0x1
+UMSG_ACK = 0x2
+UMSG_LOSSREPORT = 0x3
+UMSG_CGWARNING = 0x4
+UMSG_SHUTDOWN = 0x5
+UMSG_ACKACK = 0x6
+UMSG_DROPREQ = 0x7
+UMSG_PEERERROR = 0x8
+UMSG_EXT = 0x7FFF
+SRT_CONTROL_TYPES = [
+    UMSG_HANDSHAKE,
+    UMSG_KEEPALIVE,
+    UMSG_ACK,
+    UMSG_LOSSREPORT,
+    UMSG_CGWARNING,
+    UMSG_SHUTDOWN,
+    UMSG_ACKACK,
+    UMSG_DROPREQ,
+    UMSG_PEERERROR,
+    UMSG_EXT,
+]
+
+# Fields of UMSG_ACK and UMSG_HANDSHAKE control information, offsets
+# from the beginning of the control information, bytes. Light and small
+# acknowledgements do not have all the fields, the missing ones are NaN.
+ACK_FIELDS = [
+    ('srt.ack_seqno', 0),
+    ('srt.rtt', 4),
+    ('srt.rttvar', 8),
+    ('srt.bufavail', 12),
+    ('srt.rate', 16),
+    ('srt.bw', 20),
+    ('srt.rcvrate', 24),
+]
+HANDSHAKE_FIELDS = [
+    ('srt.hs.version', 0),
+    ('srt.hs.isn', 8),
+    ('srt.hs.mtu', 12),
+    ('srt.hs.flow_window', 16),
+    ('srt.hs.reqtype', 20),
+    ('srt.hs.id', 24),
+    ('srt.hs.cookie', 28),
+]
+
+
+def _be16(data: np.ndarray, idx: np.ndarray):
+    """ Gather big-endian uint16 values at the offsets. """
+    return (data[idx].astype(np.uint32) << 8) | data[idx + 1]
+
+
+def _be32(data: np.ndarray, idx: np.ndarray):
+    """ Gather big-endian uint32 values at the offsets. """
+    return (
+        (data[idx].astype(np.uint32) << 24)
+        | (data[idx + 1].astype(np.uint32) << 16)
+        | (data[idx + 2].astype(np.uint32) << 8)
+        | data[idx + 3]
+    )
+
+
+def _u32(data: np.ndarray, idx: np.ndarray, byteorder: str):
+    """ Gather uint32 values of the section byte order at the offsets. """
+    if byteorder == '>':
+        return _be32(data, idx)
+    return (
+        data[idx].astype(np.uint32)
+        | (data[idx + 1].astype(np.uint32) << 8)
+        | (data[idx + 2].astype(np.uint32) << 16)
+        | (data[idx + 3].astype(np.uint32) << 24)
+    )
+
+
+def _parse_interface(buf, offset: int, block_length: int, byteorder: str):
+    """
+    Parse Interface Description Block, return the link type,
+    the timestamps resolution and offset.
+    """
+    linktype, = struct.unpack_from(f'{byteorder}H', buf, offset + 8)
+    tsresol = DEFAULT_TSRESOL
+    tsoffset = 0
+
+    position = offset + 16
+    end = offset + block_length - 4
+    while position + 4 <= end:
+        code, length = struct.unpack_from(f'{byteorder}HH', buf, position)
+        position += 4
+        if code == OPT_ENDOFOPT:
+            break
+        if code == IF_TSRESOL:
+            tsresol = buf[position]
+        elif code == IF_TSOFFSET:
+            tsoffset, = struct.unpack_from(f'{byteorder}q', buf, position)
+        position += (length + 3) & ~3
+
+    return linktype, tsresol, tsoffset
+
+
+def _packet_block_runs(buf, byteorder: str):
+    """
+    Find Enhanced Packet Blocks of .pcapng file content with numpy.
+    Return the offsets and the ends of the blocks found, as well as
+    the indices of the blocks which are not directly followed by the next
+    block found, i.e. the last blocks of the runs of blocks following
+    each other.
+
+    Blocks are 32-bit aligned, so every 32-bit word of the file of
+    the block type is a candidate, if the block length is repeated at
+    the end of the block. Candidates within the packet data, if any,
+    are not followed by the next block and do not follow the previous one,
+    so they are never reached walking the runs from the first block.
+    """
+    words = np.frombuffer(buf, dtype=f'{byteorder}u4', count=len(buf) // 4)
+    candidates = [
+        np.flatnonzero(words[start:start + SCAN_WORDS] == EPB_TYPE) + start
+        for start in range(0, len(words), SCAN_WORDS)
+    ]
+    candidates = np.concatenate(candidates) if candidates else np.zeros(0, dtype=np.int64)
+
+    candidates = candidates[candidates + 1 < len(words)]
+    lengths = words[candidates + 1].astype(np.int64)
+    ends = candidates + lengths // 4
+    valid = (lengths >= EPB_MIN_LENGTH) & (lengths % 4 == 0) & (ends <= len(words))
+    candidates = candidates[valid]
+    lengths = lengths[valid]
+    ends = ends[valid]
+    valid = words[ends - 1] == lengths
+    offsets = candidates[valid] * 4
+    ends = ends[valid] * 4
+
+    run_ends = np.flatnonzero(ends[:-1] != offsets[1:])
+    run_ends = np.append(run_ends, len(offsets) - 1)
+    return offsets, ends, run_ends
+
+
+def walk_blocks(buf):
+    """
+    Walk the blocks of .pcapng file. Return the list of interfaces
+    described, the byte order of the file, as well as the offsets,
+    the frame numbers and the interface indices of Enhanced Packet Blocks.
+
+    Simple and obsolete Packet Blocks are counted in frame numbers the way
+    tshark does, but are skipped since they carry either no timestamps or
+    no interface options.
+
+    Runs of Enhanced Packet Blocks following each other are taken at once
+    out of the blocks found with numpy, see _packet_block_runs, the other
+    blocks are walked one by one.
+
+    Attributes:
+        buf:
+            Content of .pcapng file, e.g. memory-mapped file.
+    """
+    interfaces = []
+    offsets = array.array('q')
+    numbers = array.array('q')
+    bases = array.array('q')
+
+    byteorder = None
+    header = None
+    runs = None
+    base = 0
+    number = 0
+    offset = 0
+    size = len(buf)
+
+    while offset + 12 <= size:
+        if header is None or buf[offset:offset + 4] == b'\x0a\x0d\x0d\x0a':
+            # Section Header Block, its type is the same in both byte orders
+            block_type = SHB_TYPE
+            magic, = struct.unpack_from('<I', buf, offset + 8)
+            section_byteorder = '<' if magic == BYTE_ORDER_MAGIC else '>'
+            if struct.unpack_from(f'{section_byteorder}I', buf, offset + 8)[0] != BYTE_ORDER_MAGIC:
+                raise Exception(f'Not a .pcapng file or a broken section at offset {offset}')
+            if byteorder is not None and section_byteorder != byteorder:
+                raise Exception('Sections with different byte orders are not supported')
+            byteorder = section_byteorder
+            header = struct.Struct(f'{byteorder}II')
+            base = len(interfaces)
+            _, block_length = header.unpack_from(buf, offset)
+        else:
+            block_type, block_length = header.unpack_from(buf, offset)
+
+        if block_type == EPB_TYPE:
+            if runs is None:
+                runs = _packet_block_runs(buf, byteorder)
+            block_offsets, block_ends, run_ends = runs
+            first = int(np.searchsorted(block_offsets, offset))
+            if first < len(block_offsets) and block_offsets[first] == offset:
+                last = int(run_ends[np.searchsorted(run_ends, first)])
+                count = last - first + 1
+                offsets.frombytes(block_offsets[first:last + 1].tobytes())
+                numbers.frombytes(np.arange(number + 1, number + count + 1, dtype=np.int64).tobytes())
+                bases.frombytes(np.full(count, base, dtype=np.int64).tobytes())
+                number += count
+                offset = int(block_ends[last])
+                continue
+
+        if block_length < 12 or offset + block_length > size:
+            # Truncated file, e.g. the capture is still running
+            break
+
+        if block_type == EPB_TYPE:
+            number += 1
+            offsets.append(offset)
+            numbers.append(number)
+            bases.append(base)
+        elif block_type == PB_TYPE or block_type == SPB_TYPE:
+            number += 1
+        elif block_type == IDB_TYPE:
+            interfaces.append(_parse_interface(buf, offset, block_length, byteorder))
+
+        offset += block_length
+
+    return (
+        interfaces,
+        byteorder,
+        np.frombuffer(offsets, dtype=np.int64),
+        np.frombuffer(numbers, dtype=np.int64),
+        np.frombuffer(bases, dtype=np.int64),
+    )
+
+
+def timestamps_to_nanoseconds(timestamps: np.ndarray, tsresol: int, tsoffset: int):
+    """
+    Convert packet timestamps in interface units into nanoseconds
+    since epoch.
+
+    Attributes:
+        timestamps:
+            Timestamps, uint64.
+        tsresol:
+            Value of if_tsresol option: negative power of 10 or, if the most
+            significant bit is set, of 2.
+        tsoffset:
+            Value of if_tsoffset option, seconds.
+    """
+    timestamps = timestamps.astype(np.uint64)
+    if tsresol & 0x80:
+        power = tsresol & 0x7F
+        seconds = timestamps >> np.uint64(power)
+        fraction = timestamps & np.uint64((1 << power) - 1)
+        nanos = seconds.astype(np.int64) * 10 ** 9 + np.round(fraction * (1e9 / 2 ** power)).astype(np.int64)
+    elif tsresol <= 9:
+        nanos = timestamps.astype(np.int64) * 10 ** (9 - tsresol)
+    else:
+        nanos = (timestamps // np.uint64(10 ** (tsresol - 9))).astype(np.int64)
+    return nanos + tsoffset * 10 ** 9
+
+
+def _network_layer(data, start, end, linktypes, byteorder):
+    """
+    Find the offsets of the network layer headers and their ethertypes
+    for all the packets, ethertype is 0 for unsupported packets.
+    """
+    ethertypes = np.zeros(len(start), dtype=np.uint32)
+    network = start.copy()
+
+    sel = np.flatnonzero((linktypes == LINKTYPE_ETHERNET) & (end - start >= 14))
+    ethertypes[sel] = _be16(data, start[sel] + 12)
+    network[sel] = start[sel] + 14
+    # 802.1Q tags, up to two of them as in QinQ
+    for _ in range(2):
+        sel = sel[np.isin(ethertypes[sel], ETHERTYPES_VLAN) & (network[sel] + 4 <= end[sel])]
+        ethertypes[sel] = _be16(data, network[sel] + 2)
+        network[sel] += 4
+
+    sel = np.flatnonzero((linktypes == LINKTYPE_LINUX_SLL) & (end - start >= 16))
+    ethertypes[sel] = _be16(data, start[sel] + 14)
+    network[sel] = start[sel] + 16
+
+    sel = np.flatnonzero((linktypes == LINKTYPE_LINUX_SLL2) & (end - start >= 20))
+    ethertypes[sel] = _be16(data, start[sel])
+    network[sel] = start[sel] + 20
+
+    sel = np.flatnonzero(
+        np.isin(linktypes, [LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6])
+        & (end - start >= 1)
+    )
+    version = data[start[sel]] >> 4
+    ethertypes[sel] = np.where(version == 4, ETHERTYPE_IPV4, np.where(version == 6, ETHERTYPE_IPV6, 0))
+
+    sel = np.flatnonzero((linktypes == LINKTYPE_NULL) & (end - start >= 4))
+    # Address family is written in the byte order of the capturing host
+    family = _u32(data, start[sel], byteorder)
+    ethertypes[sel] = np.where(
+        family == AF_INET,
+        ETHERTYPE_IPV4,
+        np.where(np.isin(family, AF_INET6), ETHERTYPE_IPV6, 0)
+    )
+    network[sel] = start[sel] + 4
+
+    return network, ethertypes
+
+
+def _transport_layer(data, end, network, ethertypes):
+    """
+    Find the offsets of UDP headers for all the packets, -1 for non-UDP
+    packets and non-first IPv4 fragments. IPv6 extension headers are not
+    followed.
+    """
+    udp = np.full(len(network), -1, dtype=np.int64)
+
+    sel = np.flatnonzero((ethertypes == ETHERTYPE_IPV4) & (network + 20 <= end))
+    idx = network[sel]
+    ihl = (data[idx] & 0x0F).astype(np.int64) * 4
+    valid = (
+        (data[idx] >> 4 == 4)
+        & (ihl >= 20)
+        & (data[idx + 9] == IPPROTO_UDP)
+        & ((_be16(data, idx + 6) & 0x1FFF) == 0)
+    )
+    udp[sel[valid]] = idx[valid] + ihl[valid]
+
+    sel = np.flatnonzero((ethertypes == ETHERTYPE_IPV6) & (network + 40 <= end))
+    idx = network[sel]
+    valid = (data[idx] >> 4 == 6) & (data[idx + 6] == IPPROTO_UDP)
+    udp[sel[valid]] = idx[valid] + 40
+
+    return udp
+
+
+def _format_addresses(data, idx, versions):
+    """
+    Format IP addresses at the offsets the way tshark does. Packets of
+    a connection carry a few distinct addresses, so only those are
+    formatted.
+    """
+    addresses = np.empty(len(idx), dtype=object)
+    for is_ipv4, size, address_type in ((True, 4, ipaddress.IPv4Address), (False, 16, ipaddress.IPv6Address)):
+        sel = np.flatnonzero((versions == 4) == is_ipv4)
+        if len(sel) == 0:
+            continue
+        raw = np.ascontiguousarray(data[idx[sel, None] + np.arange(size)])
+        distinct, inverse = np.unique(raw.view(f'V{size}').reshape(-1), return_inverse=True)
+        formatted = np.array([str(address_type(address.tobytes())) for address in distinct], dtype=object)
+        addresses[sel] = formatted[inverse.reshape(-1)]
+    return addresses
+
+
+def _optional_field(data, idx, available, offset):
+    """ Gather uint32 field of control information, NaN if truncated. """
+    values = np.full(len(idx), np.nan)
+    present = available >= offset + 4
+    values[present] = _be32(data, idx[present] + offset)
+    return values
+
+
+def _srt_candidates(buf, port: int=None):
+    """
+    Decode link, IP and UDP headers of all the packets in .pcapng file
+    content and find the ones long enough to carry SRT header.
+
+    Return the content as an array of bytes, the indices of the candidate
+    packets among Enhanced Packet Blocks, the offsets of their UDP headers
+    and SRT headers, the lengths of UDP payloads, the offsets of their
+    network headers, the frame numbers and the timestamps, int64
+    nanoseconds since epoch.
+
+    Attributes:
+        buf:
+            Content of .pcapng file, e.g. memory-mapped file.
+        port:
+            UDP port of SRT connection, either source or destination one.
+            If None, any UDP packet is a candidate.
+    """
+    interfaces, byteorder, offsets, numbers, bases = walk_blocks(buf)
+    data = np.frombuffer(buf, dtype=np.uint8)
+
+    # Enhanced Packet Block: type, length, interface id, timestamp (high),
+    # timestamp (low), captured length, original length, packet data
+    interface_ids = bases + _u32(data, offsets + 8, byteorder)
+    if len(interface_ids) > 0 and interface_ids.max() >= len(interfaces):
+        raise Exception('Packet refers to undescribed interface')
+    captured = _u32(data, offsets + 20, byteorder).astype(np.int64)
+    start = offsets + 28
+    end = start + captured
+
+    linktypes = np.array([interface[0] for interface in interfaces], dtype=np.int64)
+    network, ethertypes = _network_layer(
+        data,
+        start,
+        end,
+        linktypes[interface_ids],
+        byteorder
+    )
+    udp = _transport_layer(data, end, network, ethertypes)
+
+    sel = np.flatnonzero((udp >= 0) & (udp + UDP_HEADER_SIZE + SRT_HEADER_SIZE <= end))
+    if port is not None:
+        ports = np.stack([_be16(data, udp[sel]), _be16(data, udp[sel] + 2)])
+        sel = sel[(ports == port).any(axis=0)]
+    payload = udp[sel] + UDP_HEADER_SIZE
+    payload_length = np.minimum(
+        _be16(data, udp[sel] + 4).astype(np.int64) - UDP_HEADER_SIZE,
+        end[sel] - payload
+    )
+    keep = payload_length >= SRT_HEADER_SIZE
+    sel = sel[keep]
+    payload = payload[keep]
+    payload_length = payload_length[keep]
+
+    # Timestamps are converted per interface since they may have
+    # different resolutions
+    timestamps = (
+        (_u32(data, offsets[sel] + 12, byteorder).astype(np.uint64) << np.uint64(32))
+        | _u32(data, offsets[sel] + 16, byteorder).astype(np.uint64)
+    )
+    nanos = np.zeros(len(sel), dtype=np.int64)
+    for interface_id in np.unique(interface_ids[sel]):
+        mask = interface_ids[sel] == interface_id
+        _, tsresol, tsoffset = interfaces[interface_id]
+        nanos[mask] = timestamps_to_nanoseconds(timestamps[mask], tsresol, tsoffset)
+
+    return data, sel, udp[sel], payload, payload_length, network[sel], numbers[sel], nanos
+
+
+def decode_srt_control_packets(buf, port: int=None):
+    """
+    Decode SRT control packets out of .pcapng file content.
+
+    Attributes:
+        buf:
+            Content of .pcapng file, e.g. memory-mapped file.
+        port:
+            UDP port of SRT connection, either source or destination one.
+            If None, any UDP packet looking like SRT control packet is
+            decoded.
+    """
+    return _decode_control_packets(*_srt_candidates(buf, port))
+
+
+def _decode_control_packets(data, sel, udp, payload, payload_length, network, numbers, nanos):
+    """ Decode SRT control packets out of the candidates, see _srt_candidates. """
+    # Classify SRT packets by the first word of the header: the control
+    # flag and the control type
+    first_word = _be32(data, payload)
+    control_types = (first_word >> 16) & 0x7FFF
+    valid = (first_word >> 31 == 1) & np.isin(control_types, SRT_CONTROL_TYPES)
+
+    sel = sel[valid]
+    udp = udp[valid]
+    payload = payload[valid]
+    payload_length = payload_length[valid]
+    network = network[valid]
+    control_types = control_types[valid]
+
+    versions = data[network] >> 4
+    address_length = np.where(versions == 4, 4, 16)
+    source = network + np.where(versions == 4, 12, 8)
+
+    packets = pd.DataFrame({
+        'ws.no': numbers[valid],
+        'frame.time': pd.to_datetime(nanos[valid], unit='ns', utc=True),
+        'ws.source': _format_addresses(data, source, versions),
+        'ws.destination': _format_addresses(data, source + address_length, versions),
+        'udp.srcport': _be16(data, udp).astype(np.int64),
+        'udp.dstport': _be16(data, udp + 2).astype(np.int64),
+        'udp.length': _be16(data, udp + 4).astype(np.int64),
+        'srt.iscontrol': np.ones(len(sel), dtype=np.int64),
+        'srt.type': control_types.astype(np.int64),
+        'srt.ackno': _be32(data, payload + 4).astype(np.int64),
+        'srt.timestamp': _be32(data, payload + 8).astype(np.int64),
+        'srt.id': _be32(data, payload + 12).astype(np.int64),
+    })
+
+    # Decode full fields of UMSG_ACK and UMSG_HANDSHAKE packets only
+    information = payload + SRT_HEADER_SIZE
+    available = payload_length - SRT_HEADER_SIZE
+    for control_type, fields in ((UMSG_ACK, ACK_FIELDS), (UMSG_HANDSHAKE, HANDSHAKE_FIELDS)):
+        mask = control_types == control_type
+        for name, offset in fields:
+            values = np.full(len(sel), np.nan)
+            values[mask] = _optional_field(data, information[mask], available[mask], offset)
+            packets[name] = values
+
+    # Handshake type is a signed value, e.g. -1 for conclusion handshake
+    reqtype = packets['srt.hs.reqtype']
+    packets['srt.hs.reqtype'] = reqtype.where(reqtype < 2 ** 31, reqtype - 2 ** 32)
+
+    return packets
+
+
+def read_srt_control_packets(pcapng_path, port: int=None):
+    """
+    Extract SRT control packets from .pcapng tshark dump file.
+
+    Attributes:
+        pcapng_path:
+            Filepath to .pcapng tshark dump.
+        port:
+            UDP port of SRT connection. If None, any UDP packet looking
+            like SRT control packet is extracted.
+    """
+    path = pathlib.Path(pcapng_path)
+    if path.stat().st_size == 0:
+        raise Exception(f'File {path} is empty')
+    with path.open('rb') as f:
+        # The mapping is released once the arrays viewing it are gone,
+        # closing it explicitly would fail while an exception traceback
+        # still references them
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return decode_srt_control_packets(buf, port)
+
+
+def decode_srt_packet_headers(buf, port: int=None):
+    """
+    Decode SRT headers of both data and control packets out of .pcapng
+    file content. Addresses and control information are not decoded, so
+    that dumps with tens of millions of data packets are decoded quickly.
+
+    The fields not present in the packets of a kind, e.g. srt.seqno of
+    control packets or srt.type of data packets, are -1 rather than
+    missing as in tshark output, so that the columns stay integer.
+
+    Attributes:
+        buf:
+            Content of .pcapng file, e.g. memory-mapped file.
+        port:
+            UDP port of SRT connection, either source or destination one.
+            If None, any UDP packet looking like SRT packet is decoded.
+    """
+    return _decode_packet_headers(*_srt_candidates(buf, port))
+
+
+def _decode_packet_headers(data, sel, udp, payload, payload_length, network, numbers, nanos):
+    """ Decode SRT headers out of the candidates, see _srt_candidates. """
+    first_word = _be32(data, payload)
+    iscontrol = first_word >> 31 == 1
+    control_types = (first_word >> 16) & 0x7FFF
+    valid = ~iscontrol | np.isin(control_types, SRT_CONTROL_TYPES)
+
+    iscontrol = iscontrol[valid]
+    udp = udp[valid]
+    payload = payload[valid]
+    first_word = first_word[valid].astype(np.int64)
+    second_word = _be32(data, payload + 4).astype(np.int64)
+
+    return pd.DataFrame({
+        'ws.no': numbers[valid],
+        'frame.time': pd.to_datetime(nanos[valid], unit='ns', utc=True),
+        'udp.length': _be16(data, udp + 4).astype(np.int64),
+        'srt.iscontrol': iscontrol.astype(np.int64),
+        'srt.type': np.where(iscontrol, control_types[valid].astype(np.int64), -1),
+        'srt.seqno': np.where(iscontrol, -1, first_word & 0x7FFFFFFF),
+        'srt.msgno': np.where(iscontrol, -1, second_word & 0x03FFFFFF),
+        'srt.ackno': np.where(iscontrol, second_word, -1),
+        'srt.timestamp': _be32(data, payload + 8).astype(np.int64),
+        'srt.id': _be32(data, payload + 12).astype(np.int64),
+    })
+
+
+def read_srt_packet_headers(pcapng_path, port: int=None):
+    """
+    Extract SRT headers of both data and control packets from .pcapng
+    tshark dump file.
+
+    Attributes:
+        pcapng_path:
+            Filepath to .pcapng tshark dump.
+        port:
+            UDP port of SRT connection. If None, any UDP packet looking
+            like SRT packet is extracted.
+    """
+    path = pathlib.Path(pcapng_path)
+    if path.stat().st_size == 0:
+        raise Exception(f'File {path} is empty')
+    with path.open('rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return decode_srt_packet_headers(buf, port)
+
+
+def read_srt_packet_headers_and_control_packets(pcapng_path, port: int=None):
+    """
+    Extract both SRT headers of data and control packets and SRT control
+    packets from .pcapng tshark dump file, see read_srt_packet_headers and
+    read_srt_control_packets functions, walking the file once.
+
+    Attributes:
+        pcapng_path:
+            Filepath to .pcapng tshark dump.
+        port:
+            UDP port of SRT connection. If None, any UDP packet looking
+            like SRT packet is extracted.
+    """
+    path = pathlib.Path(pcapng_path)
+    if path.stat().st_size == 0:
+        raise Exception(f'File {path} is empty')
+    with path.open('rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    candidates = _srt_candidates(buf, port)
+    return _decode_packet_headers(*candidates), _decode_control_packets(*candidates)
+
+
+def extract_umsg_ack_packets(srt_packets: pd.DataFrame):
+    """
+    Extract UMSG_ACK packets from SRT control packets.
+
+    Attributes:
+        srt_packets:
+            SRT control packets, the output from read_srt_control_packets
+            function.
+    """
+    return srt_packets[srt_packets['srt.type'] == UMSG_ACK].reset_index(drop=True)
+
+
+def extract_umsg_handshake_packets(srt_packets: pd.DataFrame):
+    """
+    Extract UMSG_HANDSHAKE packets from SRT control packets.
+
+    Attributes:
+        srt_packets:
+            SRT control packets, the output from read_srt_control_packets
+            function.
+    """
+    return srt_packets[srt_packets['srt.type'] == UMSG_HANDSHAKE].reset_index(drop=True)
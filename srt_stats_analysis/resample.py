@@ -0,0 +1,346 @@
+"""
+Module designed to resample aligned SRT statistics and tshark data onto
+a fixed time grid, e.g. 100 ms, 1 s or 10 s, for trend analysis and
+storage of long sessions.
+
+Each column is reduced within a grid interval [start, start + freq)
+according to its rule:
+
+    sum     - the sum of the values, used for per-interval counters,
+              e.g. pktSent_snd or pktRcvLoss_rcv;
+    mean    - the time-weighted mean of the values linearly interpolated
+              between the timepoints, used for the rest of the columns,
+              e.g. msRTT_snd or mbpsBandwidth_rcv;
+    max     - the maximum of the values;
+    min     - the minimum of the values;
+    p<q>    - the q-th percentile of the values, e.g. p95.
+
+The default rules follow the alignment policies from the schema. The
+reduction is done in a streaming manner: only the rows of the grid
+interval not complete yet are kept between chunks, so resampling a long
+session never needs the full-resolution dataframe in memory.
+"""
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.align import timepoints_to_int64
+from srt_stats_analysis.schema import REDISTRIBUTE, SRT_XTRANSMIT_SCHEMA
+
+
+SUM = 'sum'
+MEAN = 'mean'
+MAX = 'max'
+MIN = 'min'
+
+
+def default_rule(column: str):
+    """
+    Return the rule of the aligned column: sum for per-interval counters,
+    time-weighted mean for the rest ones.
+
+    Attributes:
+        column:
+            Name of the aligned column, e.g. pktRecv_rcv or srt.rtt.ms_tshark.
+    """
+    schema = SRT_XTRANSMIT_SCHEMA.get(column.rsplit('_', 1)[0])
+    if schema is not None and schema.policy == REDISTRIBUTE:
+        return SUM
+    return MEAN
+
+
+def parse_percentile(rule: str):
+    """ Return the percentile of p<q> rule as a fraction, None for other rules. """
+    if not rule.startswith('p'):
+        return None
+    try:
+        q = float(rule[1:])
+    except ValueError:
+        return None
+    if not 0 <= q <= 100:
+        raise Exception(f'Percentile should be within [0, 100], got {rule}')
+    return q / 100
+
+
+def resampled_column_name(column: str, rule: str, primary: bool):
+    """
+    The first rule of a column keeps the column name, the other ones
+    add the rule as a suffix, e.g. msRTT_rcv_p95.
+    """
+    return column if primary else f'{column}_{rule}'
+
+
+class StatsResampler:
+    """
+    Streaming resampler of aligned statistics onto a fixed time grid.
+
+    Chunks of aligned statistics are pushed in chronological order,
+    resampled grid intervals are returned as soon as a timepoint after
+    the end of the interval is pushed. The grid is aligned to the Unix
+    epoch, so the chunking and the start of the session do not affect
+    the result.
+
+    Attributes:
+        freq:
+            Grid interval, anything pd.Timedelta accepts, e.g. '1s'.
+        rules:
+            Mapping of the column names to the lists of rules, the first
+            rule gives the resampled column with the same name, the other
+            ones the columns with the rule suffix. The columns missing
+            get the default rule, see default_rule.
+    """
+
+    def __init__(self, freq, rules: dict=None):
+        self.freq = pd.Timedelta(freq)
+        if self.freq <= pd.Timedelta(0):
+            raise Exception(f'Grid interval should be positive, got {freq}')
+        self.rules = dict(rules or {})
+        self._step = self.freq.value
+        self._columns = None
+        self._tz = None
+        # Rows of the grid interval not complete yet and the last row
+        # before them, the left end of the first interpolated segment
+        self._pending = None
+        self._anchor = None
+        self._anchor_time = None
+        # The first grid interval not resampled yet
+        self._next_bin = None
+        self._closed = False
+
+    def push(self, stats: pd.DataFrame):
+        """
+        Add the next chunk of aligned statistics and return the grid
+        intervals completed, None if there are none.
+
+        Attributes:
+            stats:
+                Aligned statistics indexed by increasing timepoints.
+        """
+        if self._closed:
+            raise Exception('The resampler is closed already')
+        if len(stats) == 0:
+            return None
+        if not stats.index.is_monotonic_increasing or stats.index.duplicated().any():
+            raise Exception('Statistics should have unique timepoints in increasing order')
+
+        if self._columns is None:
+            self._columns = list(stats.columns)
+            self._tz = stats.index.tz
+            for column in self._columns:
+                self.rules.setdefault(column, [default_rule(column)])
+            for column, rules in self.rules.items():
+                if column not in self._columns:
+                    raise Exception(f'There is no column {column} to resample')
+                for rule in rules:
+                    if rule not in (SUM, MEAN, MAX, MIN) and parse_percentile(rule) is None:
+                        raise Exception(f'Unknown resampling rule {rule} for column {column}')
+        elif list(stats.columns) != self._columns:
+            raise Exception('Chunks should have the same columns')
+
+        if self._pending is not None:
+            if stats.index[0] <= self._pending.index[-1]:
+                raise Exception('Statistics pushed overlap the previous chunk')
+            stats = pd.concat([self._pending, stats])
+
+        # Grid intervals before the one of the last timepoint are complete,
+        # the first timepoint at or after the cutoff closes the last
+        # interpolated segment
+        times = timepoints_to_int64(stats.index)
+        cutoff = times[-1] // self._step * self._step
+        complete = int(np.searchsorted(times, cutoff, 'left'))
+        if complete == 0:
+            self._pending = stats
+            return None
+
+        resampled = self._reduce(stats, times, complete, cutoff)
+        self._anchor = stats.iloc[complete - 1]
+        self._anchor_time = times[complete - 1]
+        self._pending = stats.iloc[complete:]
+        return resampled
+
+    def close(self):
+        """ Mark the end of statistics and return the rest of grid intervals. """
+        self._closed = True
+        if self._pending is None or len(self._pending) == 0:
+            return None
+        stats = self._pending
+        times = timepoints_to_int64(stats.index)
+        cutoff = times[-1] // self._step * self._step + self._step
+        self._pending = None
+        return self._reduce(stats, times, len(stats), cutoff)
+
+    def _reduce(self, stats, times, complete, cutoff):
+        """
+        Resample the rows before complete position onto grid intervals
+        up to the cutoff.
+        """
+        first_bin = times[0] // self._step if self._next_bin is None else self._next_bin
+        bins = np.arange(first_bin, cutoff // self._step)
+        self._next_bin = cutoff // self._step
+        bin_of_row = times[:complete] // self._step - first_bin
+        # Positions of the first row of each interval, rows are sorted
+        starts = np.searchsorted(bin_of_row, np.arange(len(bins)), 'left')
+        ends = np.searchsorted(bin_of_row, np.arange(len(bins)), 'right')
+
+        # Timepoints of the interpolated signal: the anchor row, the rows,
+        # the first row after the cutoff and the grid boundaries, so that
+        # no segment between consecutive points crosses a boundary
+        if self._anchor is not None:
+            sample_times = np.concatenate([[self._anchor_time], times])
+        else:
+            sample_times = times
+        boundaries = bins * self._step
+        points = np.union1d(sample_times, np.concatenate([boundaries, [cutoff]]))
+        # Segments before the first interval have been resampled already
+        points = points[
+            (points >= max(sample_times[0], boundaries[0]))
+            & (points <= min(cutoff, sample_times[-1]))
+        ]
+        durations = np.diff(points).astype(np.float64)
+        segment_bins = points[:-1] // self._step - first_bin
+
+        data = {}
+        for column in self._columns:
+            values = stats[column].to_numpy(dtype=np.float64)
+            rows = values[:complete]
+            for i, rule in enumerate(self.rules[column]):
+                name = resampled_column_name(column, rule, i == 0)
+                if rule == SUM:
+                    data[name] = self._sum(rows, starts, ends, stats[column].dtype)
+                elif rule == MEAN:
+                    if self._anchor is not None:
+                        samples = np.concatenate([[float(self._anchor[column])], values])
+                    else:
+                        samples = values
+                    data[name] = self._mean(
+                        rows, starts, ends, points, sample_times, samples,
+                        durations, segment_bins, len(bins)
+                    )
+                elif rule in (MAX, MIN):
+                    data[name] = self._extreme(rows, starts, ends, rule)
+                else:
+                    data[name] = self._percentile(rows, starts, ends, parse_percentile(rule))
+
+        index = pd.to_datetime(boundaries)
+        if self._tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self._tz)
+        index.name = stats.index.name
+        return pd.DataFrame(data, index=index)
+
+    @staticmethod
+    def _sum(rows, starts, ends, dtype):
+        """ Sums of the rows per interval, missing values are skipped. """
+        cumulative = np.concatenate([[0.0], np.cumsum(np.nan_to_num(rows))])
+        sums = cumulative[ends] - cumulative[starts]
+        if np.dtype(dtype).kind in 'iu':
+            return np.round(sums).astype(np.int64)
+        return sums
+
+    @staticmethod
+    def _mean(rows, starts, ends, points, sample_times, samples, durations, segment_bins, n_bins):
+        """
+        Time-weighted means of the values linearly interpolated between
+        the timepoints. Intervals not covered by any segment, e.g. the one
+        of the very first row, get the mean of their rows.
+        """
+        valid = ~np.isnan(samples)
+        if not valid.any():
+            return np.full(n_bins, np.nan)
+        # Segments touching a missing value are skipped
+        point_values = np.interp(points, sample_times[valid], samples[valid])
+        missing = np.interp(points, sample_times, (~valid).astype(np.float64)) > 0
+        areas = (point_values[:-1] + point_values[1:]) / 2 * durations
+        weights = durations.copy()
+        skipped = missing[:-1] | missing[1:]
+        areas[skipped] = 0
+        weights[skipped] = 0
+
+        area = np.bincount(segment_bins, areas, n_bins)
+        weight = np.bincount(segment_bins, weights, n_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = area / weight
+            counts = ends - starts
+            cumulative = np.concatenate([[0.0], np.cumsum(np.nan_to_num(rows))])
+            row_counts = np.concatenate([[0], np.cumsum(~np.isnan(rows))])
+            plain = (cumulative[ends] - cumulative[starts]) / (row_counts[ends] - row_counts[starts])
+        uncovered = (weight == 0) & (counts > 0)
+        means[uncovered] = plain[uncovered]
+        return means
+
+    @staticmethod
+    def _extreme(rows, starts, ends, rule):
+        """ Maximum or minimum of the rows per interval, NaN if there are none. """
+        result = np.full(len(starts), np.nan)
+        present = ends > starts
+        if present.any():
+            # Rows of the intervals are contiguous, so each reduction runs
+            # from the start of the interval up to the start of the next
+            # one with rows
+            reduce = np.fmax if rule == MAX else np.fmin
+            result[present] = reduce.reduceat(rows, starts[present])
+        return result
+
+    @staticmethod
+    def _percentile(rows, starts, ends, q):
+        """
+        The q-th quantile of the rows per interval with linear
+        interpolation between the closest ranks, as np.percentile does.
+        """
+        result = np.full(len(starts), np.nan)
+        groups = np.repeat(np.arange(len(starts)), ends - starts)
+        # NaN goes to the end of each group
+        order = np.lexsort((rows, groups))
+        ordered = rows[order]
+        counts = np.bincount(groups[~np.isnan(rows)], minlength=len(starts))
+        present = counts > 0
+        position = (counts[present] - 1) * q
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        base = starts[present]
+        fraction = position - lower
+        result[present] = (
+            ordered[base + lower] * (1 - fraction) + ordered[base + upper] * fraction
+        )
+        return result
+
+
+def iter_resample_stats(chunks, freq, rules: dict=None):
+    """
+    Resample chunks of aligned statistics onto a fixed time grid and
+    yield resampled grid intervals as soon as they are complete, e.g.
+    the output of streaming.iter_align_srt_stats.
+
+    Attributes:
+        chunks:
+            Iterable of aligned statistics in chronological order.
+        freq:
+            Grid interval, anything pd.Timedelta accepts, e.g. '1s'.
+        rules:
+            Resampling rules per column, see StatsResampler.
+    """
+    resampler = StatsResampler(freq, rules)
+    for chunk in chunks:
+        resampled = resampler.push(chunk)
+        if resampled is not None and len(resampled) > 0:
+            yield resampled
+    resampled = resampler.close()
+    if resampled is not None and len(resampled) > 0:
+        yield resampled
+
+
+def resample_stats(stats: pd.DataFrame, freq, rules: dict=None):
+    """
+    Resample aligned statistics onto a fixed time grid.
+
+    Attributes:
+        stats:
+            Aligned statistics, e.g. the output from
+            join_stats.align_srt_stats or join_stats.align_srt_tshark_stats.
+        freq:
+            Grid interval, anything pd.Timedelta accepts, e.g. '1s'.
+        rules:
+            Resampling rules per column, see StatsResampler.
+    """
+    resampled = list(iter_resample_stats([stats], freq, rules))
+    if not resampled:
+        return stats.iloc[:0]
+    return pd.concat(resampled) if len(resampled) > 1 else resampled[0]
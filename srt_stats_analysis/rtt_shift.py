@@ -0,0 +1,150 @@
+"""
+Module designed to shift the timeline of receiver statistics by RTT/2
+before joining them with sender statistics, see docs/notes.md.
+
+Receiver statistics describe the packets the sender has sent about
+a one-way delay, i.e. RTT/2 assuming symmetric networks, before the
+receiver timepoint, so receiver timepoints are moved back by RTT/2.
+RTT is taken from one of the following sources:
+
+- a constant, e.g. the initial RTT or the one estimated out of tshark
+  dumps for short sessions with stable RTT;
+- msRTT column of the receiver statistics, per row;
+- RTT reported in UMSG_ACK packets captured at the receiver side,
+  srt.rtt, the last one reported at or before each receiver timepoint.
+
+The shift is computed and applied for all the rows at once with numpy.
+RTT varying between rows may move a row before the previous one, while
+the statistics are collected in order. Such rows are moved up to
+the previous row instead, so the order of the rows is kept.
+"""
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.align import sort_by_time
+from srt_stats_analysis.instrumentation import stage
+
+
+# Column of SRT statistics with RTT estimated by SRT
+RTT_COLUMN = 'msRTT'
+
+# Sources of RTT the receiver timeline can be shifted by
+CONSTANT = 'constant'
+STATS = 'stats'
+TSHARK = 'tshark'
+RTT_SOURCES = [CONSTANT, STATS, TSHARK]
+
+
+def ack_rtt(umsg_ack_packets: pd.DataFrame):
+    """
+    Return RTT reported in UMSG_ACK packets, milliseconds, indexed by
+    the times the packets were captured at, timezone-naive UTC+0.
+
+    Attributes:
+        umsg_ack_packets:
+            UMSG_ACK packets extracted from tshark dump, e.g.
+            capture.Capture.umsg_ack_packets.
+    """
+    index = pd.DatetimeIndex(umsg_ack_packets['frame.time'])
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    rtt = pd.Series(
+        umsg_ack_packets['srt.rtt'].to_numpy(dtype=np.float64) / 1000,
+        index=index,
+        name='srt.rtt.ms'
+    )
+    return sort_by_time(rtt)
+
+
+def _fill_missing(values: np.ndarray):
+    """ Fill missing values forward, the leading ones backward, in place. """
+    is_missing = np.isnan(values)
+    missing = np.flatnonzero(is_missing)
+    if len(missing) == 0:
+        return values
+    if len(missing) == len(values):
+        raise Exception('There are no RTT values to shift the timeline by')
+    # Only the missing values are visited: each of them takes the value
+    # before the run of missing values it belongs to
+    run_starts = np.concatenate([[True], np.diff(missing) != 1])
+    runs = np.maximum.accumulate(np.where(run_starts, np.arange(len(missing)), 0))
+    sources = missing[runs] - 1
+    # Leading missing values take the first value present
+    sources[sources < 0] = np.argmin(is_missing)
+    values[missing] = values[sources]
+    return values
+
+
+def rtt_at(rtt: pd.Series, timepoints: pd.DatetimeIndex):
+    """
+    Return the last RTT value at or before each timepoint, the first
+    value for the timepoints before it, milliseconds.
+
+    Attributes:
+        rtt:
+            RTT values, milliseconds, indexed by timepoints.
+        timepoints:
+            Timepoints to look RTT up at.
+    """
+    rtt = sort_by_time(rtt.dropna())
+    if len(rtt) == 0:
+        raise Exception('There are no RTT values to shift the timeline by')
+    positions = np.searchsorted(rtt.index.asi8, pd.DatetimeIndex(timepoints).asi8, 'right') - 1
+    return rtt.to_numpy(dtype=np.float64)[np.maximum(positions, 0)]
+
+
+def rtt_shifts(stats: pd.DataFrame, rtt):
+    """
+    Return RTT/2 at each row of the statistics, int64 nanoseconds.
+
+    Attributes:
+        stats:
+            SRT statistics indexed by timepoints.
+        rtt:
+            RTT, milliseconds: a number for a constant shift, the name
+            of the column with RTT of each row, e.g. msRTT, or a series
+            indexed by timepoints to look RTT up in, e.g. the output from
+            ack_rtt function.
+    """
+    if isinstance(rtt, str):
+        values = _fill_missing(stats[rtt].to_numpy(dtype=np.float64, copy=True))
+    elif isinstance(rtt, pd.Series):
+        values = rtt_at(rtt, stats.index)
+    else:
+        return np.full(len(stats), round(float(rtt) * 1000000 / 2), dtype=np.int64)
+    # Milliseconds into nanoseconds and halved, without temporary arrays
+    np.multiply(values, 1000000 / 2, out=values)
+    np.rint(values, out=values)
+    return values.astype(np.int64)
+
+
+def shift_by_rtt(stats: pd.DataFrame, rtt):
+    """
+    Return the statistics with the timepoints moved back by RTT/2,
+    the rows are kept in the order of the original timepoints.
+
+    Attributes:
+        stats:
+            SRT statistics collected at the receiver side, indexed by
+            timepoints.
+        rtt:
+            RTT, milliseconds: a number, the name of the column with RTT
+            of each row or a series indexed by timepoints in the same
+            clock as the statistics, see rtt_shifts function.
+    """
+    with stage('rtt shift', len(stats)) as measured:
+        stats = sort_by_time(stats)
+        shifted = rtt_shifts(stats, rtt)
+        np.subtract(stats.index.asi8, shifted, out=shifted)
+        # Rows moved before the previous one are moved up to it, the running
+        # maximum is the slowest operation here, so it is skipped when
+        # nothing is reordered
+        if (shifted[1:] < shifted[:-1]).any():
+            np.maximum.accumulate(shifted, out=shifted)
+        stats = stats.copy(deep=False)
+        index = pd.DatetimeIndex(shifted.view('M8[ns]'), name=stats.index.name)
+        if stats.index.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(stats.index.tz)
+        stats.index = index
+        measured.rows_out = len(stats)
+    return stats
@@ -0,0 +1,274 @@
+"""
+Module designed to run the steps of a pipeline as a small dependency
+graph with asyncio: each step starts as soon as the steps it depends on
+are done, so independent steps overlap and the wall time of the pipeline
+is its critical path rather than the sum of the steps.
+
+A step is run in one of the following ways:
+
+- ASYNC: coroutine function awaited in the event loop, e.g. a tshark
+  conversion run in a subprocess;
+- PROCESS: function run in a worker process, e.g. parsing of a file,
+  its arguments and result should be picklable;
+- THREAD: function run in a worker thread, e.g. a merge of dataframes
+  already in memory, numpy and pandas release GIL in heavy operations.
+
+The results of the steps a step depends on are passed to its function
+as positional arguments in the order of the dependencies.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import time
+import typing
+
+import pandas as pd
+
+from srt_stats_analysis.instrumentation import Recorder, current_recorder, record_stage, recording, stage
+
+
+ASYNC = 'async'
+PROCESS = 'process'
+THREAD = 'thread'
+KINDS = [ASYNC, PROCESS, THREAD]
+
+
+class Step(typing.NamedTuple):
+    """ Step of the pipeline. """
+    name: str
+    func: typing.Callable
+    deps: tuple = ()
+    kind: str = THREAD
+
+
+class StepRun(typing.NamedTuple):
+    """ Times a step has started and finished at, seconds since the run started. """
+    name: str
+    kind: str
+    start_s: float
+    end_s: float
+
+
+def sort_steps(steps: list):
+    """
+    Return the steps sorted so that each step follows the steps it
+    depends on.
+
+    Attributes:
+        steps:
+            Steps of the pipeline.
+    """
+    by_name = {}
+    for step in steps:
+        if step.name in by_name:
+            raise Exception(f'Step {step.name} is defined twice')
+        if step.kind not in KINDS:
+            raise Exception(f'Unknown kind {step.kind} of step {step.name}')
+        by_name[step.name] = step
+
+    ordered = []
+    # Steps being visited, to detect cycles, and visited ones
+    visiting = set()
+    visited = set()
+
+    def visit(step):
+        if step.name in visited:
+            return
+        if step.name in visiting:
+            raise Exception(f'Step {step.name} depends on itself through a cycle of steps')
+        visiting.add(step.name)
+        for dep in step.deps:
+            if dep not in by_name:
+                raise Exception(f'Step {step.name} depends on unknown step {dep}')
+            visit(by_name[dep])
+        visiting.remove(step.name)
+        visited.add(step.name)
+        ordered.append(step)
+
+    for step in steps:
+        visit(step)
+    return ordered
+
+
+def _run_in_thread(name, func, *args):
+    """
+    Run step function in a worker thread as a stage of the pipeline.
+    Return the result and the times the step has started and finished
+    at, so that the time the step waits for a free thread is not counted.
+    """
+    started = time.perf_counter()
+    with stage(name):
+        result = func(*args)
+    return result, started, time.perf_counter()
+
+
+def _run_in_process(name, recorder_settings, func, *args):
+    """
+    Run step function in a worker process as a stage of the pipeline.
+    Return the result, the times the step has started and finished at and
+    the stages recorded in the worker, none if recorder_settings is None.
+    """
+    started = time.perf_counter()
+    if recorder_settings is None:
+        result = func(*args)
+        return result, started, time.perf_counter(), []
+    recorder = Recorder(*recorder_settings)
+    with recording(recorder):
+        with stage(name):
+            result = func(*args)
+    return result, started, time.perf_counter(), recorder.stages
+
+
+async def _run_concurrently(steps: list, jobs: int=None):
+    loop = asyncio.get_running_loop()
+    origin = time.perf_counter()
+    runs = []
+    tasks = {}
+    recorder = current_recorder()
+    recorder_settings = None if recorder is None else recorder.settings
+
+    kinds = {step.kind for step in steps}
+    processes = concurrent.futures.ProcessPoolExecutor(jobs) if PROCESS in kinds else None
+    threads = concurrent.futures.ThreadPoolExecutor(jobs) if THREAD in kinds else None
+
+    async def run(step):
+        args = [await tasks[dep] for dep in step.deps]
+        if step.kind == ASYNC:
+            started = time.perf_counter()
+            result = await step.func(*args)
+            finished = time.perf_counter()
+            record_stage(step.name, started, finished - started)
+        elif step.kind == PROCESS:
+            # Stages run in worker processes, nested ones included, are
+            # recorded by the workers and merged here
+            result, started, finished, stages = await loop.run_in_executor(
+                processes,
+                functools.partial(_run_in_process, step.name, recorder_settings, step.func, *args)
+            )
+            if recorder is not None:
+                recorder.merge(stages)
+        else:
+            # Stages run in threads are recorded by the threads themselves
+            result, started, finished = await loop.run_in_executor(
+                threads,
+                functools.partial(_run_in_thread, step.name, step.func, *args)
+            )
+        runs.append(StepRun(step.name, step.kind, started - origin, finished - origin))
+        return result
+
+    try:
+        for step in steps:
+            tasks[step.name] = asyncio.ensure_future(run(step))
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    finally:
+        for executor in (processes, threads):
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    return {name: task.result() for name, task in tasks.items()}, runs
+
+
+def _run_sequentially(steps: list, loop: asyncio.AbstractEventLoop):
+    origin = time.perf_counter()
+    runs = []
+    results = {}
+    for step in steps:
+        args = [results[dep] for dep in step.deps]
+        started = time.perf_counter()
+        with stage(step.name):
+            if step.kind == ASYNC:
+                results[step.name] = loop.run_until_complete(step.func(*args))
+            else:
+                results[step.name] = step.func(*args)
+        runs.append(StepRun(step.name, step.kind, started - origin, time.perf_counter() - origin))
+    return results, runs
+
+
+def run_steps(steps: list, jobs: int=None):
+    """
+    Run the steps of the pipeline, each as soon as the steps it depends on
+    are done. Return the results of the steps by their names and the times
+    the steps have run at.
+
+    If a step fails, the steps not started yet are cancelled and
+    the exception is raised once the running ones are finished.
+
+    Attributes:
+        steps:
+            Steps of the pipeline.
+        jobs:
+            Maximum number of worker processes and of worker threads.
+            If None, as many as there are CPUs, if 1, the steps are run
+            one after another in the current process.
+    """
+    steps = sort_steps(steps)
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        if jobs == 1:
+            return _run_sequentially(steps, loop)
+        return loop.run_until_complete(_run_concurrently(steps, jobs))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def critical_path(steps: list, runs: list):
+    """
+    Return the names of the steps on the longest chain of dependent steps
+    by their durations and the duration of the chain, seconds.
+
+    Attributes:
+        steps:
+            Steps of the pipeline.
+        runs:
+            Times the steps have run at, the output from run_steps function.
+    """
+    durations = {run.name: run.end_s - run.start_s for run in runs}
+    finish = {}
+    previous = {}
+    for step in sort_steps(steps):
+        ready = 0
+        for dep in step.deps:
+            if finish[dep] > ready:
+                ready = finish[dep]
+                previous[step.name] = dep
+        finish[step.name] = ready + durations.get(step.name, 0)
+
+    if not finish:
+        return [], 0
+    name = max(finish, key=finish.get)
+    length = finish[name]
+    path = [name]
+    while name in previous:
+        name = previous[name]
+        path.append(name)
+    return path[::-1], length
+
+
+def format_runs(steps: list, runs: list):
+    """
+    Return the times the steps have run at as a human-readable table
+    followed by the wall time, the sum of the steps and the critical path.
+
+    Attributes:
+        steps:
+            Steps of the pipeline.
+        runs:
+            Times the steps have run at, the output from run_steps function.
+    """
+    if not runs:
+        return 'No steps run'
+    table = pd.DataFrame(runs, columns=StepRun._fields).sort_values('start_s')
+    table['wall_s'] = table['end_s'] - table['start_s']
+    path, length = critical_path(steps, runs)
+    return (
+        table.round(3).to_string(index=False)
+        + f"\n\nWall: {table['end_s'].max():.3f} s, sum of steps: {table['wall_s'].sum():.3f} s, "
+        f"critical path: {length:.3f} s ({' -> '.join(path)})"
+    )
@@ -0,0 +1,148 @@
+"""
+Module with the schema of SRT core statistics .csv files written by
+srt-xtransmit: the type of each column and the way it is aligned.
+
+The types follow the types of the fields of SRT CBytePerfMon structure
+the statistics are taken from: packet counters, windows, buffer sizes and
+delays are int (int32), byte counters are uint64_t (read as int64) and
+rates are double. pd.read_csv wraps values not fitting into the integer
+type silently, so only the columns which are int in SRT are read as int32.
+
+Rates are kept as float64: interpolated values are rounded to 2 decimals
+and float32 shifts the rounding of about 3% of the values written with
+3 decimals. The only float32 column is mbpsMaxBW, the configured limit.
+"""
+import typing
+
+import numpy as np
+
+
+# Alignment policies, i.e. the way the values of a column are brought
+# onto the timepoints of the other side
+# Linear interpolation, the result is rounded to 2 decimals
+INTERPOLATE = 'interpolate'
+# Linear interpolation, the result is truncated back to integers
+INTERPOLATE_INT = 'interpolate-int'
+# Per-interval counters, the number of events since the previous
+# timepoint, are redistributed proportionally to the overlap of
+# the intervals, see align.redistribute_onto
+REDISTRIBUTE = 'redistribute'
+# The column identifies the statistics rather than measures something,
+# it is not aligned
+NOT_ALIGNED = 'not-aligned'
+
+
+class Column(typing.NamedTuple):
+    """ Column of srt-xtransmit .csv statistics. """
+    name: str
+    dtype: str
+    policy: str
+    description: str
+
+
+SRT_XTRANSMIT_COLUMNS = [
+    Column('Timepoint', 'object', NOT_ALIGNED, 'Absolute time of collecting the statistics'),
+    Column('Time', 'int64', NOT_ALIGNED, 'Time since the socket has been created, ms'),
+    Column('SocketID', 'int32', NOT_ALIGNED, 'SRT socket ID'),
+    Column('pktFlowWindow', 'int32', INTERPOLATE_INT, 'Flow window size, packets'),
+    Column('pktCongestionWindow', 'int32', INTERPOLATE_INT, 'Congestion window size, packets'),
+    Column('pktFlightSize', 'int32', INTERPOLATE_INT, 'Number of packets on flight'),
+    Column('msRTT', 'float64', INTERPOLATE, 'Smoothed round trip time, ms'),
+    Column('mbpsBandwidth', 'float64', INTERPOLATE, 'Estimated link bandwidth, Mbps'),
+    Column('mbpsMaxBW', 'float32', INTERPOLATE, 'Maximum bandwidth to be used, Mbps'),
+    Column('pktSent', 'int32', REDISTRIBUTE, 'Number of sent data packets, including retransmissions'),
+    Column('pktSndLoss', 'int32', REDISTRIBUTE, 'Number of lost packets, sender side'),
+    Column('pktSndDrop', 'int32', REDISTRIBUTE, 'Number of too-late-to-send dropped packets'),
+    Column('pktRetrans', 'int32', REDISTRIBUTE, 'Number of retransmitted packets'),
+    Column('byteSent', 'int64', REDISTRIBUTE, 'Number of sent data bytes, including retransmissions'),
+    Column('byteAvailSndBuf', 'int32', INTERPOLATE_INT, 'Available sender buffer size, bytes'),
+    Column('byteSndDrop', 'int64', REDISTRIBUTE, 'Number of too-late-to-send dropped bytes'),
+    Column('mbpsSendRate', 'float64', INTERPOLATE, 'Sending rate, Mbps'),
+    Column('usPktSndPeriod', 'float64', INTERPOLATE, 'Packet sending period, us'),
+    Column('pktRecv', 'int32', REDISTRIBUTE, 'Number of received packets'),
+    Column('pktRcvLoss', 'int32', REDISTRIBUTE, 'Number of lost packets, receiver side'),
+    Column('pktRcvDrop', 'int32', REDISTRIBUTE, 'Number of too-late-to-play missing packets'),
+    Column('pktRcvRetrans', 'int32', REDISTRIBUTE, 'Number of retransmitted packets received'),
+    Column('pktRcvBelated', 'int32', REDISTRIBUTE, 'Number of received and ignored packets due to having come too late'),
+    Column('byteRecv', 'int64', REDISTRIBUTE, 'Number of received bytes'),
+    Column('byteAvailRcvBuf', 'int32', INTERPOLATE_INT, 'Available receiver buffer size, bytes'),
+    Column('byteRcvLoss', 'int64', REDISTRIBUTE, 'Number of retransmitted bytes lost, receiver side'),
+    Column('byteRcvDrop', 'int64', REDISTRIBUTE, 'Number of too-late-to-play missing bytes'),
+    Column('mbpsRecvRate', 'float64', INTERPOLATE, 'Receiving rate, Mbps'),
+    Column('msRcvTsbPdDelay', 'int32', INTERPOLATE_INT, 'Timestamp-based packet delivery delay, receiver side, ms'),
+    # The header of srt-xtransmit statistics has msRcvTsbPdDelay twice,
+    # pd.read_csv renames the second one
+    Column('msRcvTsbPdDelay.1', 'int32', INTERPOLATE_INT, 'Timestamp-based packet delivery delay, sender side, ms'),
+]
+
+SRT_XTRANSMIT_SCHEMA = {column.name: column for column in SRT_XTRANSMIT_COLUMNS}
+
+
+def get_column(name: str):
+    """ Return the schema of the column, raise if the column is unknown. """
+    try:
+        return SRT_XTRANSMIT_SCHEMA[name]
+    except KeyError:
+        raise Exception(f'Unknown SRT statistics column {name}') from None
+
+
+def get_dtypes(columns: list, integer_na: bool=False):
+    """
+    Return the mapping of the column names to the dtypes to use
+    with pd.read_csv.
+
+    Attributes:
+        columns:
+            Names of the columns.
+        integer_na:
+            If True, integer columns are read as float64 so that they may
+            have missing values.
+    """
+    dtypes = {}
+    for name in columns:
+        dtype = np.dtype(get_column(name).dtype)
+        if integer_na and dtype.kind in 'iu':
+            dtype = np.dtype('float64')
+        dtypes[name] = dtype
+    return dtypes
+
+
+def read_csv_arguments(columns: list=None, integer_na: bool=False):
+    """
+    Return the arguments of pd.read_csv to load SRT statistics indexed
+    by Timepoint column: the columns to parse and their dtypes.
+
+    Attributes:
+        columns:
+            Names of the columns to load. If None, all the columns are
+            loaded, the ones missing in the schema with the default dtypes.
+        integer_na:
+            If True, integer columns are read as float64 so that they may
+            have missing values.
+    """
+    if columns is None:
+        return {
+            'index_col': 'Timepoint',
+            'dtype': get_dtypes(
+                [name for name in SRT_XTRANSMIT_SCHEMA if name != 'Timepoint'],
+                integer_na
+            ),
+        }
+    return {
+        'index_col': 'Timepoint',
+        'usecols': ['Timepoint'] + list(columns),
+        'dtype': get_dtypes(columns, integer_na),
+    }
+
+
+def get_policy(name: str):
+    """
+    Return the alignment policy of the column. Suffixes added to
+    the column names when aligning, e.g. _snd and _rcv, are ignored.
+
+    Attributes:
+        name:
+            Name of the column, possibly with a suffix.
+    """
+    base = name.rsplit('_', 1)[0] if name not in SRT_XTRANSMIT_SCHEMA else name
+    return get_column(base).policy
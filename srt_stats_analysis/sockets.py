@@ -0,0 +1,281 @@
+"""
+Module designed to align SRT core statistics of several SRT sockets
+written in the same .csv files, e.g. the members of a bonded group or
+multiple streams sent at once.
+
+Both files are loaded once and partitioned by SocketID column. Sender
+sockets are paired with receiver ones by the mapping given, by
+the handshakes captured in a tshark dump or, if the numbers of sockets
+match, in the order the sockets appear in the files. Each pair is then
+aligned independently in a worker process.
+"""
+import argparse
+import concurrent.futures
+import os
+
+import pandas as pd
+
+from srt_stats_analysis.cache import Cache
+from srt_stats_analysis.capture import as_capture
+from srt_stats_analysis.clocks import ClockModel, correct_clock
+from srt_stats_analysis.instrumentation import print_frame, set_verbose, stage
+from srt_stats_analysis.join_stats import (
+    RCV_FEATURES,
+    SND_FEATURES,
+    add_cache_arguments,
+    align_prepared_srt_stats,
+    cache_from_arguments,
+    prepare_srt_stats,
+    read_srt_stats,
+)
+
+
+def read_srt_stats_by_socket(stats_path: str, cache: Cache=None, features: list=None):
+    """
+    Load SRT statistics of several sockets out of .csv file and return
+    the statistics of each socket prepared with prepare_srt_stats, keyed
+    by SocketID in the order the sockets appear in the file.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        cache:
+            Cache of parsed datasets. If None, the file is always parsed.
+        features:
+            SRT statistics features to extract.
+    """
+    stats = read_srt_stats(stats_path, cache, ['SocketID'] + features)
+    stats = prepare_srt_stats(stats, ['SocketID'] + features)
+    with stage('socket split', len(stats)):
+        return {
+            int(socket_id): group.drop(columns='SocketID')
+            for socket_id, group in stats.groupby('SocketID', sort=False)
+        }
+
+
+def socket_pairs_from_handshakes(umsg_handshake_packets: pd.DataFrame):
+    """
+    Return the pairs of sockets connected to each other according to
+    UMSG_HANDSHAKE packets: the socket the packet is sent to and the one
+    it is sent from. Packets sent to socket 0, i.e. handshake requests
+    to the listener, do not identify the peer and are skipped.
+
+    Attributes:
+        umsg_handshake_packets:
+            UMSG_HANDSHAKE packets extracted from tshark dump.
+    """
+    packets = umsg_handshake_packets[
+        (umsg_handshake_packets['srt.id'] != 0)
+        & umsg_handshake_packets['srt.hs.id'].notna()
+    ]
+    return set(zip(packets['srt.id'].astype(int), packets['srt.hs.id'].astype(int)))
+
+
+def pair_sockets(
+    snd_sockets: list,
+    rcv_sockets: list,
+    mapping: dict=None,
+    connected: set=None
+):
+    """
+    Pair sender sockets with receiver ones, return the mapping of
+    sender SocketIDs to receiver ones.
+
+    Attributes:
+        snd_sockets:
+            SocketIDs found in sender statistics in the order they appear.
+        rcv_sockets:
+            SocketIDs found in receiver statistics in the order they appear.
+        mapping:
+            Mapping of sender SocketIDs to receiver ones. If set,
+            the sockets are paired by the mapping.
+        connected:
+            Pairs of sockets connected to each other, the output from
+            socket_pairs_from_handshakes function. If set and mapping
+            is not, the sockets are paired by the handshakes.
+    """
+    if mapping is not None:
+        for snd_socket, rcv_socket in mapping.items():
+            if snd_socket not in snd_sockets:
+                raise Exception(f'Socket {snd_socket} is not found in sender statistics')
+            if rcv_socket not in rcv_sockets:
+                raise Exception(f'Socket {rcv_socket} is not found in receiver statistics')
+        return dict(mapping)
+
+    if connected is not None:
+        pairs = {}
+        for snd_socket in snd_sockets:
+            peers = [
+                rcv_socket for rcv_socket in rcv_sockets
+                if (snd_socket, rcv_socket) in connected or (rcv_socket, snd_socket) in connected
+            ]
+            if len(peers) == 1:
+                pairs[snd_socket] = peers[0]
+        if not pairs:
+            raise Exception('No sender and receiver sockets are connected according to handshakes')
+        return pairs
+
+    if len(snd_sockets) != len(rcv_sockets):
+        raise Exception(
+            f'{len(snd_sockets)} sender and {len(rcv_sockets)} receiver sockets '
+            'can not be paired without mapping or handshakes'
+        )
+    return dict(zip(snd_sockets, rcv_sockets))
+
+
+def align_socket_pair(snd_stats: pd.DataFrame, rcv_stats: pd.DataFrame, rcv_clock: ClockModel=None):
+    """
+    Align SRT statistics of a sender socket and a receiver one.
+
+    Attributes:
+        snd_stats:
+            SRT statistics of the sender socket.
+        rcv_stats:
+            SRT statistics of the receiver socket.
+        rcv_clock:
+            Receiver clock against the sender one. If set, receiver
+            timepoints are converted into the sender clock.
+    """
+    if rcv_clock is not None:
+        rcv_stats = correct_clock(rcv_stats, rcv_clock)
+    return align_prepared_srt_stats(snd_stats, rcv_stats)
+
+
+def align_srt_stats_by_socket(
+    snd_stats_path: str,
+    rcv_stats_path: str,
+    cache: Cache=None,
+    snd_features: list=SND_FEATURES,
+    rcv_features: list=RCV_FEATURES,
+    mapping: dict=None,
+    capture=None,
+    rcv_clock: ClockModel=None,
+    jobs: int=None
+):
+    """
+    Align SRT core statistics of several sockets obtained from receiver
+    and sender. Return aligned statistics of all the socket pairs indexed
+    by sender and receiver SocketIDs and Timepoint.
+
+    Attributes:
+        snd_stats_path:
+            Filepath to .csv statistics collected at the sender side.
+        rcv_stats_path:
+            Filepath to .csv statistics collected at the receiver side.
+        cache:
+            Cache of parsed datasets. If None, the files are always parsed.
+        snd_features:
+            SRT statistics features to align from the sender side.
+        rcv_features:
+            SRT statistics features to align from the receiver side.
+        mapping:
+            Mapping of sender SocketIDs to receiver ones. If None,
+            the sockets are paired by handshakes captured in capture or,
+            if it is None as well, in the order they appear in the files.
+        capture:
+            Capture session or filepath to .csv tshark data or .pcapng
+            tshark dump collected at either side.
+        rcv_clock:
+            Receiver clock against the sender one. If set, receiver
+            timepoints are converted into the sender clock.
+        jobs:
+            Maximum number of socket pairs aligned in parallel. If None,
+            as many as there are CPUs, if 1, one after another in
+            the current process.
+    """
+    snd_stats = read_srt_stats_by_socket(snd_stats_path, cache, snd_features)
+    rcv_stats = read_srt_stats_by_socket(rcv_stats_path, cache, rcv_features)
+
+    connected = None
+    if mapping is None and capture is not None:
+        connected = socket_pairs_from_handshakes(as_capture(capture, cache).umsg_handshake_packets)
+    pairs = pair_sockets(list(snd_stats), list(rcv_stats), mapping, connected)
+
+    print('\nSocket pairs (sender, receiver):')
+    for snd_socket, rcv_socket in pairs.items():
+        print(f'{snd_socket} {rcv_socket}')
+    unpaired = [socket for socket in snd_stats if socket not in pairs]
+    unpaired += [socket for socket in rcv_stats if socket not in pairs.values()]
+    if unpaired:
+        print(f'\nSockets left unpaired: {unpaired}')
+    if not pairs:
+        raise Exception('There are no pairs of sender and receiver sockets to align')
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(pairs))
+
+    args = (
+        [snd_stats[socket] for socket in pairs],
+        [rcv_stats[socket] for socket in pairs.values()],
+        [rcv_clock] * len(pairs)
+    )
+    with stage('socket alignment', sum(len(snd_stats[socket]) for socket in pairs)) as measured:
+        if jobs <= 1:
+            aligned = list(map(align_socket_pair, *args))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                aligned = list(executor.map(align_socket_pair, *args))
+        stats = pd.concat(aligned, keys=list(pairs.items()), names=['SocketID_snd', 'SocketID_rcv'])
+        measured.rows_out = len(stats)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Align SRT core statistics of several sockets obtained '
+        'from receiver and sender.'
+    )
+    parser.add_argument('snd_stats_path', help='Sender .csv statistics')
+    parser.add_argument('rcv_stats_path', help='Receiver .csv statistics')
+    parser.add_argument(
+        '--pair',
+        action='append',
+        metavar='SND:RCV',
+        help='Pair of sender and receiver SocketIDs, may be repeated'
+    )
+    parser.add_argument(
+        '--capture',
+        help='tshark dump collected at either side to pair the sockets '
+        'by handshakes'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='Maximum number of socket pairs aligned in parallel, '
+        'by default as many as there are CPUs'
+    )
+    parser.add_argument('--output', help='.csv file to save aligned statistics in')
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Do not print intermediate dataframes'
+    )
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    set_verbose(not args.quiet)
+
+    mapping = None
+    if args.pair:
+        mapping = {}
+        for pair in args.pair:
+            snd_socket, rcv_socket = pair.split(':')
+            mapping[int(snd_socket)] = int(rcv_socket)
+
+    stats = align_srt_stats_by_socket(
+        args.snd_stats_path,
+        args.rcv_stats_path,
+        cache_from_arguments(args),
+        mapping=mapping,
+        capture=args.capture,
+        jobs=args.jobs
+    )
+    print_frame('Aligned SRT statistics of socket pairs', stats)
+
+    if args.output is not None:
+        stats.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
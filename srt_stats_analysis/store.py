@@ -0,0 +1,191 @@
+"""
+Module designed to save aligned SRT statistics and tshark data in a
+binary format which can be queried by time range without loading the
+whole dataset, so that downstream tools do not have to run the pipeline
+again to get the results.
+
+A store is a directory with one .npy file per column, fixed-width values
+only, the timepoints as a sorted int64 index.npy (nanoseconds since
+the epoch, UTC for timezone-aware timepoints) and a small meta.json
+header. The files are memory-mapped when opened: a time range is found
+by binary search over the index and returned as views of the mapped
+files, so only the pages within the range are read from disk.
+"""
+import json
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.npy'
+
+# Version of the store layout, bump it when the layout changes
+LAYOUT_VERSION = 1
+
+
+def _fixed_width(values: pd.Series):
+    """ Return column values as numpy array of fixed-width dtype. """
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufcmMSU':
+        return values.to_numpy()
+    array = values.to_numpy(dtype=object)
+    if all(isinstance(value, str) for value in array):
+        return array.astype(str)
+    raise Exception(f'Column {values.name} of dtype {values.dtype} has no fixed-width representation')
+
+
+def save_results(df: pd.DataFrame, directory, overwrite: bool=False):
+    """
+    Save aligned results in the store directory. The rows are sorted by
+    timepoints if they are not sorted yet.
+
+    Attributes:
+        df:
+            Aligned SRT statistics or SRT statistics and tshark data
+            indexed by timepoints.
+        directory:
+            Directory of the store, it is created.
+        overwrite:
+            If True, an existing store in the directory is replaced.
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise Exception(f'Results should be indexed by timepoints, got {type(df.index).__name__}')
+    directory = pathlib.Path(directory)
+    if directory.exists() and not overwrite:
+        raise Exception(f'Store {directory} already exists')
+
+    if not df.index.is_monotonic_increasing:
+        df = df.iloc[np.argsort(df.index.asi8, kind='stable')]
+
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix=f'.{directory.name}-', dir=directory.parent))
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            values = _fixed_width(df.iloc[:, i])
+            np.save(tmp / f'{i}.npy', values)
+            columns.append({'name': name, 'file': f'{i}.npy', 'dtype': values.dtype.str})
+        np.save(tmp / INDEX_FILE, df.index.asi8)
+        meta = {
+            'version': LAYOUT_VERSION,
+            'rows': len(df),
+            'index': {
+                'name': df.index.name,
+                'tz': None if df.index.tz is None else str(df.index.tz),
+                'start': str(df.index[0]) if len(df) else None,
+                'end': str(df.index[-1]) if len(df) else None,
+            },
+            'columns': columns,
+        }
+        with (tmp / META_FILE).open('w') as f:
+            json.dump(meta, f, indent=4)
+        shutil.rmtree(directory, ignore_errors=True)
+        tmp.rename(directory)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+class ResultStore:
+    """
+    Aligned results saved by save_results function, memory-mapped.
+
+    Attributes:
+        directory:
+            Directory of the store.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        with (self.directory / META_FILE).open() as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != LAYOUT_VERSION:
+            raise Exception(f'Unsupported store layout version {self.meta["version"]}')
+        self.tz = self.meta['index']['tz']
+        self.index = np.load(self.directory / INDEX_FILE, mmap_mode='r')
+        self.arrays = {
+            column['name']: np.load(self.directory / column['file'], mmap_mode='r')
+            for column in self.meta['columns']
+        }
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def columns(self):
+        return list(self.arrays)
+
+    def timestamp(self, timepoint):
+        """
+        Convert timepoint into the int64 value of the index, timezone-naive
+        timepoints are considered to be in the timezone of the store.
+        """
+        timepoint = pd.Timestamp(timepoint)
+        if self.tz is None:
+            if timepoint.tz is not None:
+                raise Exception('Timezone-aware timepoint given for timezone-naive results')
+            return timepoint.value
+        if timepoint.tz is None:
+            timepoint = timepoint.tz_localize(self.tz)
+        return timepoint.value
+
+    def positions(self, start=None, end=None):
+        """
+        Return the positions of the first row at or after start and of
+        the row after the last one at or before end.
+        """
+        first = 0 if start is None else int(np.searchsorted(self.index, self.timestamp(start), 'left'))
+        last = len(self) if end is None else int(np.searchsorted(self.index, self.timestamp(end), 'right'))
+        return first, max(first, last)
+
+    def query(self, start=None, end=None, columns: list=None):
+        """
+        Return the rows with timepoints within [start, end]. Numeric and
+        datetime columns as well as the index are read-only views of
+        the mapped files, string columns are copied.
+
+        Attributes:
+            start:
+                First timepoint of the range. If None, from the first row.
+            end:
+                Last timepoint of the range, inclusive. If None, up to
+                the last row.
+            columns:
+                Columns to return. If None, all the columns.
+        """
+        first, last = self.positions(start, end)
+        if columns is None:
+            columns = self.columns
+
+        timepoints = self.index[first:last].view('M8[ns]')
+        if self.tz is not None:
+            timepoints = pd.arrays.DatetimeArray(
+                timepoints,
+                dtype=pd.DatetimeTZDtype(tz=self.tz),
+                copy=False
+            )
+        index = pd.DatetimeIndex(timepoints, copy=False, name=self.meta['index']['name'])
+        data = {column: self.arrays[column][first:last] for column in columns}
+        return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+def read_results(directory, start=None, end=None, columns: list=None):
+    """
+    Return the rows of aligned results saved in the store directory with
+    timepoints within [start, end], see ResultStore.query.
+
+    Attributes:
+        directory:
+            Directory of the store.
+        start:
+            First timepoint of the range. If None, from the first row.
+        end:
+            Last timepoint of the range, inclusive. If None, up to
+            the last row.
+        columns:
+            Columns to return. If None, all the columns.
+    """
+    return ResultStore(directory).query(start, end, columns)
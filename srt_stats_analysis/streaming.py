@@ -0,0 +1,451 @@
+"""
+Module designed to align SRT core statistics obtained from receiver
+and sender in a streaming manner, chunk by chunk, so that the memory
+consumed depends on the chunk size rather than on the session length.
+"""
+import pandas as pd
+
+from srt_stats_analysis.clocks import ClockModel, correct_clock
+from srt_stats_analysis.join_stats import (
+    RCV_FEATURES,
+    SND_FEATURES,
+    interpolate_srt_stats,
+    prepare_srt_stats,
+)
+from srt_stats_analysis.schema import REDISTRIBUTE, get_policy, read_csv_arguments
+
+
+class SrtStatsAligner:
+    """
+    Incremental counterpart of join_stats.align_srt_stats.
+
+    Sender and receiver statistics are pushed in chronological chunks,
+    already prepared with join_stats.prepare_srt_stats. Aligned sender
+    timepoints are returned by pop() as soon as they can no longer be
+    affected by the data to come.
+
+    Interpolation in align_srt_stats is done over the positions of
+    sender and receiver timepoints in their union, so the value at a sender
+    timepoint depends only on the closest receiver timepoints before and
+    after it and on the number of sender timepoints in between. That is
+    why the only carry-over kept between chunks is the last receiver
+    timepoint already used plus the sender and receiver timepoints
+    following it, which makes the result exactly the same as the one
+    of align_srt_stats.
+
+    Receiver per-interval counters are redistributed over the time
+    intervals, so the end of the last receiver interval redistributed
+    completely and the number of events of the following receiver rows
+    redistributed already are carried over as well.
+
+    Attributes:
+        max_rows:
+            If set, at most that many rows of each side wait for
+            the alignment, e.g. when the other side stalls. The oldest
+            sender rows are aligned right away as with release(),
+            the oldest receiver rows not redistributed yet are merged
+            into one, their counters summed, so the totals
+            are still preserved. Until both sides have pushed rows, only
+            the last max_rows rows of each side are kept. If None, the rows
+            wait as long as needed.
+    """
+
+    def __init__(self, max_rows: int=None):
+        self.max_rows = max_rows
+        self._snd = []
+        self._rcv = []
+        self._snd_closed = False
+        self._rcv_closed = False
+        self._snd_last = None
+        self._rcv_last = None
+        # The first timepoint of the aligned timeline and whether the
+        # first joined timepoint has already been checked
+        self._start = None
+        self._started = False
+        self._finished = False
+        self._aligned = []
+        # The end of the last receiver interval redistributed completely
+        # and the number of events of the following receiver rows
+        # redistributed already
+        self._rcv_start = None
+        self._rcv_offsets = None
+
+    def push_snd(self, snd_stats: pd.DataFrame):
+        """
+        Add the next chunk of sender statistics.
+
+        Attributes:
+            snd_stats:
+                Sender statistics, the output from
+                join_stats.prepare_srt_stats function.
+        """
+        self._push(snd_stats, self._snd, 'snd')
+
+    def push_rcv(self, rcv_stats: pd.DataFrame):
+        """
+        Add the next chunk of receiver statistics.
+
+        Attributes:
+            rcv_stats:
+                Receiver statistics, the output from
+                join_stats.prepare_srt_stats function.
+        """
+        self._push(rcv_stats, self._rcv, 'rcv')
+
+    def close_snd(self):
+        """ Mark the end of sender statistics. """
+        self._snd_closed = True
+        self._align()
+
+    def close_rcv(self):
+        """ Mark the end of receiver statistics. """
+        self._rcv_closed = True
+        self._align()
+
+    @property
+    def finished(self):
+        """ True when both sides are over and all the rows are aligned. """
+        return self._finished
+
+    @property
+    def snd_closed(self):
+        """ True when the end of sender statistics is marked. """
+        return self._snd_closed
+
+    @property
+    def rcv_closed(self):
+        """ True when the end of receiver statistics is marked. """
+        return self._rcv_closed
+
+    @property
+    def snd_last(self):
+        """ The last sender timepoint pushed so far. """
+        return self._snd_last
+
+    @property
+    def rcv_last(self):
+        """ The last receiver timepoint pushed so far. """
+        return self._rcv_last
+
+    def release(self, timepoint):
+        """
+        Align sender timepoints before the given one right away with
+        the receiver statistics known so far instead of waiting for
+        the following receiver timepoints. Receiver values after the last
+        receiver timepoint known are repeated the same way as at the end
+        of the session, so the result may differ from align_srt_stats.
+        Receiver counters not known yet go to the sender timepoints
+        aligned later, so their totals are still preserved.
+
+        Attributes:
+            timepoint:
+                Sender timepoints before this one are aligned.
+        """
+        if not self._started or self._finished:
+            return
+        snd = self._concat(self._snd)
+        rcv = self._concat(self._rcv)
+        if snd is None or rcv is None:
+            return
+        snd_released = snd[snd.index < timepoint]
+        if len(snd_released) == 0:
+            return
+
+        self._aligned.append(self._interpolate(snd_released, rcv))
+
+        # Keep the last receiver timepoint used as the anchor for
+        # the sender timepoints to come
+        before = rcv.index[rcv.index < timepoint]
+        if len(before) > 0:
+            rcv = rcv[rcv.index >= min(before[-1], self._rcv_start)]
+        self._store(snd[snd.index >= timepoint], rcv)
+
+    def pop(self):
+        """
+        Return aligned SRT statistics obtained since the previous call,
+        the same columns as in join_stats.align_srt_stats output.
+        """
+        if not self._aligned:
+            return None
+        aligned = pd.concat(self._aligned) if len(self._aligned) > 1 else self._aligned[0]
+        self._aligned = []
+        return aligned
+
+    def _push(self, stats, buffer, side):
+        if len(stats) == 0:
+            return
+        if stats.index.duplicated().any() or not stats.index.is_monotonic_increasing:
+            raise Exception(
+                f'SRT statistics pushed to the {side} side should have '
+                'unique timepoints in increasing order'
+            )
+        last = self._snd_last if side == 'snd' else self._rcv_last
+        if last is not None and stats.index[0] <= last:
+            raise Exception(
+                f'SRT statistics pushed to the {side} side overlap '
+                'the previous chunk'
+            )
+        buffer.append(stats)
+        if side == 'snd':
+            self._snd_last = stats.index[-1]
+        else:
+            self._rcv_last = stats.index[-1]
+        self._align()
+        self._limit()
+
+    def _limit(self):
+        """ Keep at most max_rows rows of each side waiting for the alignment. """
+        if self.max_rows is None or self._finished:
+            return
+
+        # The start of the timeline is not known yet, so there is nothing
+        # to align the rows with
+        if self._start is None:
+            for buffer in (self._snd, self._rcv):
+                stats = self._concat(buffer)
+                if stats is not None and len(stats) > self.max_rows:
+                    buffer[:] = [stats.iloc[len(stats) - self.max_rows:]]
+            return
+
+        snd = self._concat(self._snd)
+        if snd is not None and len(snd) > self.max_rows:
+            self.release(snd.index[len(snd) - self.max_rows])
+
+        rcv = self._concat(self._rcv)
+        if rcv is None or len(rcv) <= self.max_rows:
+            return
+        # Events of the receiver rows after the first one following
+        # the last interval redistributed completely are counted only
+        # in total, merging them keeps the events counted
+        first = 1
+        if self._rcv_start is not None:
+            first = max(first, rcv.index.searchsorted(self._rcv_start, 'right') + 1)
+        last = min(first + len(rcv) - self.max_rows, len(rcv) - 1)
+        if last <= first:
+            return
+        merged = rcv.iloc[last:last + 1].copy()
+        for col in rcv.columns:
+            if get_policy(col) == REDISTRIBUTE:
+                merged[col] = rcv[col].iloc[first:last + 1].sum()
+        self._rcv = [pd.concat([rcv.iloc[:first], merged, rcv.iloc[last + 1:]])]
+
+    def _align(self):
+        if self._finished:
+            return
+
+        snd = self._concat(self._snd)
+        rcv = self._concat(self._rcv)
+
+        # Cut the timepoints on top where statistics was collected only
+        # on receiver or sender side
+        if self._start is None:
+            if snd is None or rcv is None:
+                if (self._snd_closed and snd is None) or (self._rcv_closed and rcv is None):
+                    raise Exception('There is no SRT statistics to align')
+                return
+            self._start = max(snd.index[0], rcv.index[0])
+        snd = snd[snd.index >= self._start]
+        rcv = rcv[rcv.index >= self._start]
+
+        # Cut the timepoints at the bottom the same way as soon as one
+        # of the sides is over
+        end = None
+        if self._snd_closed and self._rcv_closed:
+            end = min(self._snd_last, self._rcv_last)
+        elif self._snd_closed and self._rcv_last >= self._snd_last:
+            end = self._snd_last
+        elif self._rcv_closed and self._snd_last >= self._rcv_last:
+            end = self._rcv_last
+        if end is not None:
+            snd = snd[snd.index <= end]
+            rcv = rcv[rcv.index <= end]
+
+        # Check that the first timepoint is a sender one. If not, drop it.
+        # It can be decided only once there is a sender timepoint which
+        # is not before the start.
+        if not self._started:
+            if len(snd) == 0 and end is None:
+                self._store(snd, rcv)
+                return
+            snd_first = snd.index[0] if len(snd) else None
+            if len(rcv) > 0 and rcv.index[0] == self._start and snd_first != self._start:
+                rcv = rcv[1:]
+            self._started = True
+
+        if end is not None:
+            self._finish(snd, rcv)
+            return
+
+        # Only timepoints before the last one seen on each side are final,
+        # the ones after might be followed by timepoints from the other side
+        horizon = min(self._snd_last, self._rcv_last)
+        snd_final = snd.index[snd.index < horizon]
+        rcv_final = rcv.index[rcv.index < horizon]
+        if len(snd_final) == 0 or len(rcv_final) == 0:
+            self._store(snd, rcv)
+            return
+
+        # Find the last receiver timepoint followed by a sender timepoint,
+        # all the sender timepoints before it can be aligned already
+        anchor = rcv_final.searchsorted(snd_final[-1], 'left') - 1
+        if anchor < 0 or rcv_final[anchor] <= snd_final[0]:
+            self._store(snd, rcv)
+            return
+        anchor = rcv_final[anchor]
+
+        self._aligned.append(self._interpolate(
+            snd[snd.index < anchor],
+            rcv[rcv.index <= anchor]
+        ))
+        self._store(snd[snd.index >= anchor], rcv[rcv.index >= min(anchor, self._rcv_start)])
+
+    def _finish(self, snd, rcv):
+        self._snd = []
+        self._rcv = []
+        self._finished = True
+        if len(snd) == 0:
+            return
+
+        # Check that the last timepoint is a sender timepoint.
+        # If not, drop it.
+        if len(rcv) > 0 and rcv.index[-1] > snd.index[-1]:
+            rcv = rcv[:-1]
+
+        self._aligned.append(self._interpolate(snd, rcv))
+
+    def _interpolate(self, snd, rcv):
+        """
+        Align sender statistics continuing the ones aligned before and
+        move the carry-over of redistributed receiver counters.
+        """
+        aligned = interpolate_srt_stats(snd, rcv, self._rcv_start, self._rcv_offsets)
+
+        # Receiver intervals ended by the last sender timepoint aligned
+        # are redistributed completely. Events of the receiver rows not
+        # known yet are counted later, even if the rows come before it.
+        start = self._rcv_start
+        before = rcv.index[rcv.index <= snd.index[-1]]
+        if len(before) > 0 and (start is None or before[-1] > start):
+            start = before[-1]
+        elif start is None:
+            start = min(snd.index[0], rcv.index[0])
+
+        completed = rcv.index <= start
+        if self._rcv_start is not None:
+            completed &= rcv.index > self._rcv_start
+        offsets = {}
+        for col in rcv.columns:
+            if get_policy(col) != REDISTRIBUTE:
+                continue
+            offset = 0 if self._rcv_offsets is None else self._rcv_offsets[col]
+            offsets[col] = int(
+                offset
+                + aligned[f'{col}_rcv'].sum()
+                - rcv.loc[completed, col].fillna(0).sum()
+            )
+        self._rcv_start = start
+        self._rcv_offsets = offsets
+        return aligned
+
+    def _store(self, snd, rcv):
+        self._snd = [snd] if len(snd) else []
+        self._rcv = [rcv] if len(rcv) else []
+
+    @staticmethod
+    def _concat(buffer):
+        if not buffer:
+            return None
+        return pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+
+
+def iter_srt_stats_csv(stats_path: str, columns: list=None, chunksize: int=100000):
+    """
+    Read SRT statistics from .csv file chunk by chunk parsing only
+    the columns requested with the dtypes from the schema, see
+    join_stats.read_srt_stats_csv.
+
+    Attributes:
+        stats_path:
+            Filepath to .csv statistics.
+        columns:
+            SRT statistics columns to load. If None, all the columns
+            are loaded.
+        chunksize:
+            Number of .csv rows to read at once.
+    """
+    rows = 0
+    try:
+        for chunk in pd.read_csv(stats_path, chunksize=chunksize, **read_csv_arguments(columns)):
+            rows += len(chunk)
+            yield chunk
+    except ValueError:
+        # Integer columns with missing or fractional values can not
+        # be parsed with integer dtypes, read the rest of the file
+        # with float64 ones
+        yield from pd.read_csv(
+            stats_path,
+            chunksize=chunksize,
+            skiprows=range(1, rows + 1),
+            **read_csv_arguments(columns, integer_na=True)
+        )
+
+
+def iter_align_srt_stats(
+    snd_stats_path: str,
+    rcv_stats_path: str,
+    chunksize: int=100000,
+    snd_features: list=SND_FEATURES,
+    rcv_features: list=RCV_FEATURES,
+    rcv_clock: ClockModel=None
+):
+    """
+    Align SRT core statistics obtained from receiver and sender reading
+    .csv files chunk by chunk. Yield aligned SRT statistics as soon as
+    they are ready, the concatenation of the yielded dataframes is equal
+    to the output of join_stats.align_srt_stats.
+
+    Attributes:
+        snd_stats_path:
+            Filepath to .csv statistics collected at the sender side.
+        rcv_stats_path:
+            Filepath to .csv statistics collected at the receiver side.
+        chunksize:
+            Number of .csv rows to read at once from each file.
+        snd_features:
+            SRT statistics features to align from the sender side.
+        rcv_features:
+            SRT statistics features to align from the receiver side.
+        rcv_clock:
+            Receiver clock against the sender one. If set, receiver
+            timepoints are converted into the sender clock.
+    """
+    snd_reader = iter_srt_stats_csv(snd_stats_path, snd_features, chunksize)
+    rcv_reader = iter_srt_stats_csv(rcv_stats_path, rcv_features, chunksize)
+    aligner = SrtStatsAligner()
+
+    while not aligner.finished:
+        # Read from the side which is behind in time so that
+        # the data kept in memory stays within a couple of chunks
+        snd_behind = (
+            aligner.snd_last is None
+            or (aligner.rcv_last is not None and aligner.snd_last <= aligner.rcv_last)
+        )
+        if (snd_behind and not aligner.snd_closed) or aligner.rcv_closed:
+            chunk = next(snd_reader, None)
+            if chunk is None:
+                aligner.close_snd()
+            else:
+                aligner.push_snd(prepare_srt_stats(chunk, snd_features))
+        else:
+            chunk = next(rcv_reader, None)
+            if chunk is None:
+                aligner.close_rcv()
+            else:
+                chunk = prepare_srt_stats(chunk, rcv_features)
+                if rcv_clock is not None:
+                    chunk = correct_clock(chunk, rcv_clock)
+                aligner.push_rcv(chunk)
+
+        aligned = aligner.pop()
+        if aligned is not None and len(aligned) > 0:
+            yield aligned
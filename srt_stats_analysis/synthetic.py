@@ -0,0 +1,491 @@
+"""
+Module designed to generate synthetic experiments: SRT core statistics
+collected at the sender and receiver sides by srt-xtransmit and tshark
+.pcapng dumps with UMSG_HANDSHAKE, UMSG_ACK and UMSG_ACKACK packets
+(and optionally data packets) captured at both sides.
+
+The files are laid out the same way as the real experiments, so they can
+be processed by join_stats and batch modules. Sender statistics and the
+sender dump are written in the sender clock, receiver ones in the
+receiver clock, which may be shifted and drift against the sender one.
+"""
+import pathlib
+import struct
+import typing
+
+import numpy as np
+import pandas as pd
+
+from srt_stats_analysis.join_stats import SRT_DATA_PACKET_HEADER_SIZE, SRT_DATA_PACKET_PAYLOAD_SIZE
+from srt_stats_analysis.pcapng import (
+    BYTE_ORDER_MAGIC,
+    EPB_TYPE,
+    IDB_TYPE,
+    IF_TSRESOL,
+    LINKTYPE_ETHERNET,
+    SHB_TYPE,
+    UMSG_ACK,
+    UMSG_ACKACK,
+    UMSG_HANDSHAKE,
+)
+from srt_stats_analysis.timepoints import format_timepoints
+
+
+# Columns of srt-xtransmit .csv statistics, msRcvTsbPdDelay is written twice
+STATS_COLUMNS = [
+    'Timepoint', 'Time', 'SocketID', 'pktFlowWindow', 'pktCongestionWindow',
+    'pktFlightSize', 'msRTT', 'mbpsBandwidth', 'mbpsMaxBW', 'pktSent',
+    'pktSndLoss', 'pktSndDrop', 'pktRetrans', 'byteSent', 'byteAvailSndBuf',
+    'byteSndDrop', 'mbpsSendRate', 'usPktSndPeriod', 'pktRecv', 'pktRcvLoss',
+    'pktRcvDrop', 'pktRcvRetrans', 'pktRcvBelated', 'byteRecv',
+    'byteAvailRcvBuf', 'byteRcvLoss', 'byteRcvDrop', 'mbpsRecvRate',
+    'msRcvTsbPdDelay', 'msRcvTsbPdDelay',
+]
+
+# SRT packet size on the wire without Ethernet overhead, bytes
+SRT_PACKET_SIZE = SRT_DATA_PACKET_HEADER_SIZE + SRT_DATA_PACKET_PAYLOAD_SIZE
+
+# Initial RTT estimation reported before the first measurement, milliseconds
+INITIAL_RTT_MS = 100
+
+# Addresses of the sender (caller) and the receiver (listener)
+SND_ADDRESS = ('10.0.0.1', 4200)
+RCV_ADDRESS = ('10.0.0.2', 4200)
+
+
+class SessionParams(typing.NamedTuple):
+    """
+    Parameters of a synthetic SRT session.
+
+    Attributes:
+        duration:
+            Length of the session.
+        interval_ms:
+            Interval of collecting SRT statistics, milliseconds.
+        rate_mbps:
+            Sending rate, Mbps.
+        capacity_mbps:
+            Link capacity estimated by SRT, Mbps.
+        rtt_ms:
+            Round trip time, milliseconds.
+        clock_skew_ms:
+            Difference between the receiver and the sender clocks at the
+            start of the session, milliseconds.
+        clock_drift_ppm:
+            Drift of the receiver clock against the sender one, parts per
+            million.
+        jitter_ms:
+            Maximum delay of statistics sample times against the interval
+            grid, milliseconds.
+        loss_rate:
+            Share of packets lost.
+        loss_burst:
+            Mean number of packets lost in a row.
+        ack_interval_ms:
+            Interval of sending UMSG_ACK packets, milliseconds.
+        data_packets:
+            Whether data packets are written in tshark dumps as well.
+        start:
+            Start of the session in the sender clock, UTC+0.
+        seed:
+            Seed of the random generator.
+    """
+    duration: pd.Timedelta = pd.Timedelta(minutes=1)
+    interval_ms: float = 10
+    rate_mbps: float = 100
+    capacity_mbps: float = 900
+    rtt_ms: float = 60
+    clock_skew_ms: float = 0
+    clock_drift_ppm: float = 0
+    jitter_ms: float = 0.5
+    loss_rate: float = 0
+    loss_burst: int = 1
+    ack_interval_ms: float = 10
+    data_packets: bool = False
+    start: pd.Timestamp = pd.Timestamp('2020-02-10 17:34:29.991983')
+    seed: int = 0
+
+
+def packets_per_second(mbps: float):
+    """ Convert the rate in Mbps into SRT packets per second. """
+    return mbps * 1000000 / 8 / SRT_PACKET_SIZE
+
+
+def receiver_clock(params: SessionParams, nanos: np.ndarray):
+    """
+    Convert the time in the sender clock into the time in the receiver
+    clock, int64 nanoseconds.
+
+    Attributes:
+        params:
+            Parameters of the session.
+        nanos:
+            Time in the sender clock, int64 nanoseconds since epoch.
+    """
+    elapsed = nanos - params.start.value
+    drift = np.round(elapsed * params.clock_drift_ppm / 1000000).astype(np.int64)
+    return nanos + int(params.clock_skew_ms * 1000000) + drift
+
+
+def sample_times(params: SessionParams, rng: np.random.Generator, start_ns: int, count: int):
+    """ Statistics sample times on the interval grid delayed by jitter, int64 nanoseconds. """
+    interval = int(params.interval_ms * 1000000)
+    jitter = rng.uniform(0, params.jitter_ms * 1000000, count).astype(np.int64)
+    return start_ns + np.arange(count, dtype=np.int64) * interval + jitter
+
+
+def lost_packets(params: SessionParams, rng: np.random.Generator, packets: np.ndarray):
+    """ Number of packets lost out of the packets sent per interval. """
+    if params.loss_rate <= 0:
+        return np.zeros(len(packets), dtype=np.int64)
+    bursts = rng.poisson(packets * params.loss_rate / params.loss_burst)
+    return np.minimum(bursts * params.loss_burst, packets)
+
+
+def smoothed_noise(rng: np.random.Generator, count: int, scale: float, window: int=50):
+    """ Random walk like noise with the given scale. """
+    noise = rng.normal(0, scale, count + window)
+    return np.convolve(noise, np.ones(window) / np.sqrt(window), 'valid')[:count]
+
+
+def generate_srt_stats(params: SessionParams, side: str):
+    """
+    Generate SRT core statistics the way srt-xtransmit writes them.
+
+    Attributes:
+        params:
+            Parameters of the session.
+        side:
+            'snd' for the sender statistics, 'rcv' for the receiver ones.
+    """
+    rng = np.random.default_rng([params.seed, 0 if side == 'snd' else 1])
+    interval = int(params.interval_ms * 1000000)
+    count = int(params.duration.value // interval)
+
+    if side == 'snd':
+        nanos = sample_times(params, rng, params.start.value, count)
+    else:
+        # The receiver (listener) is started before the sender and
+        # stopped after it
+        nanos = sample_times(params, rng, params.start.value - 4 * interval, count + 8)
+        nanos = receiver_clock(params, nanos)
+    count = len(nanos)
+
+    pps = packets_per_second(params.rate_mbps)
+    packets = rng.poisson(pps * params.interval_ms / 1000, count)
+    lost = lost_packets(params, rng, packets)
+    rtt = np.maximum(params.rtt_ms + smoothed_noise(rng, count, params.rtt_ms * 0.01), 0.1)
+    rtt[0] = INITIAL_RTT_MS
+    bandwidth = np.maximum(params.capacity_mbps + smoothed_noise(rng, count, params.capacity_mbps * 0.05), 0)
+    rate = packets * SRT_PACKET_SIZE * 8 / 1000 / params.interval_ms
+    zeros = np.zeros(count, dtype=np.int64)
+
+    if side == 'snd':
+        sent, snd_loss, recv, rcv_loss = packets, lost, zeros, zeros
+        send_rate, recv_rate = rate, np.zeros(count)
+    else:
+        sent, snd_loss, recv, rcv_loss = zeros, zeros, packets - lost, lost
+        send_rate, recv_rate = np.zeros(count), rate
+
+    columns = [
+        format_timepoints(pd.DatetimeIndex(nanos.view('datetime64[ns]'))),
+        (nanos - nanos[0]) // 1000000 + 1,
+        np.full(count, 115676651 if side == 'snd' else 855406566),
+        np.full(count, 25600),
+        np.full(count, 25600),
+        np.minimum(sent, 100) if side == 'snd' else zeros,
+        rtt.round(3),
+        bandwidth.round(0).astype(np.int64),
+        np.full(count, 1000),
+        sent,
+        snd_loss,
+        zeros,
+        snd_loss,
+        sent * SRT_PACKET_SIZE,
+        np.full(count, 1019019000),
+        zeros,
+        send_rate.round(6),
+        np.full(count, 10),
+        recv,
+        rcv_loss,
+        zeros,
+        zeros,
+        zeros,
+        recv * SRT_DATA_PACKET_PAYLOAD_SIZE,
+        np.full(count, 38398500),
+        rcv_loss * SRT_DATA_PACKET_PAYLOAD_SIZE,
+        zeros,
+        recv_rate.round(6),
+        np.full(count, 120),
+        zeros,
+    ]
+    stats = pd.DataFrame(dict(enumerate(columns)))
+    stats.columns = STATS_COLUMNS
+    return stats
+
+
+def handshake_times(params: SessionParams):
+    """
+    Times of UMSG_HANDSHAKE packets captured at the caller (sender) and
+    the listener (receiver) sides in their own clocks: induction request,
+    induction response, conclusion request and conclusion response.
+    """
+    rtt = int(params.rtt_ms * 1000000)
+    # Time the peers take to process a handshake before answering
+    processing = 50000
+    # The connection is established right before the sender starts
+    # collecting statistics
+    t0 = params.start.value - 2 * rtt - 4 * processing
+    clr_times = np.array([
+        t0,
+        t0 + rtt + processing,
+        t0 + rtt + 2 * processing,
+        t0 + 2 * rtt + 3 * processing,
+    ], dtype=np.int64)
+    list_times = np.array([
+        t0 + rtt // 2,
+        t0 + rtt // 2 + processing,
+        t0 + rtt // 2 + rtt + 2 * processing,
+        t0 + rtt // 2 + rtt + 3 * processing,
+    ], dtype=np.int64)
+    return clr_times, receiver_clock(params, list_times)
+
+
+def generate_ack_packets(params: SessionParams):
+    """
+    Generate UMSG_ACK packets sent by the receiver: time in the sender
+    clock and the values of ACK fields.
+
+    Attributes:
+        params:
+            Parameters of the session.
+    """
+    rng = np.random.default_rng([params.seed, 2])
+    interval = int(params.ack_interval_ms * 1000000)
+    count = int(params.duration.value // interval) + 1
+    nanos = params.start.value + np.arange(count, dtype=np.int64) * interval
+    nanos += rng.integers(0, 200000, count)
+
+    pps = packets_per_second(params.rate_mbps)
+    rtt = np.maximum(params.rtt_ms + smoothed_noise(rng, count, params.rtt_ms * 0.01), 0.1)
+    return pd.DataFrame({
+        'time': nanos,
+        'srt.ack_seqno': np.cumsum(rng.poisson(pps * params.ack_interval_ms / 1000, count)),
+        'srt.rtt': np.round(rtt * 1000).astype(np.int64),
+        'srt.rttvar': rng.integers(500, 5000, count),
+        'srt.bufavail': np.full(count, 8000),
+        'srt.rate': rng.poisson(pps, count),
+        'srt.bw': rng.poisson(packets_per_second(params.capacity_mbps), count),
+        'srt.rcvrate': rng.poisson(pps, count) * SRT_PACKET_SIZE,
+    })
+
+
+def _srt_control(control_type: int, type_info: int, timestamp: int, socket_id: int, information: bytes):
+    """ SRT control packet. """
+    header = struct.pack('!IIII', (1 << 31) | (control_type << 16), type_info, timestamp, socket_id)
+    return header + information
+
+
+def _udp_frame(src: tuple, dst: tuple, payload: bytes):
+    """ Ethernet frame with IPv4 and UDP headers. """
+    ip_src = bytes(int(part) for part in src[0].split('.'))
+    ip_dst = bytes(int(part) for part in dst[0].split('.'))
+    udp = struct.pack('!HHHH', src[1], dst[1], 8 + len(payload), 0) + payload
+    ip = struct.pack('!BBHHHBBH', 0x45, 0, 20 + len(udp), 0, 0x4000, 64, 17, 0) + ip_src + ip_dst
+    ethernet = b'\x02\x00\x00\x00\x00\x02\x02\x00\x00\x00\x00\x01\x08\x00'
+    return ethernet + ip + udp
+
+
+def _handshake_frame(src: tuple, dst: tuple, reqtype: int, socket_id: int, dst_socket_id: int):
+    information = struct.pack('!IIIIIiII', 5, 0, 1000, 1500, 8192, reqtype, socket_id, 0) + bytes(16)
+    return _udp_frame(src, dst, _srt_control(UMSG_HANDSHAKE, 0, 0, dst_socket_id, information))
+
+
+def _ack_frame(ackno: int, timestamp: int, ack: tuple):
+    information = struct.pack('!7I', *ack)
+    return _udp_frame(RCV_ADDRESS, SND_ADDRESS, _srt_control(UMSG_ACK, ackno, timestamp, 115676651, information))
+
+
+def _ackack_frame(ackno: int, timestamp: int):
+    return _udp_frame(SND_ADDRESS, RCV_ADDRESS, _srt_control(UMSG_ACKACK, ackno, timestamp, 855406566, bytes(4)))
+
+
+def _data_frame(seqno: int, timestamp: int):
+    # Solo message, in order
+    header = struct.pack('!IIII', seqno, 0xE0000000 | (seqno + 1), timestamp, 855406566)
+    return _udp_frame(SND_ADDRESS, RCV_ADDRESS, header + bytes(SRT_DATA_PACKET_PAYLOAD_SIZE))
+
+
+def srt_timestamps(start: int, nanos: np.ndarray):
+    """ SRT timestamps: microseconds since the socket has been created, wrapped. """
+    return ((nanos - start) // 1000) % 2 ** 32
+
+
+class DataFrames:
+    """
+    Frames of data packets built when they are written, so that millions
+    of them are not kept in memory at once.
+
+    Attributes:
+        seqnos:
+            Sequence numbers of the packets.
+        timestamps:
+            SRT timestamps of the packets.
+    """
+
+    def __init__(self, seqnos: np.ndarray, timestamps: np.ndarray):
+        self.seqnos = seqnos
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.seqnos)
+
+    def __getitem__(self, i):
+        return _data_frame(int(self.seqnos[i]), int(self.timestamps[i]))
+
+
+class ChainedFrames:
+    """ Sequence of frames made of several sequences. """
+
+    def __init__(self, *parts):
+        self.parts = parts
+        self.bounds = np.cumsum([0] + [len(part) for part in parts])
+
+    def __len__(self):
+        return int(self.bounds[-1])
+
+    def __getitem__(self, i):
+        part = np.searchsorted(self.bounds, i, 'right') - 1
+        return self.parts[part][i - self.bounds[part]]
+
+
+def write_pcapng(path, nanos: np.ndarray, frames: list):
+    """
+    Write Ethernet frames in .pcapng file in the order of their
+    timestamps, with nanoseconds resolution.
+
+    Attributes:
+        path:
+            Filepath to .pcapng file.
+        nanos:
+            Timestamps of the frames, int64 nanoseconds since epoch.
+        frames:
+            Ethernet frames, a sequence of bytes.
+    """
+    def block(block_type: int, body: bytes):
+        body += bytes(-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+    with pathlib.Path(path).open('wb') as f:
+        f.write(block(SHB_TYPE, struct.pack('<IHHq', BYTE_ORDER_MAGIC, 1, 0, -1)))
+        options = struct.pack('<HHB3x', IF_TSRESOL, 1, 9) + struct.pack('<HH', 0, 0)
+        f.write(block(IDB_TYPE, struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 65535) + options))
+
+        blocks = []
+        for i in np.argsort(nanos, kind='stable'):
+            frame = frames[i]
+            timestamp = int(nanos[i])
+            header = struct.pack('<IIIII', 0, timestamp >> 32, timestamp & 0xFFFFFFFF, len(frame), len(frame))
+            blocks.append(block(EPB_TYPE, header + frame))
+            if len(blocks) == 100000:
+                f.write(b''.join(blocks))
+                blocks = []
+        f.write(b''.join(blocks))
+
+
+def generate_captures(params: SessionParams):
+    """
+    Generate the packets captured at the sender and receiver sides:
+    timestamps in the respective clocks and Ethernet frames.
+
+    Attributes:
+        params:
+            Parameters of the session.
+    """
+    rtt = int(params.rtt_ms * 1000000)
+    clr_times, list_times = handshake_times(params)
+    handshakes = [
+        # Requests are sent to socket 0, responses to the caller socket
+        _handshake_frame(SND_ADDRESS, RCV_ADDRESS, 1, 115676651, 0),
+        _handshake_frame(RCV_ADDRESS, SND_ADDRESS, 1, 855406566, 115676651),
+        _handshake_frame(SND_ADDRESS, RCV_ADDRESS, -1, 115676651, 0),
+        _handshake_frame(RCV_ADDRESS, SND_ADDRESS, -1, 855406566, 115676651),
+    ]
+
+    # UMSG_ACK packets are sent by the receiver and acknowledged with
+    # UMSG_ACKACK ones by the sender as soon as they arrive. SRT timestamps
+    # of the packets are taken by the sending side in its own clock
+    acks = generate_ack_packets(params)
+    ack_times = acks['time'].to_numpy()
+    ackack_times = ack_times + rtt // 2
+    acknos = np.arange(1, len(acks) + 1)
+    ack_frames = [
+        _ack_frame(int(ackno), int(timestamp), ack)
+        for ackno, timestamp, ack in zip(
+            acknos,
+            srt_timestamps(list_times[0], receiver_clock(params, ack_times)),
+            acks.drop(columns='time').itertuples(index=False)
+        )
+    ]
+    ackack_frames = [
+        _ackack_frame(int(ackno), int(timestamp))
+        for ackno, timestamp in zip(acknos, srt_timestamps(clr_times[0], ackack_times))
+    ]
+
+    snd_nanos = [clr_times, ackack_times, ackack_times]
+    rcv_nanos = [list_times, receiver_clock(params, ack_times), receiver_clock(params, ack_times + rtt)]
+    snd_frames = handshakes + ack_frames + ackack_frames
+    rcv_frames = handshakes + ack_frames + ackack_frames
+
+    if params.data_packets:
+        rng = np.random.default_rng([params.seed, 3])
+        count = int(packets_per_second(params.rate_mbps) * params.duration.total_seconds())
+        sent = params.start.value + np.sort(rng.integers(0, params.duration.value, count))
+        seqnos = np.arange(count)
+        timestamps = srt_timestamps(clr_times[0], sent)
+        received = rng.random(count) >= params.loss_rate
+        snd_nanos.append(sent)
+        rcv_nanos.append(receiver_clock(params, sent[received] + rtt // 2))
+        snd_frames = ChainedFrames(snd_frames, DataFrames(seqnos, timestamps))
+        rcv_frames = ChainedFrames(rcv_frames, DataFrames(seqnos[received], timestamps[received]))
+
+    return (
+        (np.concatenate(snd_nanos), snd_frames),
+        (np.concatenate(rcv_nanos), rcv_frames),
+    )
+
+
+def generate_experiment(directory, params: SessionParams=SessionParams()):
+    """
+    Generate synthetic experiment in the directory laid out the same way
+    as the real experiments. Return the filepaths to sender and receiver
+    statistics and tshark dumps.
+
+    Attributes:
+        directory:
+            Experiment directory.
+        params:
+            Parameters of the session.
+    """
+    directory = pathlib.Path(directory)
+    snd_dir = directory / 'sender'
+    rcv_dir = directory / 'receiver'
+    snd_dir.mkdir(parents=True, exist_ok=True)
+    rcv_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = {
+        'snd_stats_csv': snd_dir / '4-srt-xtransmit-stats-snd.csv',
+        'rcv_stats_csv': rcv_dir / '3-srt-xtransmit-stats-rcv.csv',
+        'snd_tshark_pcapng': snd_dir / '1-tshark-tracefile-snd.pcapng',
+        'rcv_tshark_pcapng': rcv_dir / '2-tshark-tracefile-rcv.pcapng',
+    }
+
+    generate_srt_stats(params, 'snd').to_csv(paths['snd_stats_csv'], index=False)
+    generate_srt_stats(params, 'rcv').to_csv(paths['rcv_stats_csv'], index=False)
+
+    snd_capture, rcv_capture = generate_captures(params)
+    write_pcapng(paths['snd_tshark_pcapng'], *snd_capture)
+    write_pcapng(paths['rcv_tshark_pcapng'], *rcv_capture)
+
+    return paths
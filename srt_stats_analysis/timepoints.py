@@ -0,0 +1,191 @@
+"""
+Module designed to decode the Timepoint column of srt-xtransmit .csv
+statistics, e.g. `10.02.2020 17:34:29.991983 +0000`, into datetime64.
+
+The field is fixed width, so instead of parsing each value with strptime
+the characters are decoded as a matrix of bytes with vectorized integer
+arithmetic. Values not matching the format fall back to pd.to_datetime.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Format of the Timepoint column in srt-xtransmit .csv statistics
+TIMEPOINT_FORMAT = '%d.%m.%Y %H:%M:%S.%f %z'
+
+# Width of the Timepoint value and positions of its fields
+TIMEPOINT_WIDTH = 32
+_SEPARATORS = {2: b'.', 5: b'.', 10: b' ', 13: b':', 16: b':', 19: b'.', 26: b' '}
+_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18] + list(range(20, 26)) + [28, 29, 30, 31]
+
+NS_PER_SECOND = 1000000000
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _field(chars, start, stop):
+    """ Combine digit characters in columns [start, stop) into int64 numbers. """
+    value = np.zeros(len(chars), dtype=np.int64)
+    for i in range(start, stop):
+        value = value * 10 + (chars[:, i].astype(np.int64) - ord('0'))
+    return value
+
+
+def _days_from_civil(year, month, day):
+    """
+    Number of days since 1970-01-01 for the proleptic Gregorian date,
+    see http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+    """
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    mp = (month + 9) % 12
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _civil_from_days(days):
+    """
+    Proleptic Gregorian date for the number of days since 1970-01-01,
+    see http://howardhinnant.github.io/date_algorithms.html#civil_from_days
+    """
+    days = days + 719468
+    era = np.floor_divide(days, 146097)
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def format_timepoints(timepoints: pd.DatetimeIndex):
+    """
+    Format timepoints as Timepoint values the way srt-xtransmit writes
+    them, in UTC+0 with microseconds precision, the inverse of
+    parse_timepoints.
+
+    Attributes:
+        timepoints:
+            Datetime index, timezone naive in UTC+0 or aware.
+    """
+    if timepoints.tz is not None:
+        timepoints = timepoints.tz_convert(None)
+    micros = np.floor_divide(timepoints.asi8, 1000)
+    seconds = np.floor_divide(micros, 1000000)
+    days = np.floor_divide(seconds, SECONDS_PER_DAY)
+    year, month, day = _civil_from_days(days)
+    seconds_of_day = seconds - days * SECONDS_PER_DAY
+
+    chars = np.zeros((len(timepoints), TIMEPOINT_WIDTH), dtype=np.uint8)
+    fields = [
+        (day, 0, 2),
+        (month, 3, 5),
+        (year, 6, 10),
+        (seconds_of_day // 3600, 11, 13),
+        (seconds_of_day // 60 % 60, 14, 16),
+        (seconds_of_day % 60, 17, 19),
+        (micros - seconds * 1000000, 20, 26),
+        (np.zeros_like(day), 28, 32),
+    ]
+    for value, start, stop in fields:
+        for i in range(stop - 1, start - 1, -1):
+            chars[:, i] = value % 10 + ord('0')
+            value = value // 10
+    for pos, sep in _SEPARATORS.items():
+        chars[:, pos] = ord(sep)
+    chars[:, 27] = ord('+')
+    return chars.view(f'S{TIMEPOINT_WIDTH}').ravel().astype(f'U{TIMEPOINT_WIDTH}')
+
+
+def decode_timepoints(values):
+    """
+    Decode fixed width Timepoint values into int64 nanoseconds since
+    epoch, UTC+0.
+
+    Return the decoded values and the boolean mask of values that do not
+    match the format and are left undecoded (set to 0).
+
+    Attributes:
+        values:
+            Sequence of Timepoint strings or bytes.
+    """
+    # One extra character is kept to detect values longer than expected
+    width = TIMEPOINT_WIDTH + 1
+    raw = np.asarray(values)
+    if raw.dtype.kind == 'S':
+        chars = raw.astype(f'S{width}').view(np.uint8).reshape(-1, width)
+        valid = np.ones(len(chars), dtype=bool)
+    else:
+        chars = raw.astype(f'U{width}').view(np.uint32).reshape(-1, width)
+        # Narrow the characters to bytes, non ASCII ones never match
+        valid = (chars < 128).all(axis=1)
+        chars = chars.astype(np.uint8)
+
+    valid &= (chars[:, TIMEPOINT_WIDTH - 1] != 0) & (chars[:, TIMEPOINT_WIDTH] == 0)
+    # Characters are unsigned, so the ones below '0' wrap around
+    valid &= ((chars[:, _DIGITS] - np.uint8(ord('0'))) < 10).all(axis=1)
+    for pos, sep in _SEPARATORS.items():
+        valid &= chars[:, pos] == ord(sep)
+    sign = chars[:, 27]
+    valid &= (sign == ord('+')) | (sign == ord('-'))
+
+    day = _field(chars, 0, 2)
+    month = _field(chars, 3, 5)
+    year = _field(chars, 6, 10)
+    hour = _field(chars, 11, 13)
+    minute = _field(chars, 14, 16)
+    second = _field(chars, 17, 19)
+    micros = _field(chars, 20, 26)
+    offset_hour = _field(chars, 28, 30)
+    offset_minute = _field(chars, 30, 32)
+
+    # Days in month are checked via the round trip through the 1st of
+    # the next month so that e.g. 30.02 is rejected as strptime does
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    valid &= (hour < 24) & (minute < 60) & (second < 60) & (offset_minute < 60)
+    days = _days_from_civil(year, month, np.ones_like(day))
+    next_month_days = _days_from_civil(year + (month == 12), month % 12 + 1, np.ones_like(day))
+    valid &= day <= next_month_days - days
+    days += day - 1
+
+    offset = (offset_hour * 60 + offset_minute) * 60
+    offset = np.where(sign == ord('-'), -offset, offset)
+    seconds = days * SECONDS_PER_DAY + hour * 3600 + minute * 60 + second - offset
+    nanos = seconds * NS_PER_SECOND + micros * 1000
+
+    invalid = ~valid
+    nanos[invalid] = 0
+    return nanos, invalid
+
+
+def parse_timepoints(values, name=None):
+    """
+    Convert Timepoint values to datetime64 index in UTC+0 without
+    timezone, the same as
+
+        pd.to_datetime(values, format=TIMEPOINT_FORMAT).tz_convert(None)
+
+    Values that do not match the fixed width format are converted with
+    pd.to_datetime.
+
+    Attributes:
+        values:
+            Sequence of Timepoint strings, e.g. the index of SRT statistics
+            read from .csv file.
+        name:
+            Name of the result index. If not set, the name of values is used.
+    """
+    if name is None:
+        name = getattr(values, 'name', None)
+    nanos, invalid = decode_timepoints(values)
+    if invalid.any():
+        fallback = pd.to_datetime(
+            np.asarray(values, dtype=object)[invalid],
+            format=TIMEPOINT_FORMAT,
+            utc=True
+        )
+        nanos[invalid] = fallback.tz_convert(None).asi8
+    return pd.DatetimeIndex(nanos.view('datetime64[ns]'), name=name)
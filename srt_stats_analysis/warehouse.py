@@ -0,0 +1,435 @@
+"""
+Module designed to keep aligned SRT statistics and tshark data of many
+experiments in one SQLite database file, so that the experiments can be
+compared without running the pipeline again.
+
+The database has the following tables:
+
+- experiments: experiment names and the number of rows ingested;
+- experiment_tags: metadata of the experiments as key-value pairs, e.g.
+  regions, date and bitrate parsed out of experiment directory names
+  like _useast_eunorth_10.02.20_100Mbps;
+- samples: aligned datasets, one row per timepoint of an experiment
+  and one column per metric, the columns are added as new metrics are
+  ingested. Rows are indexed by the experiment and the timepoint,
+  int64 nanoseconds in UTC+0.
+
+Datasets are ingested in batches of rows within one transaction per
+experiment, the rows ingested before for the same experiment are
+replaced. Metrics are selected by columns, experiments by their names
+or tags and time ranges by the index.
+"""
+import argparse
+import pathlib
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+# Number of rows inserted at once
+DEFAULT_BATCH_SIZE = 50000
+
+# Seconds to wait for other processes writing to the database
+DEFAULT_TIMEOUT = 600
+
+# Aggregate functions available in SQLite
+AGGREGATES = ['avg', 'min', 'max', 'sum', 'count']
+
+# Experiment directory names like _useast_eunorth_10.02.20_100Mbps
+EXPERIMENT_NAME_PATTERN = re.compile(
+    r'^_?(?P<regions>[a-z]+(?:_[a-z]+)*)_(?P<date>\d{2}\.\d{2}\.\d{2})_(?P<bitrate_mbps>\d+)Mbps'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    rows INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS experiment_tags (
+    experiment_id INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (experiment_id, key)
+);
+CREATE INDEX IF NOT EXISTS experiment_tags_key_value ON experiment_tags(key, value);
+CREATE TABLE IF NOT EXISTS samples (
+    experiment_id INTEGER NOT NULL,
+    timepoint INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_experiment_timepoint ON samples(experiment_id, timepoint);
+"""
+
+
+def quote(name: str):
+    """ Quote SQL identifier, e.g. the name of a metric column. """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def parse_experiment_name(name: str):
+    """
+    Return the tags parsed out of experiment directory name like
+    _useast_eunorth_10.02.20_100Mbps: regions, date and bitrate_mbps.
+    Return no tags if the name does not follow the pattern.
+
+    Attributes:
+        name:
+            Experiment directory name.
+    """
+    match = EXPERIMENT_NAME_PATTERN.match(name)
+    if match is None:
+        return {}
+    return {
+        'regions': match['regions'],
+        'date': pd.to_datetime(match['date'], format='%d.%m.%y').strftime('%Y-%m-%d'),
+        'bitrate_mbps': match['bitrate_mbps'],
+    }
+
+
+def _nanoseconds(timepoint):
+    """ Convert timepoint into int64 nanoseconds in UTC+0. """
+    timepoint = pd.Timestamp(timepoint)
+    if timepoint.tz is not None:
+        timepoint = timepoint.tz_convert(None)
+    return timepoint.value
+
+
+class Warehouse:
+    """
+    SQLite database of aligned datasets of many experiments.
+
+    Attributes:
+        path:
+            Filepath to the database, it is created if it does not exist.
+        timeout:
+            Seconds to wait for other processes writing to the database.
+    """
+
+    def __init__(self, path, timeout: float=DEFAULT_TIMEOUT):
+        self.path = pathlib.Path(path)
+        self.connection = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None)
+        # Readers do not block the writer and the other way round,
+        # commits do not wait for the data to reach the disk
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def metrics(self):
+        """ Names of the metrics ingested so far. """
+        columns = self.connection.execute('PRAGMA table_info(samples)').fetchall()
+        return [column[1] for column in columns if column[1] not in ('experiment_id', 'timepoint')]
+
+    def _add_metrics(self, df: pd.DataFrame):
+        """ Add the columns of dataframe missing in samples table. """
+        existing = set(self.metrics)
+        for name, dtype in df.dtypes.items():
+            if name in existing:
+                continue
+            kind = getattr(dtype, 'kind', 'O')
+            affinity = 'INTEGER' if kind in 'biu' else 'REAL' if kind == 'f' else ''
+            self.connection.execute(f'ALTER TABLE samples ADD COLUMN {quote(name)} {affinity}')
+
+    def ingest(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        tags: dict=None,
+        batch_size: int=DEFAULT_BATCH_SIZE
+    ):
+        """
+        Ingest aligned dataset of an experiment replacing the one ingested
+        before under the same name, if any. Return the number of rows
+        ingested.
+
+        Attributes:
+            name:
+                Experiment name.
+            df:
+                Aligned SRT statistics or SRT statistics and tshark data
+                indexed by timepoints.
+            tags:
+                Experiment metadata. If None, the tags are parsed out of
+                the experiment name, see parse_experiment_name.
+            batch_size:
+                Number of rows inserted at once.
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise Exception(f'Dataset should be indexed by timepoints, got {type(df.index).__name__}')
+        if tags is None:
+            tags = parse_experiment_name(name)
+
+        index = df.index if df.index.tz is None else df.index.tz_convert(None)
+        timepoints = index.asi8
+        columns = [df.iloc[:, i].to_numpy() for i in range(df.shape[1])]
+        insert = (
+            f'INSERT INTO samples (experiment_id, timepoint, '
+            f'{", ".join(quote(column) for column in df.columns)}) '
+            f'VALUES ({", ".join(["?"] * (df.shape[1] + 2))})'
+        )
+
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._add_metrics(df)
+            row = connection.execute('SELECT id FROM experiments WHERE name = ?', (name,)).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM samples WHERE experiment_id = ?', (row[0],))
+                connection.execute('DELETE FROM experiments WHERE id = ?', (row[0],))
+            experiment_id = connection.execute(
+                'INSERT INTO experiments (name, rows) VALUES (?, ?)',
+                (name, len(df))
+            ).lastrowid
+            connection.executemany(
+                'INSERT INTO experiment_tags (experiment_id, key, value) VALUES (?, ?, ?)',
+                [(experiment_id, key, None if value is None else str(value)) for key, value in tags.items()]
+            )
+            for start in range(0, len(df), batch_size):
+                stop = start + batch_size
+                # NaN values are stored as NULL
+                batch = [column[start:stop].tolist() for column in columns]
+                connection.executemany(
+                    insert,
+                    zip(
+                        [experiment_id] * len(timepoints[start:stop]),
+                        timepoints[start:stop].tolist(),
+                        *batch
+                    )
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return len(df)
+
+    def remove(self, name: str):
+        """ Remove the experiment and its dataset. """
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT id FROM experiments WHERE name = ?', (name,)).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM samples WHERE experiment_id = ?', (row[0],))
+                connection.execute('DELETE FROM experiments WHERE id = ?', (row[0],))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def experiments(self, **tags):
+        """
+        Return the experiments with their tags as columns, indexed by
+        the experiment names.
+
+        Attributes:
+            tags:
+                Tag values the experiments should have, e.g. regions='useast_eunorth'.
+        """
+        ids = self._experiment_ids(tags=tags)
+        experiments = pd.read_sql_query(
+            'SELECT id, name, rows FROM experiments ORDER BY name',
+            self.connection
+        )
+        if ids is not None:
+            experiments = experiments[experiments['id'].isin(ids)]
+        tag_rows = pd.read_sql_query('SELECT experiment_id, key, value FROM experiment_tags', self.connection)
+        tag_table = tag_rows.pivot(index='experiment_id', columns='key', values='value')
+        experiments = experiments.join(tag_table, on='id')
+        return experiments.drop(columns='id').set_index('name')
+
+    def _experiment_ids(self, names: list=None, tags: dict=None):
+        """ Ids of the experiments selected by names and tags, None for all. """
+        if not names and not tags:
+            return None
+        query = 'SELECT id FROM experiments WHERE 1'
+        params = []
+        if names:
+            query += f' AND name IN ({", ".join(["?"] * len(names))})'
+            params += list(names)
+        for key, value in (tags or {}).items():
+            query += ' AND id IN (SELECT experiment_id FROM experiment_tags WHERE key = ? AND value = ?)'
+            params += [key, str(value)]
+        return [row[0] for row in self.connection.execute(query, params)]
+
+    def _where(self, names: list=None, tags: dict=None, start=None, end=None):
+        """ WHERE clause over samples table and its parameters. """
+        conditions = []
+        params = []
+        ids = self._experiment_ids(names, tags)
+        if ids is not None:
+            conditions.append(f's.experiment_id IN ({", ".join(["?"] * len(ids))})' if ids else '0')
+            params += ids
+        if start is not None:
+            conditions.append('s.timepoint >= ?')
+            params.append(_nanoseconds(start))
+        if end is not None:
+            conditions.append('s.timepoint <= ?')
+            params.append(_nanoseconds(end))
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def _check_metrics(self, metrics: list):
+        unknown = set(metrics) - set(self.metrics)
+        if unknown:
+            raise Exception(f'Unknown metrics {sorted(unknown)}')
+
+    def query(
+        self,
+        metrics: list=None,
+        experiments: list=None,
+        start=None,
+        end=None,
+        **tags
+    ):
+        """
+        Return the datasets of the experiments selected indexed by
+        the experiment name and the timepoint.
+
+        Attributes:
+            metrics:
+                Metrics to return. If None, all the metrics.
+            experiments:
+                Names of the experiments. If None, all the experiments.
+            start:
+                First timepoint, UTC+0 if timezone-naive. If None, from
+                the beginning of the experiments.
+            end:
+                Last timepoint, inclusive. If None, up to the end of
+                the experiments.
+            tags:
+                Tag values the experiments should have.
+        """
+        metrics = self.metrics if metrics is None else list(metrics)
+        self._check_metrics(metrics)
+        where, params = self._where(experiments, tags, start, end)
+        selected = ''.join(f', s.{quote(metric)}' for metric in metrics)
+        df = pd.read_sql_query(
+            f'SELECT e.name AS experiment, s.timepoint AS Timepoint{selected} '
+            f'FROM samples s JOIN experiments e ON e.id = s.experiment_id{where} '
+            f'ORDER BY s.experiment_id, s.timepoint',
+            self.connection,
+            params=params
+        )
+        df['Timepoint'] = pd.to_datetime(df['Timepoint'].astype(np.int64), unit='ns')
+        return df.set_index(['experiment', 'Timepoint'])
+
+    def aggregate(
+        self,
+        metrics: list,
+        functions: list=('avg', 'min', 'max'),
+        experiments: list=None,
+        start=None,
+        end=None,
+        **tags
+    ):
+        """
+        Return the aggregates of the metrics over each experiment selected,
+        computed by the database, with (metric, function) columns.
+
+        Attributes:
+            metrics:
+                Metrics to aggregate.
+            functions:
+                Aggregate functions, some of AGGREGATES.
+            experiments:
+                Names of the experiments. If None, all the experiments.
+            start:
+                First timepoint, UTC+0 if timezone-naive. If None, from
+                the beginning of the experiments.
+            end:
+                Last timepoint, inclusive. If None, up to the end of
+                the experiments.
+            tags:
+                Tag values the experiments should have.
+        """
+        self._check_metrics(metrics)
+        for function in functions:
+            if function not in AGGREGATES:
+                raise Exception(f'Unknown aggregate function {function}')
+        where, params = self._where(experiments, tags, start, end)
+        pairs = [(metric, function) for metric in metrics for function in functions]
+        selected = ''.join(
+            f', {function}(s.{quote(metric)}) AS c{i}' for i, (metric, function) in enumerate(pairs)
+        )
+        df = pd.read_sql_query(
+            f'SELECT s.experiment_id AS id{selected} FROM samples s{where} '
+            f'GROUP BY s.experiment_id',
+            self.connection,
+            params=params
+        )
+        names = pd.read_sql_query('SELECT id, name AS experiment FROM experiments', self.connection)
+        df = names.merge(df, on='id').drop(columns='id').set_index('experiment').sort_index()
+        df.columns = pd.MultiIndex.from_tuples(pairs, names=['metric', 'function'])
+        return df
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Ingest aligned datasets into SQLite experiment '
+        'warehouse and compare the experiments.'
+    )
+    parser.add_argument('database', help='SQLite database file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser(
+        'ingest',
+        help='Ingest aligned datasets saved as .csv files or stores, '
+        'named after the files'
+    )
+    ingest.add_argument('paths', nargs='+', help='.csv files or store directories')
+
+    subparsers.add_parser('list', help='List the experiments with their tags')
+
+    aggregate = subparsers.add_parser('aggregate', help='Aggregate metrics over each experiment')
+    aggregate.add_argument('metrics', nargs='+', help='Metrics to aggregate')
+    aggregate.add_argument(
+        '--functions',
+        nargs='+',
+        default=['avg', 'min', 'max'],
+        choices=AGGREGATES,
+        help='Aggregate functions'
+    )
+    aggregate.add_argument('--start', help='First timepoint, UTC')
+    aggregate.add_argument('--end', help='Last timepoint, UTC')
+    aggregate.add_argument(
+        '--tag',
+        action='append',
+        default=[],
+        metavar='KEY=VALUE',
+        help='Tag value the experiments should have, may be repeated'
+    )
+    args = parser.parse_args()
+
+    with Warehouse(args.database) as warehouse:
+        if args.command == 'ingest':
+            # Imported here as the store is only needed to ingest stores
+            from srt_stats_analysis.store import read_results
+            for path in map(pathlib.Path, args.paths):
+                if path.is_dir():
+                    df = read_results(path)
+                else:
+                    df = pd.read_csv(path, index_col=0, parse_dates=[0])
+                name = path.name if path.is_dir() else path.stem
+                rows = warehouse.ingest(name, df)
+                print(f'{name}: {rows} rows')
+        elif args.command == 'list':
+            print(warehouse.experiments().to_string())
+        else:
+            tags = dict(tag.split('=', 1) for tag in args.tag)
+            df = warehouse.aggregate(args.metrics, args.functions, start=args.start, end=args.end, **tags)
+            print(df.to_string())
+
+
+if __name__ == '__main__':
+    main()
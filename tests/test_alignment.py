@@ -0,0 +1,170 @@
+"""
+Tests of the alignment kernel against the outer join and interpolation
+the align functions used to do, on synthetic experiments.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from srt_stats_analysis.align import interpolate_onto, redistribute_onto
+from srt_stats_analysis.capture import Capture
+from srt_stats_analysis.instrumentation import set_verbose
+from srt_stats_analysis.join_stats import (
+    RCV_FEATURES,
+    SND_FEATURES,
+    align_srt_stats,
+    align_srt_tshark_stats,
+    convert_bytesps_in_mbps,
+    convert_pktsps_in_bytesps,
+)
+from srt_stats_analysis.schema import INTERPOLATE, REDISTRIBUTE, get_policy
+from srt_stats_analysis.streaming import iter_align_srt_stats
+from srt_stats_analysis.synthetic import SessionParams, generate_experiment
+
+
+@pytest.fixture(scope='module', autouse=True)
+def quiet():
+    set_verbose(False)
+    yield
+    set_verbose(True)
+
+
+@pytest.fixture(scope='module')
+def experiment(tmp_path_factory):
+    params = SessionParams(
+        duration=pd.Timedelta(seconds=20),
+        jitter_ms=3,
+        loss_rate=0.01,
+        loss_burst=3
+    )
+    return generate_experiment(tmp_path_factory.mktemp('experiment'), params)
+
+
+def join_interpolate(ref: pd.DataFrame, df: pd.DataFrame):
+    """
+    Interpolate the secondary dataframe onto the reference timepoints
+    the way align functions used to: outer join, linear interpolation
+    over the rows, backward fill and the reference rows only.
+    """
+    joined = ref.assign(isRef=True).join(df, how='outer')
+    joined['isRef'] = joined['isRef'].fillna(False)
+    cols = [col for col in joined.columns if col != 'isRef']
+    joined[cols] = joined[cols].interpolate().fillna(method='bfill')
+    return joined.loc[joined['isRef'].astype(bool), cols]
+
+
+def read_stats(stats_path, features: list):
+    """ Load SRT statistics the way align_srt_stats used to. """
+    stats = pd.read_csv(stats_path, index_col='Timepoint')[features]
+    stats.index = pd.to_datetime(stats.index, format='%d.%m.%Y %H:%M:%S.%f %z').tz_convert(None)
+    return stats
+
+
+def random_series(rng: np.random.Generator, count: int, start: pd.Timestamp, columns: list):
+    # Timepoints on a coarse grid, so that some of them are equal
+    # across the dataframes
+    offsets = np.sort(rng.choice(count * 4, count, replace=False)) * 1000000
+    index = pd.DatetimeIndex(start.value + offsets)
+    data = {col: rng.normal(size=count) for col in columns}
+    df = pd.DataFrame(data, index=index)
+    # Missing values in the middle and at the start
+    df.iloc[rng.choice(count, count // 10, replace=False), 0] = np.nan
+    df.iloc[0, -1] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_interpolate_onto_matches_outer_join(seed):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2020-02-10 17:34:30')
+    ref = random_series(rng, 500, start, ['a', 'b'])
+    df = random_series(rng, 300, start + pd.Timedelta(milliseconds=int(rng.integers(-50, 50))), ['c', 'd'])
+
+    expected = join_interpolate(ref, df)
+    result = interpolate_onto(ref, df)
+
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+
+def test_align_srt_stats_matches_outer_join(experiment):
+    snd_stats = read_stats(experiment['snd_stats_csv'], SND_FEATURES).add_suffix('_snd')
+    rcv_stats = read_stats(experiment['rcv_stats_csv'], RCV_FEATURES).add_suffix('_rcv')
+
+    result = align_srt_stats(experiment['snd_stats_csv'], experiment['rcv_stats_csv'])
+
+    # Sender timepoints between the first and the last timepoints
+    # collected at both sides
+    start = max(snd_stats.index[0], rcv_stats.index[0])
+    end = min(snd_stats.index[-1], rcv_stats.index[-1])
+    snd_stats = snd_stats[(snd_stats.index >= start) & (snd_stats.index <= end)]
+    rcv_stats = rcv_stats[(rcv_stats.index >= start) & (rcv_stats.index <= end)]
+    if rcv_stats.index[0] < snd_stats.index[0]:
+        rcv_stats = rcv_stats[1:]
+    if rcv_stats.index[-1] > snd_stats.index[-1]:
+        rcv_stats = rcv_stats[:-1]
+    pd.testing.assert_index_equal(result.index, snd_stats.index, check_names=False)
+
+    rcv_cols = [col for col in rcv_stats.columns if get_policy(col) == INTERPOLATE]
+    expected = join_interpolate(snd_stats, rcv_stats[rcv_cols])
+    cols = [col for col in expected.columns if get_policy(col) == INTERPOLATE]
+    pd.testing.assert_frame_equal(result[cols], expected[cols].round(2), check_names=False, check_freq=False)
+
+    # Sender counters are taken as they are, receiver ones are
+    # redistributed with their totals preserved
+    for col in snd_stats.columns:
+        if get_policy(col) == REDISTRIBUTE:
+            np.testing.assert_array_equal(result[col].to_numpy(), snd_stats[col].to_numpy())
+    for col in rcv_stats.columns:
+        if get_policy(col) == REDISTRIBUTE:
+            assert result[col].sum() == rcv_stats[col].sum()
+
+
+def test_align_srt_tshark_stats_matches_outer_join(experiment):
+    stats = align_srt_stats(experiment['snd_stats_csv'], experiment['rcv_stats_csv'])
+    capture = Capture(experiment['rcv_tshark_pcapng'])
+
+    result = align_srt_tshark_stats(stats, capture)
+
+    packets = capture.umsg_ack_packets.set_index('frame.time')
+    packets.index = packets.index.tz_convert(None)
+    tshark = pd.DataFrame({
+        'srt.rtt.ms_tshark': packets['srt.rtt'] / 1000,
+        'srt.rttvar.ms_tshark': packets['srt.rttvar'] / 1000,
+        'srt.bw.Mbps_tshark': convert_bytesps_in_mbps(convert_pktsps_in_bytesps(packets['srt.bw'])),
+    })
+    tshark = tshark[(tshark.index >= stats.index[0]) & (tshark.index <= stats.index[-1])]
+    expected = join_interpolate(stats, tshark).round(2)
+
+    cols = list(tshark.columns)
+    pd.testing.assert_frame_equal(result[cols], expected[cols], check_names=False, check_freq=False)
+    pd.testing.assert_frame_equal(result[list(stats.columns)], stats)
+
+
+def test_streaming_matches_align(experiment):
+    expected = align_srt_stats(experiment['snd_stats_csv'], experiment['rcv_stats_csv'])
+
+    chunks = iter_align_srt_stats(experiment['snd_stats_csv'], experiment['rcv_stats_csv'], chunksize=300)
+
+    pd.testing.assert_frame_equal(pd.concat(list(chunks)), expected)
+
+
+def test_redistribute_onto_in_parts():
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2020-02-10 17:34:30')
+    ref = random_series(rng, 400, start, ['a'])
+    df = random_series(rng, 300, start, ['counts'])
+    df['counts'] = rng.integers(0, 100, len(df))
+
+    whole = redistribute_onto(ref, df)
+    assert whole['counts'].sum() == df['counts'].sum()
+
+    # The second part continues the first one with the last interval
+    # redistributed completely and the events redistributed already
+    split = ref.index[len(ref) // 2]
+    first = redistribute_onto(ref[ref.index < split], df)
+    rcv_start = df.index[df.index < split][-1]
+    completed = df.loc[df.index <= rcv_start, 'counts'].sum()
+    offsets = {'counts': int(first['counts'].sum() - completed)}
+    second = redistribute_onto(ref[ref.index >= split], df, start=rcv_start, offsets=offsets)
+
+    pd.testing.assert_frame_equal(pd.concat([first, second]), whole)
@@ -0,0 +1,326 @@
+"""
+Tests of reading SRT packets out of .pcapng dumps on small captures
+built block by block.
+"""
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from srt_stats_analysis.pcapng import (
+    BYTE_ORDER_MAGIC,
+    EPB_TYPE,
+    IDB_TYPE,
+    IF_TSRESOL,
+    LINKTYPE_ETHERNET,
+    LINKTYPE_NULL,
+    PB_TYPE,
+    SHB_TYPE,
+    SPB_TYPE,
+    UMSG_ACK,
+    UMSG_ACKACK,
+    UMSG_HANDSHAKE,
+    decode_srt_control_packets,
+    decode_srt_packet_headers,
+    walk_blocks,
+)
+
+
+BYTEORDERS = ['<', '>']
+
+SND = ('10.0.0.1', 4200)
+RCV = ('10.0.0.2', 4201)
+
+# 2020-02-10 17:34:30 UTC, nanoseconds since epoch
+START = 1581356070 * 10 ** 9
+
+
+class Capture:
+    """
+    .pcapng file content built block by block, with the offsets of
+    Enhanced Packet Blocks and their frame numbers recorded.
+    """
+
+    def __init__(self, byteorder: str):
+        self.byteorder = byteorder
+        self.content = b''
+        self.offsets = []
+        self.numbers = []
+        self.bases = []
+        self.interfaces = 0
+        self.base = 0
+        self.frames = 0
+
+    def block(self, block_type: int, body: bytes):
+        body += bytes(-len(body) % 4)
+        length = len(body) + 12
+        self.content += (
+            struct.pack(f'{self.byteorder}II', block_type, length)
+            + body
+            + struct.pack(f'{self.byteorder}I', length)
+        )
+
+    def section(self):
+        self.base = self.interfaces
+        self.block(SHB_TYPE, struct.pack(f'{self.byteorder}IHHq', BYTE_ORDER_MAGIC, 1, 0, -1))
+
+    def interface(self, linktype: int=LINKTYPE_ETHERNET, tsresol: int=None):
+        options = b''
+        if tsresol is not None:
+            options = struct.pack(f'{self.byteorder}HHB3x', IF_TSRESOL, 1, tsresol) + bytes(4)
+        self.block(IDB_TYPE, struct.pack(f'{self.byteorder}HHI', linktype, 0, 65535) + options)
+        self.interfaces += 1
+
+    def packet(self, frame: bytes, timestamp: int, interface: int=0, options: bytes=b''):
+        """ Enhanced Packet Block, timestamp in the interface units. """
+        self.frames += 1
+        self.offsets.append(len(self.content))
+        self.numbers.append(self.frames)
+        self.bases.append(self.base)
+        header = struct.pack(
+            f'{self.byteorder}IIIII',
+            interface,
+            timestamp >> 32,
+            timestamp & 0xFFFFFFFF,
+            len(frame),
+            len(frame)
+        )
+        frame += bytes(-len(frame) % 4)
+        self.block(EPB_TYPE, header + frame + options)
+
+    def simple_packet(self, frame: bytes):
+        self.frames += 1
+        self.block(SPB_TYPE, struct.pack(f'{self.byteorder}I', len(frame)) + frame)
+
+    def obsolete_packet(self, frame: bytes, timestamp: int):
+        self.frames += 1
+        self.block(PB_TYPE, struct.pack(
+            f'{self.byteorder}HHIIII',
+            0,
+            0,
+            timestamp >> 32,
+            timestamp & 0xFFFFFFFF,
+            len(frame),
+            len(frame)
+        ) + frame)
+
+    def walked(self):
+        return (
+            np.array(self.offsets, dtype=np.int64),
+            np.array(self.numbers, dtype=np.int64),
+            np.array(self.bases, dtype=np.int64),
+        )
+
+
+def ipv4_udp(src: tuple, dst: tuple, payload: bytes):
+    """ IPv4 packet with UDP header. """
+    udp = struct.pack('!HHHH', src[1], dst[1], len(payload) + 8, 0) + payload
+    ip = struct.pack(
+        '!BBHHHBBH4s4s',
+        0x45,
+        0,
+        20 + len(udp),
+        0,
+        0,
+        64,
+        17,
+        0,
+        bytes(int(part) for part in src[0].split('.')),
+        bytes(int(part) for part in dst[0].split('.'))
+    )
+    return ip + udp
+
+
+def ethernet(payload: bytes):
+    return bytes(12) + struct.pack('!H', 0x0800) + payload
+
+
+def srt_control(control_type: int, type_info: int, timestamp: int, socket_id: int, information: bytes):
+    header = struct.pack('!IIII', (1 << 31) | (control_type << 16), type_info, timestamp, socket_id)
+    return header + information
+
+
+def ack(ackno: int, rtt: int):
+    information = struct.pack('!7I', 100 + ackno, rtt, rtt // 2, 8000, 1000, 2000, 1500)
+    return ipv4_udp(RCV, SND, srt_control(UMSG_ACK, ackno, 1000 * ackno, 115676651, information))
+
+
+def ackack(ackno: int):
+    return ipv4_udp(SND, RCV, srt_control(UMSG_ACKACK, ackno, 1000 * ackno, 855406566, bytes(4)))
+
+
+def handshake(reqtype: int):
+    information = struct.pack('!IIIIIiII', 5, 0, 1000, 1500, 8192, reqtype, 115676651, 0) + bytes(16)
+    return ipv4_udp(SND, RCV, srt_control(UMSG_HANDSHAKE, 0, 0, 0, information))
+
+
+def data(seqno: int):
+    header = struct.pack('!IIII', seqno, 0xE0000000 | (seqno + 1), 1000 * seqno, 855406566)
+    return ipv4_udp(SND, RCV, header + bytes(100))
+
+
+def fake_block(byteorder: str):
+    """ Packet data looking like a complete Enhanced Packet Block. """
+    return struct.pack(f'{byteorder}II', EPB_TYPE, 32) + bytes(20) + struct.pack(f'{byteorder}I', 32)
+
+
+def assert_walked(capture: Capture, content: bytes=None):
+    interfaces, byteorder, offsets, numbers, bases = walk_blocks(capture.content if content is None else content)
+    expected_offsets, expected_numbers, expected_bases = capture.walked()
+    assert byteorder == capture.byteorder
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_array_equal(numbers, expected_numbers)
+    np.testing.assert_array_equal(bases, expected_bases)
+    return interfaces
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_walk_blocks(byteorder):
+    capture = Capture(byteorder)
+    capture.section()
+    capture.interface(tsresol=9)
+    for i in range(3):
+        capture.packet(ethernet(data(i)), START + i)
+    # Simple and obsolete Packet Blocks are counted but not returned
+    capture.simple_packet(ethernet(data(3)))
+    capture.packet(ethernet(data(4)), START + 4, options=struct.pack(f'{byteorder}HH', 0, 0))
+    capture.obsolete_packet(ethernet(data(5)), START + 5)
+    capture.obsolete_packet(ethernet(data(6)), START + 6)
+    capture.packet(ethernet(data(7)), START + 7)
+
+    interfaces = assert_walked(capture)
+
+    assert interfaces == [(LINKTYPE_ETHERNET, 9, 0)]
+    assert capture.numbers == [1, 2, 3, 5, 8]
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_walk_blocks_sections(byteorder):
+    capture = Capture(byteorder)
+    capture.section()
+    capture.interface(tsresol=9)
+    capture.interface(LINKTYPE_NULL)
+    capture.packet(ethernet(data(0)), START)
+    capture.packet(ethernet(data(1)), START + 1, interface=1)
+    capture.section()
+    capture.interface(tsresol=3)
+    capture.packet(ethernet(data(2)), START // 10 ** 6)
+    capture.packet(ethernet(data(3)), START // 10 ** 6)
+
+    interfaces = assert_walked(capture)
+
+    assert interfaces == [(LINKTYPE_ETHERNET, 9, 0), (LINKTYPE_NULL, 6, 0), (LINKTYPE_ETHERNET, 3, 0)]
+    assert capture.bases == [0, 0, 2, 2]
+
+
+def test_walk_blocks_different_byteorders():
+    capture = Capture('<')
+    capture.section()
+    capture.interface()
+    other = Capture('>')
+    other.section()
+    other.interface()
+
+    with pytest.raises(Exception, match='different byte orders'):
+        walk_blocks(capture.content + other.content)
+
+
+def test_walk_blocks_not_pcapng():
+    with pytest.raises(Exception, match='Not a .pcapng file'):
+        walk_blocks(bytes(64))
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_walk_blocks_block_type_in_packet_data(byteorder):
+    capture = Capture(byteorder)
+    capture.section()
+    capture.interface()
+    capture.packet(ethernet(data(0)), START)
+    # The fake blocks are complete and 32-bit aligned within the file
+    capture.packet(fake_block(byteorder), START + 1)
+    capture.packet(bytes(8) + fake_block(byteorder) + bytes(8), START + 2)
+    capture.packet(ethernet(data(3)), START + 3)
+    capture.simple_packet(fake_block(byteorder))
+    capture.packet(ethernet(data(5)), START + 5)
+
+    assert_walked(capture)
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_walk_blocks_truncated(byteorder):
+    capture = Capture(byteorder)
+    capture.section()
+    capture.interface()
+    for i in range(3):
+        capture.packet(ethernet(data(i)), START + i)
+    complete = capture.content
+    capture.packet(ethernet(data(3)), START + 3)
+
+    for size in [len(complete) + 2, len(complete) + 8, len(complete) + 40, len(capture.content) - 1]:
+        interfaces, _, offsets, numbers, bases = walk_blocks(capture.content[:size])
+        assert len(interfaces) == 1
+        np.testing.assert_array_equal(offsets, capture.offsets[:3])
+        np.testing.assert_array_equal(numbers, [1, 2, 3])
+        np.testing.assert_array_equal(bases, [0, 0, 0])
+
+
+def control_capture(byteorder: str):
+    capture = Capture(byteorder)
+    capture.section()
+    capture.interface(tsresol=9)
+    capture.packet(ethernet(handshake(1)), START)
+    capture.packet(ethernet(handshake(-1)), START + 1000)
+    capture.packet(ethernet(data(1)), START + 2000)
+    capture.simple_packet(ethernet(ack(0, 50000)))
+    capture.packet(ethernet(ack(1, 60000)), START + 3000)
+    capture.section()
+    # Microseconds, the default resolution, and a link layer with the
+    # address family in the byte order of the capture
+    capture.interface(LINKTYPE_NULL)
+    family = struct.pack(f'{byteorder}I', 2)
+    capture.packet(family + ackack(1), START // 1000 + 4)
+    capture.packet(family + ack(2, 70000), START // 1000 + 5)
+    return capture
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_decode_srt_control_packets(byteorder):
+    packets = decode_srt_control_packets(control_capture(byteorder).content)
+
+    np.testing.assert_array_equal(packets['ws.no'], [1, 2, 5, 6, 7])
+    expected_times = pd.to_datetime([START, START + 1000, START + 3000, START + 4000, START + 5000], utc=True)
+    np.testing.assert_array_equal(packets['frame.time'], pd.Series(expected_times))
+    np.testing.assert_array_equal(
+        packets['srt.type'],
+        [UMSG_HANDSHAKE, UMSG_HANDSHAKE, UMSG_ACK, UMSG_ACKACK, UMSG_ACK]
+    )
+    assert list(packets['ws.source']) == [SND[0], SND[0], RCV[0], SND[0], RCV[0]]
+    assert list(packets['ws.destination']) == [RCV[0], RCV[0], SND[0], RCV[0], SND[0]]
+    np.testing.assert_array_equal(packets['udp.srcport'], [SND[1], SND[1], RCV[1], SND[1], RCV[1]])
+    np.testing.assert_array_equal(packets['srt.ackno'], [0, 0, 1, 1, 2])
+    np.testing.assert_array_equal(packets['srt.hs.reqtype'], [1, -1, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(packets['srt.rtt'], [np.nan, np.nan, 60000, np.nan, 70000])
+    np.testing.assert_array_equal(packets['srt.rttvar'], [np.nan, np.nan, 30000, np.nan, 35000])
+    np.testing.assert_array_equal(packets['srt.ack_seqno'], [np.nan, np.nan, 101, np.nan, 102])
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_decode_srt_control_packets_by_port(byteorder):
+    capture = control_capture(byteorder)
+
+    packets = decode_srt_control_packets(capture.content, port=SND[1])
+
+    np.testing.assert_array_equal(packets['ws.no'], [1, 2, 5, 6, 7])
+    assert len(decode_srt_control_packets(capture.content, port=9000)) == 0
+
+
+@pytest.mark.parametrize('byteorder', BYTEORDERS)
+def test_decode_srt_packet_headers(byteorder):
+    headers = decode_srt_packet_headers(control_capture(byteorder).content)
+
+    np.testing.assert_array_equal(headers['ws.no'], [1, 2, 3, 5, 6, 7])
+    np.testing.assert_array_equal(headers['srt.iscontrol'], [1, 1, 0, 1, 1, 1])
+    np.testing.assert_array_equal(headers['srt.seqno'], [-1, -1, 1, -1, -1, -1])
+    np.testing.assert_array_equal(headers['srt.msgno'], [-1, -1, 2, -1, -1, -1])
+    np.testing.assert_array_equal(headers['srt.timestamp'], [0, 0, 1000, 1000, 1000, 2000])
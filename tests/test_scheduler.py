@@ -0,0 +1,142 @@
+"""
+Tests of running the pipeline steps as a dependency graph.
+"""
+import asyncio
+import time
+
+import pytest
+
+from srt_stats_analysis.instrumentation import Recorder, recording, stage
+from srt_stats_analysis.scheduler import (
+    ASYNC,
+    PROCESS,
+    THREAD,
+    Step,
+    critical_path,
+    format_runs,
+    run_steps,
+    sort_steps,
+)
+
+
+# Step functions are defined at the module level, so that they can be
+# pickled and run in worker processes
+
+def numbers():
+    time.sleep(0.05)
+    return [1, 2, 3]
+
+
+def total(values):
+    # Nested stage recorded by the worker process
+    with stage('sum', len(values)) as measured:
+        result = sum(values)
+        measured.rows_out = 1
+    return result
+
+
+def double(values):
+    return [value * 2 for value in values]
+
+
+async def wait(values):
+    await asyncio.sleep(0.05)
+    return len(values)
+
+
+def combine(summed, doubled, length):
+    return summed, doubled, length
+
+
+def fail(values):
+    raise ValueError('step failed')
+
+
+def pipeline():
+    return [
+        Step('combine', combine, ('total', 'double', 'wait')),
+        Step('total', total, ('numbers',), PROCESS),
+        Step('double', double, ('numbers',), THREAD),
+        Step('wait', wait, ('numbers',), ASYNC),
+        Step('numbers', numbers, kind=PROCESS),
+    ]
+
+
+def test_sort_steps():
+    steps = pipeline()
+
+    names = [step.name for step in sort_steps(steps)]
+
+    for step in steps:
+        for dep in step.deps:
+            assert names.index(dep) < names.index(step.name)
+
+
+@pytest.mark.parametrize('steps, message', [
+    ([Step('a', numbers), Step('a', numbers)], 'defined twice'),
+    ([Step('a', numbers, kind='fiber')], 'Unknown kind'),
+    ([Step('a', total, ('b',))], 'unknown step'),
+    ([Step('a', total, ('b',)), Step('b', total, ('a',))], 'cycle'),
+])
+def test_sort_steps_invalid(steps, message):
+    with pytest.raises(Exception, match=message):
+        sort_steps(steps)
+
+
+@pytest.mark.parametrize('jobs', [1, 2, None])
+def test_run_steps(jobs):
+    results, runs = run_steps(pipeline(), jobs)
+
+    assert results['numbers'] == [1, 2, 3]
+    assert results['combine'] == (6, [2, 4, 6], 3)
+    assert sorted(run.name for run in runs) == sorted(step.name for step in pipeline())
+    # Each step starts once the steps it depends on are done
+    by_name = {run.name: run for run in runs}
+    for step in pipeline():
+        for dep in step.deps:
+            assert by_name[dep].end_s <= by_name[step.name].start_s
+
+
+def test_critical_path():
+    steps = pipeline()
+    _, runs = run_steps(steps, 2)
+
+    path, length = critical_path(steps, runs)
+
+    assert path[0] == 'numbers'
+    assert path[-1] == 'combine'
+    durations = {run.name: run.end_s - run.start_s for run in runs}
+    assert length == pytest.approx(sum(durations[name] for name in path))
+    assert ' -> '.join(path) in format_runs(steps, runs)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_steps_records_stages(jobs):
+    recorder = Recorder()
+
+    with recording(recorder):
+        run_steps(pipeline(), jobs)
+
+    names = [(stage.name, stage.depth) for stage in recorder.stages]
+    for step in pipeline():
+        assert (step.name, 0) in names
+    # Stage nested in the step run in a worker process is merged with
+    # its measurements
+    nested = [stage for stage in recorder.stages if stage.name == 'sum']
+    assert len(nested) == 1
+    assert nested[0].depth == 1
+    assert nested[0].rows_in == 3
+    assert nested[0].rows_out == 1
+    assert nested[0].wall_s is not None
+
+
+@pytest.mark.parametrize('kind', [PROCESS, THREAD])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_steps_failure(kind, jobs):
+    steps = pipeline() + [
+        Step('fail', fail, ('numbers',), kind),
+        Step('after', double, ('fail',)),
+    ]
+
+    with pytest.raises(ValueError, match='step failed'):
+        run_steps(steps, jobs)
@@ -0,0 +1,99 @@
+"""
+Tests of the memory-mapped store of aligned results.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from srt_stats_analysis.store import ResultStore, read_results, save_results
+
+
+def results(tz: str=None):
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2020-02-10 17:34:30', periods=1000, freq='10ms', tz=tz, name='Timepoint')
+    return pd.DataFrame({
+        'msRTT_snd': rng.normal(60, 5, len(index)),
+        'pktSent_snd': rng.integers(0, 100, len(index)),
+        'isSent': rng.random(len(index)) < 0.5,
+        'srt.type': rng.choice(['ack', 'ackack'], len(index)),
+    }, index=index)
+
+
+@pytest.mark.parametrize('tz', [None, 'UTC', 'Europe/Berlin'])
+def test_round_trip(tmp_path, tz):
+    df = results(tz)
+
+    save_results(df, tmp_path / 'store')
+
+    pd.testing.assert_frame_equal(read_results(tmp_path / 'store'), df, check_freq=False)
+
+
+def test_unsorted_rows_are_sorted(tmp_path):
+    df = results()
+
+    save_results(df.sample(frac=1, random_state=0), tmp_path / 'store')
+
+    pd.testing.assert_frame_equal(read_results(tmp_path / 'store'), df, check_freq=False)
+
+
+def test_existing_store(tmp_path):
+    df = results()
+    save_results(df, tmp_path / 'store')
+
+    with pytest.raises(Exception, match='already exists'):
+        save_results(df[:10], tmp_path / 'store')
+    save_results(df[:10], tmp_path / 'store', overwrite=True)
+
+    assert len(ResultStore(tmp_path / 'store')) == 10
+
+
+@pytest.mark.parametrize('tz', [None, 'Europe/Berlin'])
+def test_time_range(tmp_path, tz):
+    df = results(tz)
+    save_results(df, tmp_path / 'store')
+    start = df.index[100]
+    end = df.index[199]
+
+    result = read_results(tmp_path / 'store', start, end, ['msRTT_snd', 'isSent'])
+
+    expected = df.loc[start:end, ['msRTT_snd', 'isSent']]
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+
+def test_time_range_between_rows(tmp_path):
+    df = results()
+    save_results(df, tmp_path / 'store')
+    store = ResultStore(tmp_path / 'store')
+
+    assert store.positions(df.index[10] + pd.Timedelta('1ms'), df.index[20] - pd.Timedelta('1ms')) == (11, 20)
+    assert store.positions(df.index[-1] + pd.Timedelta('1s')) == (len(df), len(df))
+    assert store.positions(end=df.index[0] - pd.Timedelta('1s')) == (0, 0)
+    assert len(store.query(df.index[20], df.index[10])) == 0
+
+
+def test_timezone_aware_range_of_naive_results(tmp_path):
+    save_results(results(), tmp_path / 'store')
+
+    with pytest.raises(Exception, match='Timezone-aware'):
+        read_results(tmp_path / 'store', pd.Timestamp('2020-02-10 17:34:31', tz='UTC'))
+
+
+def test_query_returns_views(tmp_path):
+    save_results(results('UTC'), tmp_path / 'store')
+    store = ResultStore(tmp_path / 'store')
+
+    result = store.query(store.index.view('M8[ns]')[100], store.index.view('M8[ns]')[199])
+
+    # Numeric columns and the index share memory with the mapped files
+    for column in ['msRTT_snd', 'pktSent_snd', 'isSent']:
+        assert np.shares_memory(result[column].to_numpy(), store.arrays[column])
+    assert np.shares_memory(result.index.asi8, store.index)
+
+
+def test_column_without_fixed_width(tmp_path):
+    df = results()
+    df['mixed'] = [1, 'a'] * (len(df) // 2)
+
+    with pytest.raises(Exception, match='fixed-width'):
+        save_results(df, tmp_path / 'store')
+    assert not (tmp_path / 'store').exists()
@@ -0,0 +1,121 @@
+"""
+Tests of the SQLite warehouse of aligned datasets.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from srt_stats_analysis.warehouse import Warehouse, parse_experiment_name
+
+
+FIRST = '_useast_eunorth_10.02.20_100Mbps'
+SECOND = '_useast_eunorth_11.02.20_20Mbps'
+THIRD = '_uswest_asia_11.02.20_100Mbps'
+
+
+def dataset(seed: int, rows: int=1000, tz: str=None):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2020-02-10 17:34:30', periods=rows, freq='10ms', tz=tz, name='Timepoint')
+    df = pd.DataFrame({
+        'msRTT_snd': rng.normal(60, 5, rows),
+        'pktSent_snd': rng.integers(0, 100, rows),
+    }, index=index)
+    df.iloc[5, 0] = np.nan
+    return df
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    with Warehouse(tmp_path / 'experiments.db') as warehouse:
+        for seed, name in enumerate([FIRST, SECOND, THIRD]):
+            warehouse.ingest(name, dataset(seed), batch_size=300)
+        yield warehouse
+
+
+def test_parse_experiment_name():
+    assert parse_experiment_name(FIRST) == {
+        'regions': 'useast_eunorth',
+        'date': '2020-02-10',
+        'bitrate_mbps': '100',
+    }
+    assert parse_experiment_name('experiment') == {}
+
+
+def test_ingest_and_query(warehouse):
+    result = warehouse.query(experiments=[SECOND])
+
+    expected = dataset(1)
+    assert list(result.index.get_level_values('experiment').unique()) == [SECOND]
+    pd.testing.assert_frame_equal(result.loc[SECOND], expected, check_freq=False)
+
+
+def test_timezone_aware_timepoints_in_utc(tmp_path):
+    df = dataset(0, tz='Europe/Berlin')
+
+    with Warehouse(tmp_path / 'experiments.db') as warehouse:
+        warehouse.ingest('experiment', df)
+        result = warehouse.query()
+
+    pd.testing.assert_index_equal(
+        result.loc['experiment'].index,
+        df.index.tz_convert(None),
+        check_exact=True
+    )
+
+
+def test_query_time_range_and_metrics(warehouse):
+    df = dataset(0)
+    start = df.index[100]
+    end = df.index[199]
+
+    result = warehouse.query(['msRTT_snd'], [FIRST], start, end)
+
+    pd.testing.assert_frame_equal(result.loc[FIRST], df.loc[start:end, ['msRTT_snd']], check_freq=False)
+    with pytest.raises(Exception, match='Unknown metrics'):
+        warehouse.query(['msRTT_rcv'])
+
+
+def test_ingest_replaces_experiment(warehouse):
+    df = dataset(3, rows=10)
+
+    warehouse.ingest(FIRST, df, tags={'bitrate_mbps': 50})
+
+    pd.testing.assert_frame_equal(warehouse.query(experiments=[FIRST]).loc[FIRST], df, check_freq=False)
+    experiments = warehouse.experiments()
+    assert experiments.loc[FIRST, 'rows'] == 10
+    assert experiments.loc[FIRST, 'bitrate_mbps'] == '50'
+    assert pd.isna(experiments.loc[FIRST, 'regions'])
+    assert len(warehouse.query()) == 2010
+
+
+def test_tags(warehouse):
+    experiments = warehouse.experiments()
+    assert list(experiments.index) == [FIRST, SECOND, THIRD]
+    assert list(experiments['date']) == ['2020-02-10', '2020-02-11', '2020-02-11']
+
+    assert list(warehouse.experiments(bitrate_mbps=100).index) == [FIRST, THIRD]
+    assert list(warehouse.experiments(regions='useast_eunorth', date='2020-02-11').index) == [SECOND]
+    selected = warehouse.query(bitrate_mbps=100).index.get_level_values('experiment').unique()
+    assert list(selected) == [FIRST, THIRD]
+    assert len(warehouse.query(regions='europe')) == 0
+
+
+def test_aggregate(warehouse):
+    result = warehouse.aggregate(['msRTT_snd', 'pktSent_snd'], ['avg', 'max', 'count'], bitrate_mbps=100)
+
+    assert list(result.index) == [FIRST, THIRD]
+    for seed, name in [(0, FIRST), (2, THIRD)]:
+        df = dataset(seed)
+        # NaN values are stored as NULL and skipped by the aggregates
+        assert result.loc[name, ('msRTT_snd', 'avg')] == pytest.approx(df['msRTT_snd'].mean())
+        assert result.loc[name, ('msRTT_snd', 'count')] == df['msRTT_snd'].count()
+        assert result.loc[name, ('pktSent_snd', 'max')] == df['pktSent_snd'].max()
+    with pytest.raises(Exception, match='Unknown aggregate function'):
+        warehouse.aggregate(['msRTT_snd'], ['median'])
+
+
+def test_remove(warehouse):
+    warehouse.remove(SECOND)
+
+    assert list(warehouse.experiments().index) == [FIRST, THIRD]
+    assert SECOND not in warehouse.query().index.get_level_values('experiment')